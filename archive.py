@@ -0,0 +1,219 @@
+import os
+import re
+import gzip
+import json
+import sqlite3
+import logging
+import argparse
+import datetime
+import threading
+import config
+import metrics
+
+# Optional: zstd compresses listing text better and faster than gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIRNAME = "archive"
+INDEX_FILENAME = "index.db"
+
+# Listings not seen in any search for this many days move to the archive (0 disables archiving)
+ARCHIVE_AFTER_DAYS = getattr(config, "ARCHIVE_AFTER_DAYS", 30)
+ARCHIVE_COMPRESSION = getattr(config, "ARCHIVE_COMPRESSION", "gzip")
+# Listings compressed together; a lookup decompresses one block
+ARCHIVE_BLOCK_SIZE = getattr(config, "ARCHIVE_BLOCK_SIZE", 32)
+# A new segment file is started once the current one grows beyond this
+ARCHIVE_SEGMENT_BYTES = getattr(config, "ARCHIVE_SEGMENT_BYTES", 64 * 1024 * 1024)
+
+# Stale listings read from the store per pass, so a first run over a long history stays bounded in memory
+ARCHIVE_BATCH = 1000
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d+)\.(gz|zst)$')
+
+def compress(data, suffix):
+    """Compress one block for a segment file of the given suffix"""
+    if suffix == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+def decompress(data, suffix):
+    """Decompress one block read from a segment file"""
+    if suffix == "zst":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class ListingArchive:
+    """Cold tier of the listing store: compressed, append-only segment files.
+
+    Listings are written in blocks of ARCHIVE_BLOCK_SIZE, each compressed on
+    its own (gzip or zstd) and appended to data/archive/segment-NNNNN.gz or
+    .zst. A small SQLite index maps every archived ID to its block's segment,
+    offset and length, so one record is read back by decompressing a single
+    block. Segments are never rewritten; a listing restored to the hot store
+    only loses its index entry.
+    """
+
+    def __init__(self, archive_dir, compression=ARCHIVE_COMPRESSION):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, archiving with gzip instead")
+            compression = "gzip"
+        self.suffix = "zst" if compression == "zstd" else "gz"
+        self._segment = None
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(archive_dir, INDEX_FILENAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS archive_index (
+                    id TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    snippet_hash TEXT,
+                    archived_time TEXT
+                )
+            """)
+
+    def _current_segment(self):
+        """Segment file to append to: the newest one, or a new one once that is full"""
+        if self._segment is None:
+            names = sorted(name for name in os.listdir(self.archive_dir) if SEGMENT_PATTERN.match(name))
+            self._segment = names[-1] if names else None
+        if (self._segment is None or not self._segment.endswith(self.suffix)
+                or os.path.getsize(os.path.join(self.archive_dir, self._segment)) >= ARCHIVE_SEGMENT_BYTES):
+            number = int(SEGMENT_PATTERN.match(self._segment).group(1)) + 1 if self._segment else 1
+            self._segment = f"segment-{number:05d}.{self.suffix}"
+        return self._segment
+
+    def _write_block(self, listings):
+        """Append one compressed block and index its listings"""
+        payload = "\n".join(json.dumps(listing, ensure_ascii=False) for listing in listings).encode('utf-8')
+        block = compress(payload, self.suffix)
+        with self._lock:
+            segment = self._current_segment()
+            with open(os.path.join(self.archive_dir, segment), 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(block)
+                f.flush()
+                # The block must be on disk before the hot rows are deleted
+                os.fsync(f.fileno())
+            now = datetime.datetime.now().isoformat()
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO archive_index (id, segment, offset, length, snippet_hash, archived_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(listing["id"], segment, offset, len(block), listing.get("snippet_hash"), now) for listing in listings]
+                )
+        metrics.observe("archive_block_ratio", len(block) / max(1, len(payload)))
+
+    def _read_block(self, segment, offset, length):
+        """Decompress one block and return its listings by ID"""
+        with open(os.path.join(self.archive_dir, segment), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        suffix = SEGMENT_PATTERN.match(segment).group(2)
+        listings = (json.loads(line) for line in decompress(data, suffix).decode('utf-8').splitlines())
+        return {listing["id"]: listing for listing in listings}
+
+    def _locations(self, listing_ids):
+        """Return {id: (segment, offset, length)} for the archived ones of the given IDs"""
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return {}
+        placeholders = ",".join("?" * len(listing_ids))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, segment, offset, length FROM archive_index WHERE id IN ({placeholders})", listing_ids
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def contains(self, listing_id):
+        """Check whether a listing with this ID is archived"""
+        return bool(self._locations([listing_id]))
+
+    def get_many(self, listing_ids):
+        """Return the archived listings among the given IDs, reading each block once"""
+        blocks = {}
+        for listing_id, location in self._locations(listing_ids).items():
+            blocks.setdefault(location, []).append(listing_id)
+        found = []
+        for (segment, offset, length), ids in blocks.items():
+            block = self._read_block(segment, offset, length)
+            found.extend(block[listing_id] for listing_id in ids if listing_id in block)
+        return found
+
+    def get(self, listing_id):
+        """Return the archived listing with this ID, or None"""
+        found = self.get_many([listing_id])
+        return found[0] if found else None
+
+    def forget(self, listing_ids):
+        """Drop index entries of listings that moved back to the hot store"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM archive_index WHERE id = ?", [(listing_id,) for listing_id in listing_ids])
+
+    def archive_stale(self, store, older_than_days=ARCHIVE_AFTER_DAYS):
+        """Move listings not seen in search results for older_than_days from the store into the archive"""
+        if not older_than_days:
+            return 0
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=older_than_days)).isoformat()
+        archived = 0
+        with metrics.timer("archive_seconds"):
+            while True:
+                stale = store.stale(cutoff, limit=ARCHIVE_BATCH)
+                if not stale:
+                    break
+                for start in range(0, len(stale), ARCHIVE_BLOCK_SIZE):
+                    self._write_block(stale[start:start + ARCHIVE_BLOCK_SIZE])
+                store.delete_many([listing["id"] for listing in stale])
+                archived += len(stale)
+        if archived:
+            metrics.inc("archive_listings_total", archived)
+            logger.info(f"Archived {archived} listings not seen since {cutoff[:10]}")
+        return archived
+
+    def stats(self):
+        """Archived listing count and the size of the segment files"""
+        with self._lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM archive_index").fetchone()[0]
+        segments = [name for name in os.listdir(self.archive_dir) if SEGMENT_PATTERN.match(name)]
+        size = sum(os.path.getsize(os.path.join(self.archive_dir, name)) for name in segments)
+        return {"listings": count, "segments": len(segments), "bytes": size}
+
+    def close(self):
+        """Close the index database"""
+        with self._lock:
+            self.conn.close()
+
+def main():
+    """Archive stale listings now, or look one up"""
+    # Import here, storage imports this module
+    from storage import open_store
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Cold archive of listings that dropped out of the searches")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archive listings not seen in search results for this many days")
+    parser.add_argument("--get", metavar="ID", help="Print an archived listing instead of archiving")
+    args = parser.parse_args()
+
+    store = open_store(args.data_dir)
+    try:
+        if args.get:
+            listing = store.archive.get(args.get)
+            print(json.dumps(listing, ensure_ascii=False, indent=2) if listing else f"Listing {args.get} is not archived")
+            return
+        store.archive.archive_stale(store, args.days)
+        print(json.dumps(store.archive.stats()))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import json
+import logging
+import datetime
+import metrics
+import events
+from process_listings import (
+    client, build_chat_request, parse_response, usage_fields, record_usage, resolve_without_llm, remember_result,
+    PROMPT_MODE
+)
+from llm_cache import PROMPT_VERSION
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_REQUESTS_FILENAME = "batch_requests.jsonl"
+BATCH_RESULTS_FILENAME = "batch_results.jsonl"
+BATCH_STATE_FILENAME = "batch_state.json"
+BATCH_META_FILENAME = "batch_meta.json"
+
+# Number of ingested listings written to the store per transaction
+INGEST_WRITE_BATCH = 200
+
+def write_batch_meta(path):
+    """Record the prompt mode and preparation time the request file was built with"""
+    meta = {
+        "prompt_mode": PROMPT_MODE,
+        "prompt_version": PROMPT_VERSION,
+        "prepared_time": datetime.datetime.now().isoformat()
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def read_batch_meta(path):
+    """Metadata of the prepared batch; files from before it was recorded count as the current mode"""
+    if not os.path.exists(path):
+        logger.warning(f"No batch metadata found ({path} is missing), assuming prompt mode {PROMPT_MODE}")
+        return {"prompt_mode": PROMPT_MODE, "prompt_version": PROMPT_VERSION, "prepared_time": None}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def is_newer_analysis(listing, prepared_time):
+    """True if the listing was analyzed after the batch was prepared (or at all, if that time is unknown)"""
+    if not listing.get("llm_processed"):
+        return False
+    return prepared_time is None or (listing.get("llm_processed_time") or "") > prepared_time
+
+def write_batch_file(store, path, meta_path=None):
+    """Step 1: write all unprocessed listings as a Batch API request file (JSONL)"""
+    count = 0
+    resolved = []
+    if meta_path is not None:
+        write_batch_meta(meta_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        for listing in store.unprocessed():
+            if not listing.get("detailed_description"):
+                continue
+            
+            # Listings the rules or the cache can answer don't need a request
+            known = resolve_without_llm(listing.get("title", ""), listing["detailed_description"])
+            if known is not None:
+                listing.update(known)
+                resolved.append(listing)
+                continue
+            
+            line = {
+                "custom_id": listing["id"],
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": build_chat_request(listing.get("title", ""), listing["detailed_description"])
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    store.upsert_many(resolved)
+    events.emit_many("listing-analyzed", resolved)
+    logger.info(f"Wrote {count} batch requests to {path} ({len(resolved)} answered by rules or cache)")
+    return count
+
+def submit_batch(requests_path, state_path):
+    """Step 2: upload the request file and start an OpenAI batch job"""
+    with open(requests_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({"batch_id": batch.id, "input_file_id": input_file.id}, f, indent=2)
+    logger.info(f"Submitted batch {batch.id} ({batch.status})")
+    return batch.id
+
+def run_batch_locally(requests_path, results_path):
+    """Step 2 (local stand-in): run each request now and write a Batch API style results file"""
+    count = 0
+    with open(requests_path, 'r', encoding='utf-8') as requests_file, \
+            open(results_path, 'w', encoding='utf-8') as results_file:
+        for line in requests_file:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"batch_req_{count}", "custom_id": request["custom_id"], "response": None, "error": None}
+            try:
+                response = client.chat.completions.create(**request["body"])
+                result["response"] = {"status_code": 200, "body": response.model_dump()}
+            except Exception as e:
+                logger.error(f"Batch request {request['custom_id']} failed: {str(e)}")
+                result["error"] = {"message": str(e)}
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+    logger.info(f"Ran {count} batch requests locally, results in {results_path}")
+    return count
+
+def download_batch_results(state_path, results_path):
+    """Fetch the output of a finished OpenAI batch job; returns False while it is still running.
+
+    Failed requests are listed in the batch's error file, which is appended so
+    ingest counts them; a batch whose requests all failed has only that file.
+    """
+    if not os.path.exists(state_path):
+        logger.error(f"No submitted batch found ({state_path} is missing)")
+        return False
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    batch = client.batches.retrieve(state["batch_id"])
+    if batch.status != "completed":
+        logger.info(f"Batch {batch.id} is not finished yet (status: {batch.status})")
+        return False
+    if batch.output_file_id is None:
+        logger.error(f"None of the requests of batch {batch.id} succeeded, see {results_path} for their errors")
+    with open(results_path, 'wb') as f:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            content = client.files.content(file_id).read()
+            f.write(content if content.endswith(b"\n") or not content else content + b"\n")
+    logger.info(f"Downloaded results of batch {batch.id} to {results_path}")
+    return True
+
+def ingest_batch_results(store, results_path, meta_path=None):
+    """Step 3: parse a Batch API results file and write the analysis into the store.
+
+    Replies are parsed with the prompt mode the batch was prepared with.
+    Listings analyzed since the batch was prepared keep their newer analysis.
+    """
+    meta = read_batch_meta(meta_path) if meta_path is not None else \
+        {"prompt_mode": PROMPT_MODE, "prompt_version": PROMPT_VERSION, "prepared_time": None}
+    ingested = 0
+    failed = 0
+    skipped = 0
+    pending_writes = []
+
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            listing = store.get(result["custom_id"])
+            if listing is None:
+                continue
+            if is_newer_analysis(listing, meta["prepared_time"]):
+                skipped += 1
+                continue
+
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                failed += 1
+                metrics.inc("llm_results_total", source="failed")
+                continue
+
+            # Refused and content-filtered replies come without content
+            response_text = response["body"]["choices"][0]["message"].get("content")
+            if response_text is None:
+                failed += 1
+                metrics.inc("llm_results_total", source="failed")
+                continue
+            result = parse_response(response_text.strip(), listing.get("title", ""), mode=meta["prompt_mode"])
+            result.update(usage_fields(response["body"].get("usage")))
+            record_usage(result)
+            metrics.inc("llm_results_total", source="batch")
+            remember_result(listing.get("title", ""), listing.get("detailed_description", ""), result,
+                            prompt_version=meta["prompt_version"])
+            listing.update(result)
+            pending_writes.append(listing)
+            ingested += 1
+
+            if len(pending_writes) >= INGEST_WRITE_BATCH:
+                store.upsert_many(pending_writes)
+                events.emit_many("listing-analyzed", pending_writes)
+                pending_writes = []
+
+    store.upsert_many(pending_writes)
+    events.emit_many("listing-analyzed", pending_writes)
+    logger.info(f"Ingested {ingested} batch results ({failed} failed requests left unprocessed, "
+                f"{skipped} listings analyzed since the batch was prepared)")
+    return ingested
+
+def run_batch_step(store, data_dir, step, runner="openai"):
+    """Run one step of the batch workflow: prepare, submit or ingest"""
+    requests_path = os.path.join(data_dir, BATCH_REQUESTS_FILENAME)
+    results_path = os.path.join(data_dir, BATCH_RESULTS_FILENAME)
+    state_path = os.path.join(data_dir, BATCH_STATE_FILENAME)
+    meta_path = os.path.join(data_dir, BATCH_META_FILENAME)
+
+    if step == "prepare":
+        write_batch_file(store, requests_path, meta_path)
+    elif step == "submit":
+        if runner == "local":
+            run_batch_locally(requests_path, results_path)
+        else:
+            submit_batch(requests_path, state_path)
+    elif step == "ingest":
+        # Batches submitted to OpenAI have to be downloaded first
+        if runner == "openai" and not download_batch_results(state_path, results_path):
+            return
+        ingest_batch_results(store, results_path, meta_path)
@@ -0,0 +1,276 @@
+"""Benchmark page loads in the full and the lean browser profile.
+
+Serves the fixture search and detail pages from a local server together with
+the kind of subresources the live pages pull in: listing images from
+img.kleinanzeigen.de, a web font, the site's own CSS/JS and a set of
+ad/analytics tags. Chrome resolves every host name to the local server
+(--host-resolver-rules), so the lean profile's host-based block list applies
+as it would live. For each profile the pages are loaded the way the scraper
+loads them (driver.get, then wait for the results table or description) and
+the per-page load time (p50/p95), requests and bytes served are reported,
+together with the browser's startup time and the resident memory of its
+process tree after the last page (Linux only). Results are saved as JSON in
+benchmarks/results/.
+
+Needs Chrome and chromedriver. A headed "full" browser needs a display; pass
+--headless to run both profiles headless and compare the blocking alone.
+
+Usage: python benchmarks/bench_browser.py --rounds 10 --asset-latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from site_server import (SEARCH_PAGE, DETAIL_PAGE, DESCRIPTIONS, PAGE_PATTERN, DETAIL_ID_PATTERN,
+                         load_fixture, search_page, detail_page)
+from run_benchmark import RESULTS_DIR, percentile, git_revision
+import scraper
+
+# Third-party tags of the kind the live pages embed, appended to every page
+TRACKER_TAGS = """
+<script async src="http://www.googletagmanager.com:{port}/gtm.js?id=GTM-BENCH"></script>
+<script async src="http://securepubads.g.doubleclick.net:{port}/tag/js/gpt.js"></script>
+<script async src="http://static.criteo.net:{port}/js/ld/publishertag.js"></script>
+<iframe src="http://tpc.googlesyndication.com:{port}/safeframe/container.html" width="300" height="250"></iframe>
+<img src="http://track.adform.net:{port}/Serving/TrackPoint/?pm={page}" width="1" height="1" alt=""/>
+<img src="http://de.ioam.de:{port}/tx.io?page={page}" width="1" height="1" alt=""/>
+"""
+
+FONT_STYLE = """
+<style>
+@font-face {{ font-family: "Bench"; src: url("http://static.kleinanzeigen.de:{port}/fonts/site.woff2") format("woff2"); }}
+body {{ font-family: "Bench", sans-serif; }}
+</style>
+"""
+
+# Response size in bytes and content type by kind of resource
+ASSETS = {
+    "image": (25000, "image/jpeg"),
+    "font": (60000, "font/woff2"),
+    "css": (80000, "text/css"),
+    "script": (150000, "application/javascript"),
+    "tracker": (90000, "application/javascript"),
+    "frame": (20000, "text/html"),
+    "pixel": (43, "image/gif"),
+}
+
+def asset_kind(host, path):
+    """Which kind of resource a request is for, or None for a page"""
+    if host == "img.kleinanzeigen.de":
+        return "image"
+    if path.endswith(".woff2"):
+        return "font"
+    if path.endswith(".css"):
+        return "css"
+    if host in ("127.0.0.1", "localhost"):
+        return "script" if path.endswith(".js") else None
+    if path.endswith(".html"):
+        return "frame"
+    if path.endswith(".js"):
+        return "tracker"
+    return "pixel"
+
+def with_subresources(html, port, page):
+    """Point the page's resources at the local server and add the font and third-party tags"""
+    html = html.replace("https://img.kleinanzeigen.de/", f"http://img.kleinanzeigen.de:{port}/")
+    # Give every page its own images, as live result pages have
+    html = html.replace("?rule=", f"?page={page}&rule=")
+    html = html.replace("</head>", FONT_STYLE.format(port=port) + "</head>", 1)
+    return html.replace("</body>", TRACKER_TAGS.format(port=port, page=page) + "</body>", 1)
+
+class BenchHandler(BaseHTTPRequestHandler):
+    """Serves pages on 127.0.0.1 and filler subresources for every other host"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        host = (self.headers.get("Host") or "").split(":")[0]
+        path = self.path.split("?", 1)[0]
+        kind = asset_kind(host, path)
+        server = self.server
+
+        if kind is not None:
+            size, content_type = ASSETS[kind]
+            body = b"\0" * size if kind in ("image", "font", "pixel") else b" " * size
+            if server.asset_latency:
+                time.sleep(server.asset_latency)
+        elif path.startswith("/s-anzeige/") and DETAIL_ID_PATTERN.search(path):
+            page = int(DETAIL_ID_PATTERN.search(path).group(1))
+            html = detail_page(server.detail_template, server.descriptions, page)
+            body = with_subresources(html, server.server_port, page).encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        elif path.startswith("/s-"):
+            match = PAGE_PATTERN.search(path)
+            page = int(match.group(1)) if match else 1
+            html = search_page(server.search_template, page, page)
+            body = with_subresources(html, server.server_port, page).encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        else:
+            # favicon.ico and the like
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        # Site assets are cached like on the live site, images and tags are per page
+        self.send_header("Cache-Control", "max-age=3600" if kind in ("css", "script", "font") else "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            server.stats["bytes"] += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_bench_server(port, asset_latency):
+    """Start the page and subresource server in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), BenchHandler)
+    server.asset_latency = asset_latency
+    server.search_template = load_fixture(SEARCH_PAGE)
+    server.detail_template = load_fixture(DETAIL_PAGE)
+    server.descriptions = [listing["detailed_description"] for listing in json.loads(load_fixture(DESCRIPTIONS))]
+    server.stats = {"requests": 0, "bytes": 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def take_stats(server):
+    """Requests and bytes served since the last call"""
+    with server.stats_lock:
+        stats = dict(server.stats)
+        server.stats.update(requests=0, bytes=0)
+    return stats
+
+def process_tree_rss_kb(pid):
+    """Resident memory of a process and all its descendants in KB, or None where /proc is unavailable"""
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status", encoding="utf-8") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        children.setdefault(int(status["PPid"]), []).append(int(entry))
+        rss[int(entry)] = int(status.get("VmRSS", "0 kB").split()[0])
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += rss.get(current, 0)
+        pending.extend(children.get(current, []))
+    return total
+
+def run_profile(profile, server, args):
+    """Start the browser, load rounds x (search page, detail page) and return startup, memory and per-page samples"""
+    profile_dir = tempfile.mkdtemp(prefix=f"bench-chrome-{profile}-")
+    options = scraper.browser_options(profile_dir, profile)
+    if args.headless and profile != "lean":
+        options.add_argument("--headless=new")
+    options.add_argument("--host-resolver-rules=MAP * 127.0.0.1, EXCLUDE localhost")
+    started = time.perf_counter()
+    driver = webdriver.Chrome(options=options)
+    samples = {"search": [], "detail": []}
+    try:
+        scraper.setup_tab(driver, profile)
+        startup = time.perf_counter() - started
+        base = f"http://127.0.0.1:{server.server_port}"
+        for round_number in range(1, args.rounds + 1):
+            pages = {
+                "search": (f"{base}/s-notebooks/seite:{round_number}/c278", "srchrslt-adtable"),
+                "detail": (f"{base}/s-anzeige/bench-laptop/{round_number}-278-{round_number}", "viewad-description"),
+            }
+            for kind, (url, element_id) in pages.items():
+                take_stats(server)
+                started = time.perf_counter()
+                driver.get(url)
+                WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.ID, element_id)))
+                elapsed = time.perf_counter() - started
+                # Let late requests (lazy images, async tags) finish before counting bytes
+                time.sleep(args.settle)
+                samples[kind].append({"seconds": elapsed, **take_stats(server)})
+        # chromedriver is the parent of the browser and its renderer processes
+        memory_kb = process_tree_rss_kb(driver.service.process.pid)
+    finally:
+        driver.quit()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    return startup, memory_kb, samples
+
+def summarize(samples):
+    """p50/p95 load time and mean requests and kilobytes per page"""
+    seconds = [sample["seconds"] for sample in samples]
+    return {
+        "pages": len(samples),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 1),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 1),
+        "requests_per_page": round(sum(sample["requests"] for sample in samples) / len(samples), 1),
+        "kb_per_page": round(sum(sample["bytes"] for sample in samples) / len(samples) / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare page loads in the full and lean browser profiles")
+    parser.add_argument("--rounds", type=int, default=10, help="Search and detail pages loaded per profile")
+    parser.add_argument("--asset-latency", type=float, default=0.05, help="Seconds each subresource takes")
+    parser.add_argument("--settle", type=float, default=0.5, help="Seconds to wait for late requests per page")
+    parser.add_argument("--headless", action="store_true", help="Run the full profile headless too")
+    parser.add_argument("--port", type=int, default=8004)
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/browser-<timestamp>.json)")
+    args = parser.parse_args()
+
+    server = start_bench_server(args.port, args.asset_latency)
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "revision": git_revision(),
+        "settings": {"rounds": args.rounds, "asset_latency": args.asset_latency, "headless": args.headless},
+        "profiles": {}
+    }
+    try:
+        for profile in ("full", "lean"):
+            startup, memory_kb, samples = run_profile(profile, server, args)
+            results["profiles"][profile] = {
+                "startup_ms": round(startup * 1000, 1),
+                "memory_mb": round(memory_kb / 1024, 1) if memory_kb is not None else None,
+                "pages": {kind: summarize(entries) for kind, entries in samples.items()}
+            }
+    finally:
+        server.shutdown()
+
+    for profile, measured in results["profiles"].items():
+        memory = f"{measured['memory_mb']} MB" if measured["memory_mb"] is not None else "n/a"
+        print(f"{profile:<5} startup {measured['startup_ms']} ms   memory after the last page {memory}")
+        for kind, summary in measured["pages"].items():
+            print(f"{profile:<5} {kind:<7} p50 {summary['p50_ms']:>7} ms   p95 {summary['p95_ms']:>7} ms   "
+                  f"{summary['requests_per_page']:>5} requests   {summary['kb_per_page']:>7} KB per page")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"browser-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Distributed crawl test: a coordinator and several workers against the site stand-in.
+
+Copies the repository to a temporary directory with a generated config.py
+pointing at site_server.py, starts main.py --coordinate and a few
+coordinator.py workers with the "http" fetch backend, and kills one worker
+partway through so its leases have to run out and go to the others. Reports
+the wall time, the listings stored (and how many lack a description), the
+task states left in the coordinator's queue and the workers' exit codes.
+Results are saved as JSON in benchmarks/results/.
+
+Usage: python benchmarks/bench_coordinator.py --workers 3 --pages 5 --kill-after 6
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import sqlite3
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, BENCH_DIR)
+
+from site_server import start_site_server
+from run_benchmark import COPY_IGNORE, git_revision
+
+SEARCHES = ["/s-notebooks/k0", "/s-laptop/k0c278"]
+
+def write_config(run_dir, args, site_url):
+    """Generate config.py from the template with the test settings appended"""
+    with open(os.path.join(REPO_DIR, "config_template.py"), 'r', encoding='utf-8') as f:
+        template = f.read()
+    overrides = {
+        "BASE_URL": site_url,
+        "FETCH_BACKEND": "http",
+        "DELAY_BETWEEN_LISTINGS": 0,
+        "CRAWL_MAX_RATE": 1000.0,
+        "PAGES_TO_SCRAPE": args.pages,
+        "BACKFILL_PAGES": args.pages,
+        "COORDINATOR_PORT": args.coordinator_port,
+        "LEASE_SECONDS": args.lease_seconds,
+        "LEASE_BATCH": args.lease_batch,
+        "LLM_CACHE_ENABLED": False,
+    }
+    lines = [f"{name} = {value!r}" for name, value in overrides.items()]
+    with open(os.path.join(run_dir, "config.py"), 'w', encoding='utf-8') as f:
+        f.write(template + "\n# Coordinator test settings\n" + "\n".join(lines) + "\n")
+    return overrides
+
+def stored_listings(run_dir):
+    """(listings stored, listings without a description)"""
+    path = os.path.join(run_dir, "data", "listings.db")
+    if not os.path.exists(path):
+        return 0, 0
+    conn = sqlite3.connect(path)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+        empty = conn.execute(
+            "SELECT COUNT(*) FROM listings WHERE COALESCE(json_extract(data, '$.detailed_description'), '') = ''"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return total, empty
+
+def task_states(run_dir):
+    """Task count per kind and state left in the coordinator's queue"""
+    path = os.path.join(run_dir, "data", "coordinator.db")
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT kind, state, COUNT(*), MAX(attempts) FROM tasks GROUP BY kind, state").fetchall()
+    finally:
+        conn.close()
+    return {f"{kind}/{state}": {"count": count, "max_attempts": attempts} for kind, state, count, attempts in rows}
+
+def run_test(args):
+    """Run one distributed crawl and return the results dict"""
+    site = start_site_server(args.site_port, args.pages, args.page_latency, args.detail_latency)
+    site_url = f"http://127.0.0.1:{args.site_port}"
+
+    run_dir = tempfile.mkdtemp(prefix="kleinanzeigen-coordinator-")
+    workers = []
+    try:
+        shutil.copytree(REPO_DIR, run_dir, ignore=COPY_IGNORE, dirs_exist_ok=True)
+        settings = write_config(run_dir, args, site_url)
+
+        command = [sys.executable, "main.py", "--mode", "scrape", "--coordinate", "--backfill",
+                   "--urls"] + [site_url + search for search in SEARCHES]
+        started = time.perf_counter()
+        coordinator = subprocess.Popen(command, cwd=run_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True)
+        for index in range(args.workers):
+            workers.append(subprocess.Popen(
+                [sys.executable, "coordinator.py", "--backend", "http", "--once", "--worker-id", f"worker-{index}",
+                 "--coordinator", f"http://127.0.0.1:{args.coordinator_port}"],
+                cwd=run_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ))
+
+        killed = False
+        while coordinator.poll() is None:
+            if args.kill_after and not killed and time.perf_counter() - started >= args.kill_after:
+                # The worker's leases have to run out and go to the others
+                workers[0].send_signal(signal.SIGKILL)
+                killed = True
+            time.sleep(0.1)
+        wall = time.perf_counter() - started
+        log_text = coordinator.stdout.read()
+
+        exit_codes = []
+        for worker in workers:
+            try:
+                exit_codes.append(worker.wait(timeout=30))
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                exit_codes.append(None)
+        listings, without_description = stored_listings(run_dir)
+        tasks = task_states(run_dir)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.kill()
+        if args.keep:
+            print(f"Run directory kept at {run_dir}")
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        site.shutdown()
+
+    if coordinator.returncode != 0:
+        print(log_text[-4000:], file=sys.stderr)
+
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "revision": git_revision(),
+        "label": args.label,
+        "settings": {
+            **{name: value for name, value in settings.items() if name != "BASE_URL"},
+            "workers": args.workers,
+            "kill_after": args.kill_after,
+            "page_latency": args.page_latency,
+            "detail_latency": args.detail_latency,
+        },
+        "exit_code": coordinator.returncode,
+        "wall_seconds": round(wall, 3),
+        "listings": listings,
+        "without_description": without_description,
+        "tasks": tasks,
+        "worker_exit_codes": exit_codes,
+        "site_requests": site.stats["requests"],
+    }
+
+def print_report(results):
+    """Print a short summary of one run"""
+    print(f"Coordinator exit:  {results['exit_code']}")
+    print(f"Wall time:         {results['wall_seconds']:.2f} s")
+    print(f"Listings:          {results['listings']} ({results['without_description']} without a description)")
+    print(f"Site requests:     {results['site_requests']}")
+    for name, summary in sorted(results["tasks"].items()):
+        print(f"Tasks {name + ':':<16} {summary['count']:>5}   max attempts {summary['max_attempts']}")
+    print(f"Worker exits:      {results['worker_exit_codes']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Coordinator and workers against the local site stand-in")
+    parser.add_argument("--workers", type=int, default=3, help="Worker processes to start")
+    parser.add_argument("--kill-after", type=float, default=6.0,
+                        help="Seconds after which the first worker is killed (0: none)")
+    parser.add_argument("--pages", type=int, default=5, help="Result pages per search")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="Mean search page latency in seconds")
+    parser.add_argument("--detail-latency", type=float, default=0.2, help="Mean detail page latency in seconds")
+    parser.add_argument("--lease-seconds", type=int, default=6, help="LEASE_SECONDS")
+    parser.add_argument("--lease-batch", type=int, default=4, help="LEASE_BATCH")
+    parser.add_argument("--site-port", type=int, default=8002)
+    parser.add_argument("--coordinator-port", type=int, default=3032)
+    parser.add_argument("--label", default="", help="Free-form note stored with the results")
+    parser.add_argument("--output", default=None,
+                        help="Results file (default: benchmarks/results/coordinator-<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary run directory")
+    args = parser.parse_args()
+
+    results = run_test(args)
+    print_report(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"coordinator-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+    # Every task must end up done or given up, and the surviving workers must stop on their own
+    incomplete = [name for name in results["tasks"] if name.endswith(("/queued", "/leased"))]
+    sys.exit(results["exit_code"] or (1 if incomplete else 0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark repost detection on a synthetic store of laptop listings.
+
+Indexes --listings generated listings in a temporary listing store, then looks
+up reposts (the same listing with an edited title and a new price) and
+unrelated new listings. Reports lookup latency (p50/p95), how many reposts
+were recognized and how many new listings were wrongly flagged.
+
+Usage: python benchmarks/bench_dedup.py --listings 100000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from storage import ListingStore, DB_FILENAME
+from dedup import RepostIndex
+from run_benchmark import percentile
+
+BRANDS = ["Lenovo ThinkPad", "Dell XPS", "HP EliteBook", "Asus ROG", "Acer Nitro", "MSI Katana", "Apple MacBook Pro",
+          "Lenovo Legion", "HP Omen", "Dell Latitude", "Asus Zenbook", "Acer Swift", "Razer Blade", "Medion Erazer"]
+MODELS = ["T14", "X1 Carbon", "15", "13", "G14", "5", "Pro 16", "Slim 5", "840 G8", "7420", "Strix G15", "Go 14"]
+CPUS = ["i5-1135G7", "i7-1165G7", "Ryzen 5 5600H", "Ryzen 7 6800H", "i7-12700H", "M1 Pro", "i9-13900H"]
+GPUS = ["RTX 3050", "RTX 3060", "RTX 4060", "RTX 4070", "GTX 1650", "Iris Xe", "Radeon 680M"]
+EXTRAS = ["wie neu", "Top Zustand", "mit OVP", "Garantie", "Akku sehr gut", "kaum benutzt", "Rechnung vorhanden",
+          "Versand möglich", "nur Abholung", "Tausch möglich", "Ladegerät dabei", "Tastatur beleuchtet"]
+PLACES = ["10115 Mitte", "20095 Hamburg", "80331 München", "50667 Köln", "60311 Frankfurt", "70173 Stuttgart",
+          "04109 Leipzig", "01067 Dresden", "28195 Bremen", "30159 Hannover", "90402 Nürnberg", "44135 Dortmund"]
+
+def make_listing(rng, listing_id):
+    """A random listing as parsed from a search results page"""
+    ram = rng.choice([8, 16, 32, 64])
+    title = f"{rng.choice(BRANDS)} {rng.choice(MODELS)} {rng.choice(CPUS)} {ram}GB {rng.choice(GPUS)}"
+    description = " ".join(rng.sample(EXTRAS, 4)) + f" {rng.choice([256, 512, 1000])}GB SSD {rng.randrange(2018, 2025)}"
+    return {
+        "id": str(listing_id),
+        "title": title,
+        "short_description": description,
+        "location": f"{rng.choice(PLACES)} ({rng.randrange(1, 50)} km)",
+        "price": f"{rng.randrange(300, 2500)} € VB",
+        "scraped_time": "2024-01-01T00:00:00",
+        "detailed_description": description * 5,
+        "llm_processed": True
+    }
+
+def make_repost(rng, listing, listing_id):
+    """The same listing reposted: one extra word in the title, a new price and distance"""
+    repost = dict(listing, id=str(listing_id))
+    repost["title"] = f"{listing['title']} {rng.choice(['VB', 'TOP', 'Neu', 'Angebot'])}"
+    repost["price"] = f"{rng.randrange(300, 2500)} € VB"
+    repost["location"] = listing["location"].split(" (")[0] + f" ({rng.randrange(1, 50)} km)"
+    return repost
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repost detection lookups")
+    parser.add_argument("--listings", type=int, default=100000, help="Listings in the index")
+    parser.add_argument("--lookups", type=int, default=2000, help="Reposts and new listings looked up (each)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    work_dir = tempfile.mkdtemp(prefix="bench-dedup-")
+    store = ListingStore(os.path.join(work_dir, DB_FILENAME))
+    index = RepostIndex(store)
+    try:
+        listings = [make_listing(rng, listing_id) for listing_id in range(args.listings)]
+        started = time.perf_counter()
+        for start in range(0, len(listings), 1000):
+            store.upsert_many(listings[start:start + 1000])
+            index.add(listings[start:start + 1000])
+        print(f"Indexed {len(listings):,} listings in {time.perf_counter() - started:.1f}s")
+
+        reposts = [
+            make_repost(rng, rng.choice(listings), args.listings + number) for number in range(args.lookups)
+        ]
+        fresh = [make_listing(rng, 2 * args.listings + number) for number in range(args.lookups)]
+
+        timings = []
+        found = 0
+        for repost in reposts:
+            started = time.perf_counter()
+            original = index.find(repost)
+            timings.append(time.perf_counter() - started)
+            found += original is not None
+        flagged = 0
+        for listing in fresh:
+            started = time.perf_counter()
+            original = index.find(listing)
+            timings.append(time.perf_counter() - started)
+            flagged += original is not None
+    finally:
+        store.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Lookup p50:           {percentile(timings, 50) * 1000:.3f} ms")
+    print(f"Lookup p95:           {percentile(timings, 95) * 1000:.3f} ms")
+    print(f"Reposts recognized:   {found} of {len(reposts)} ({100 * found / len(reposts):.1f}%)")
+    print(f"New listings flagged: {flagged} of {len(fresh)} ({100 * flagged / len(fresh):.1f}%)")
+
+if __name__ == "__main__":
+    main()
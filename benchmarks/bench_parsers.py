@@ -0,0 +1,91 @@
+"""Benchmark the search results and detail page parser backends on saved pages.
+
+Compares the BeautifulSoup full-document parse the scraper used to do with
+each backend in parsers.py, and checks that every backend returns the same
+listing dicts as the full-document parse.
+
+Usage: python benchmarks/bench_parsers.py [--rounds N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+import parsers
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEARCH_PAGE = os.path.join(FIXTURES, "search_results.html")
+DETAIL_PAGE = os.path.join(FIXTURES, "detail_page.html")
+
+def full_document_results(html):
+    """The scraper's previous parser: whole page through html.parser, CSS queries per item"""
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for item in soup.select("ul#srchrslt-adtable li.ad-listitem"):
+        article_elem = item.select_one("article.aditem")
+        title_elem = item.select_one("h2 a")
+        price_elem = item.select_one("p.aditem-main--middle--price-shipping--price")
+        desc_elem = item.select_one("p.aditem-main--middle--description")
+        location_elem = item.select_one(".aditem-main--top--left")
+        results.append({
+            "id": article_elem['data-adid'] if article_elem and article_elem.has_attr('data-adid') else "",
+            "title": title_elem.get_text(strip=True) if title_elem else "",
+            "price": price_elem.get_text(strip=True) if price_elem else "",
+            "short_description": desc_elem.get_text(strip=True) if desc_elem else "",
+            "location": location_elem.get_text(strip=True) if location_elem else "",
+            "url": parsers.BASE_URL + title_elem['href'] if title_elem and title_elem.has_attr('href') else "",
+            "promoted": not parsers.PROMOTED_CLASSES.isdisjoint(item.get("class", []))
+        })
+    return results
+
+def full_document_description(html):
+    """The previous detail page parser"""
+    desc_elem = BeautifulSoup(html, "html.parser").select_one("#viewad-description-text")
+    return desc_elem.get_text(separator='\n', strip=False) if desc_elem else ""
+
+def time_per_call(function, html, rounds):
+    """Median seconds per call over the given number of rounds"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function(html)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def run(label, html, reference, candidates, rounds):
+    """Time each candidate parser and compare its output with the reference"""
+    expected = reference(html)
+    baseline = time_per_call(reference, html, rounds)
+    print(f"{label} ({len(html) / 1024:.0f} KB)")
+    print(f"  {'bs4 full document':<20} {baseline * 1000:8.2f} ms   1.0x")
+    for name, function in candidates:
+        if function(html) != expected:
+            print(f"  {name:<20} output differs from the full-document parse")
+            continue
+        elapsed = time_per_call(function, html, rounds)
+        print(f"  {name:<20} {elapsed * 1000:8.2f} ms  {baseline / elapsed:4.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser backends")
+    parser.add_argument("--rounds", type=int, default=50, help="Parses per backend and page")
+    args = parser.parse_args()
+
+    backends = [name for name in parsers.PARSER_BACKENDS if parsers.resolve_backend(name) == name]
+    with open(SEARCH_PAGE, 'r', encoding='utf-8') as f:
+        search_html = f.read()
+    with open(DETAIL_PAGE, 'r', encoding='utf-8') as f:
+        detail_html = f.read()
+
+    print(f"Listings on the search page: {len(full_document_results(search_html))}")
+    run("Search results page", search_html, full_document_results,
+        [(name, lambda html, name=name: parsers.parse_search_results(html, name)) for name in backends], args.rounds)
+    run("Detail page", detail_html, full_document_description,
+        [(name, lambda html, name=name: parsers.parse_detail_description(html, name)) for name in backends], args.rounds)
+    print(f"Default backend: {parsers.resolve_backend()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark the rule-based spec extractor on a labeled fixture set.
+
+Reports how many LLM calls the rules would avoid, how often settled fields
+agree with the labels, and extraction throughput.
+
+Usage: python benchmarks/bench_spec_extractor.py
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spec_extractor import extract_specs, rule_based_result
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "spec_listings.json")
+FIELDS = ("RAM_more", "screen_small", "screen_highres")
+
+def main():
+    with open(FIXTURES, 'r', encoding='utf-8') as f:
+        listings = json.load(f)
+
+    specs_list = [extract_specs(listing.get("title", ""), listing.get("detailed_description", "")) for listing in listings]
+
+    skipped = 0
+    settled_fields = 0
+    correct_fields = 0
+    errors = []
+    for listing, specs in zip(listings, specs_list):
+        if rule_based_result(specs) is not None:
+            skipped += 1
+        for field in FIELDS:
+            if specs[field] is None:
+                continue
+            settled_fields += 1
+            if specs[field] == listing["expected"][field]:
+                correct_fields += 1
+            else:
+                errors.append((listing["title"], field, specs[field], listing["expected"][field]))
+
+    # Throughput over a larger synthetic batch built from the fixtures
+    batch = listings * 200
+    started = time.perf_counter()
+    for listing in batch:
+        extract_specs(listing.get("title", ""), listing.get("detailed_description", ""))
+    elapsed = time.perf_counter() - started
+
+    print(f"Listings:             {len(listings)}")
+    print(f"LLM calls avoided:    {skipped} ({100 * skipped / len(listings):.1f}%)")
+    print(f"Fields settled:       {settled_fields} of {len(listings) * len(FIELDS)}")
+    print(f"Settled accuracy:     {100 * correct_fields / max(settled_fields, 1):.1f}%")
+    print(f"Throughput:           {len(batch) / elapsed:,.0f} listings/s")
+    for title, field, got, expected in errors:
+        print(f"  mismatch: {title!r} {field}: got {got}, expected {expected}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Mock OpenAI-compatible chat completions server for local testing.
+
+Point the scraper at it with LLM_BASE_URL = "http://127.0.0.1:8001/v1" in config.py.
+The server can add latency and answer a share of requests with 429 + Retry-After
+to exercise the retry and rate-budget logic without paying for API calls.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_REPLY = (
+    "The listing mentions 32GB RAM, a 14 inch screen and a 2560x1600 display.\n\n"
+    "RAM_more = true\n"
+    "screen_small = true\n"
+    "screen_highres = true\n"
+    "full_info_obtained = true"
+)
+# Reply for requests asking for structured (JSON schema) output
+CANNED_JSON_REPLY = json.dumps({"RAM_more": "true", "screen_small": "true", "screen_highres": "true"})
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions and GET /stats"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server.stats_lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        started = time.monotonic()
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+
+        if random.random() < self.server.error_rate:
+            with self.server.stats_lock:
+                self.server.stats["rate_limited"] += 1
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": str(self.server.retry_after)}
+            )
+            return
+
+        if self.server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.server.latency)
+
+        reply = CANNED_JSON_REPLY if request.get("response_format") else CANNED_REPLY
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = len(reply) // 4
+        payload = {
+            "id": f"chatcmpl-mock-{self.server.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+        with self.server.stats_lock:
+            self.server.stats["completed"] += 1
+            self.server.stats["latencies"].append(time.monotonic() - started)
+        self._send_json(200, payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(port=8001, latency=0.0, error_rate=0.0, retry_after=1):
+    """Start the mock server in a background thread and return it"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenAIHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.stats = {"requests": 0, "completed": 0, "rate_limited": 0, "latencies": []}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Retry-After seconds sent with 429 responses")
+    args = parser.parse_args()
+
+    start_mock_server(args.port, args.latency, args.error_rate, args.retry_after)
+    print(f"Mock OpenAI server listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,249 @@
+"""End-to-end benchmark: run main.py --mode both against local stand-ins.
+
+Starts the site stand-in (site_server.py) and the mock OpenAI server
+(mock_openai.py), copies the repository to a temporary directory with a
+generated config.py pointing at them, and runs a full scrape and analysis
+with the "http" fetch backend. Reports listings/sec, per-stage wall time,
+p50/p95 request latencies per stage as seen by the servers and, from the
+run's data/metrics.json, as seen by the scraper, plus the peak RSS of the
+run. Everything is saved as JSON in benchmarks/results/ so runs can be
+compared over time.
+
+Usage: python benchmarks/run_benchmark.py --pages 5 --llm-latency 0.5 --error-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, BENCH_DIR)
+
+from site_server import start_site_server
+from mock_openai import start_mock_server
+
+# Not needed to run the scraper, or specific to this checkout
+COPY_IGNORE = shutil.ignore_patterns(".git", "data", "node_modules", "__pycache__", "benchmarks", "config.py")
+
+# Log lines main.py writes at the start of each stage
+STAGE_MARKERS = {
+    "Starting scraping mode": "scrape",
+    "Starting processing mode": "process",
+    "All operations completed": None,
+}
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers, None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def latency_summary(latencies):
+    """Request count and p50/p95 in milliseconds"""
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+    }
+
+def write_config(run_dir, args, site_url, llm_url):
+    """Generate config.py from the template with the benchmark settings appended"""
+    with open(os.path.join(REPO_DIR, "config_template.py"), 'r', encoding='utf-8') as f:
+        template = f.read()
+    overrides = {
+        "API_KEY": "benchmark",
+        "BASE_URL": site_url,
+        "FETCH_BACKEND": "http",
+        "HTTP_CONCURRENCY": args.http_concurrency,
+        "DELAY_BETWEEN_LISTINGS": args.delay,
+        "CRAWL_MAX_RATE": args.max_rate,
+        "PAGES_TO_SCRAPE": args.pages,
+        "BACKFILL_PAGES": args.pages,
+        "LLM_BASE_URL": llm_url,
+        "LLM_CONCURRENCY": args.llm_concurrency,
+        "PROMPT_MODE": args.prompt_mode,
+        "LLM_CACHE_ENABLED": False,
+    }
+    lines = [f"{name} = {value!r}" for name, value in overrides.items()]
+    with open(os.path.join(run_dir, "config.py"), 'w', encoding='utf-8') as f:
+        f.write(template + "\n# Benchmark settings\n" + "\n".join(lines) + "\n")
+    return overrides
+
+def stage_durations(log_text):
+    """Wall time of each stage from the timestamps of main.py's log lines"""
+    marks = []
+    for line in log_text.splitlines():
+        for marker, stage in STAGE_MARKERS.items():
+            if marker in line:
+                stamp = datetime.datetime.strptime(line[:23], "%Y-%m-%d %H:%M:%S,%f")
+                marks.append((stamp, stage))
+    durations = {}
+    for (stamp, stage), (next_stamp, _) in zip(marks, marks[1:]):
+        if stage is not None:
+            durations[stage] = round((next_stamp - stamp).total_seconds(), 3)
+    return durations
+
+def metric_name(name, labels):
+    """Readable key for one metric series, e.g. scraper_fetch_seconds{backend=http,page=detail}"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{key}={value}" for key, value in sorted(labels.items())) + "}"
+
+def summarize_metrics(snapshot):
+    """Counters and histogram p50/p95 (in ms) from a metrics.json snapshot"""
+    counters = {
+        metric_name(name, series["labels"]): series["value"]
+        for name, entries in snapshot.get("counters", {}).items() for series in entries
+    }
+    histograms = {}
+    for name, entries in snapshot.get("histograms", {}).items():
+        for series in entries:
+            histograms[metric_name(name, series["labels"])] = {
+                "count": series["count"],
+                "p50_ms": round(series["p50"] * 1000, 1) if series["p50"] is not None else None,
+                "p95_ms": round(series["p95"] * 1000, 1) if series["p95"] is not None else None,
+            }
+    return {"counters": counters, "histograms": histograms}
+
+def git_revision():
+    """Short commit hash of the benchmarked tree, if it is a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(args):
+    """Run one benchmark and return the results dict"""
+    site = start_site_server(args.site_port, args.pages, args.page_latency, args.detail_latency)
+    llm = start_mock_server(args.llm_port, args.llm_latency, args.error_rate, args.retry_after)
+    site_url = f"http://127.0.0.1:{args.site_port}"
+    llm_url = f"http://127.0.0.1:{args.llm_port}/v1"
+
+    run_dir = tempfile.mkdtemp(prefix="kleinanzeigen-bench-")
+    try:
+        shutil.copytree(REPO_DIR, run_dir, ignore=COPY_IGNORE, dirs_exist_ok=True)
+        settings = write_config(run_dir, args, site_url, llm_url)
+
+        command = [sys.executable, "main.py", "--mode", "both", "--urls", f"{site_url}/s-notebooks/c278"]
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=run_dir, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+        log_text = completed.stdout + completed.stderr
+        listings = []
+        listings_path = os.path.join(run_dir, "data", "listings.json")
+        if os.path.exists(listings_path):
+            with open(listings_path, 'r', encoding='utf-8') as f:
+                listings = json.load(f)
+        snapshot = {}
+        metrics_path = os.path.join(run_dir, "data", "metrics.json")
+        if os.path.exists(metrics_path):
+            with open(metrics_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+    finally:
+        if args.keep:
+            print(f"Run directory kept at {run_dir}")
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        site.shutdown()
+        llm.shutdown()
+
+    if completed.returncode != 0:
+        print(log_text[-4000:], file=sys.stderr)
+
+    analyzed = [listing for listing in listings if listing.get("llm_processed")]
+    site_latencies = site.stats["latencies"]
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "revision": git_revision(),
+        "label": args.label,
+        "settings": {
+            **{name: value for name, value in settings.items() if name not in ("API_KEY", "BASE_URL", "LLM_BASE_URL")},
+            "page_latency": args.page_latency,
+            "detail_latency": args.detail_latency,
+            "llm_latency": args.llm_latency,
+            "error_rate": args.error_rate,
+        },
+        "exit_code": completed.returncode,
+        "wall_seconds": round(wall, 3),
+        "listings": len(listings),
+        "analyzed": len(analyzed),
+        "llm_analyzed": sum(1 for listing in analyzed if listing.get("analysis_source") == "llm"),
+        "listings_per_second": round(len(listings) / wall, 2) if wall else None,
+        "stages": stage_durations(log_text),
+        "requests": {
+            "search": latency_summary(site_latencies.get("search", [])),
+            "detail": latency_summary(site_latencies.get("detail", [])),
+            "llm": {**latency_summary(llm.stats["latencies"]), "rate_limited": llm.stats["rate_limited"]},
+        },
+        "metrics": summarize_metrics(snapshot),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+    }
+
+def print_report(results):
+    """Print a short summary of one run"""
+    print(f"Listings:          {results['listings']} ({results['analyzed']} analyzed, "
+          f"{results['llm_analyzed']} by the LLM)")
+    print(f"Wall time:         {results['wall_seconds']:.2f} s")
+    print(f"Throughput:        {results['listings_per_second']} listings/s")
+    for stage, seconds in results["stages"].items():
+        print(f"Stage {stage + ':':<12} {seconds:.2f} s")
+    for stage, summary in results["requests"].items():
+        line = f"{stage + ' requests:':<18} {summary['count']:>5}   p50 {summary['p50_ms']} ms   p95 {summary['p95_ms']} ms"
+        if "rate_limited" in summary:
+            line += f"   429s {summary['rate_limited']}"
+        print(line)
+    print("Scraper-side latencies:")
+    for name, summary in results["metrics"]["histograms"].items():
+        print(f"  {name:<58} {summary['count']:>5}   p50 {summary['p50_ms']} ms   p95 {summary['p95_ms']} ms")
+    print("Counters:")
+    for name, value in results["metrics"]["counters"].items():
+        print(f"  {name:<58} {value}")
+    print(f"Peak RSS:          {results['peak_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark against local stand-ins")
+    parser.add_argument("--pages", type=int, default=3, help="Result pages to scrape")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="Mean search page latency in seconds")
+    parser.add_argument("--detail-latency", type=float, default=0.2, help="Mean detail page latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Mean LLM response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of LLM requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--delay", type=float, default=0.0, help="DELAY_BETWEEN_LISTINGS (starting page load interval)")
+    parser.add_argument("--max-rate", type=float, default=1000.0, help="CRAWL_MAX_RATE, page loads per second")
+    parser.add_argument("--http-concurrency", type=int, default=8)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--prompt-mode", choices=["reasoning", "compact"], default="reasoning")
+    parser.add_argument("--site-port", type=int, default=8002)
+    parser.add_argument("--llm-port", type=int, default=8001)
+    parser.add_argument("--label", default="", help="Free-form note stored with the results")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary run directory")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+    sys.exit(results["exit_code"])
+
+if __name__ == "__main__":
+    main()
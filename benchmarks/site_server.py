@@ -0,0 +1,171 @@
+"""Local stand-in for the Kleinanzeigen site, serving recorded pages.
+
+Search pages are the recorded results page in fixtures/ with its listing IDs
+shifted per page, so every /seite:N/ page holds new listings. Each listing
+gets the title of the fixture description its detail page serves and a
+short description generated from its ID, so listings on different pages
+don't look like reposts of each other. Detail pages are the recorded detail
+page with a description from the labeled fixture set; the listing ID is
+appended so no two listings share a cache key.
+
+Point the scraper at it with BASE_URL = "http://127.0.0.1:8002" in config.py.
+"""
+import os
+import re
+import html
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEARCH_PAGE = os.path.join(FIXTURES, "search_results.html")
+DETAIL_PAGE = os.path.join(FIXTURES, "detail_page.html")
+DESCRIPTIONS = os.path.join(FIXTURES, "spec_listings.json")
+
+# Listing IDs of page N are the recorded ones plus N * ID_PAGE_OFFSET
+ID_PAGE_OFFSET = 10 ** 10
+
+PAGE_PATTERN = re.compile(r'/seite:(\d+)/')
+AD_ID_PATTERN = re.compile(r'(data-adid="|/)(\d{6,})(?=["\-])')
+DETAIL_ID_PATTERN = re.compile(r'/(\d+)-\d+-\d+/?$')
+DESCRIPTION_PATTERN = re.compile(r'(<p id="viewad-description-text"[^>]*>)(.*?)(</p>)', re.DOTALL)
+RESULTS_PATTERN = re.compile(r'(<ul id="srchrslt-adtable"[^>]*>)(.*?)(</ul>)', re.DOTALL)
+ARTICLE_PATTERN = re.compile(r'<article class="aditem" data-adid="(\d+)".*?</article>', re.DOTALL)
+TITLE_PATTERN = re.compile(r'(<a class="ellipsis"[^>]*>)(.*?)(</a>)', re.DOTALL)
+SNIPPET_PATTERN = re.compile(r'(<p class="aditem-main--middle--description">)(.*?)(</p>)', re.DOTALL)
+
+# Words the generated short descriptions are made of
+SNIPPET_PHRASES = ["Wie neu", "Top Zustand", "Mit OVP", "Akku hält lange", "Kaum benutzt", "Rechnung vorhanden",
+                   "Ladegerät dabei", "Tastatur beleuchtet", "Leichte Gebrauchsspuren", "Frisch aufgesetzt",
+                   "Lüfter gereinigt", "Neues Netzteil", "Kratzer am Deckel", "Original Windows", "Nie repariert",
+                   "Aus erster Hand", "Im Büro genutzt", "Für Studium gekauft", "Displayfolie drauf", "Mit Tasche"]
+SNIPPET_PLACES = ["Schreibtisch", "Homeoffice", "Uni", "Wohnzimmer", "Büro", "Keller", "Werkstatt", "Labor"]
+
+def load_fixture(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def snippet(listing_id):
+    """A short description of its own for every listing ID"""
+    rng = random.Random(listing_id)
+    phrases = rng.sample(SNIPPET_PHRASES, 4)
+    return (f"{'. '.join(phrases)}. Stand im {rng.choice(SNIPPET_PLACES)}, "
+            f"{rng.randrange(20, 900)} Ladezyklen, gekauft {rng.randrange(2018, 2025)}.")
+
+def vary_listing(match, titles):
+    """Give one listing of the results page its fixture title and its own short description"""
+    listing_id = int(match.group(1))
+    title = html.escape(titles[listing_id % len(titles)])
+    article = TITLE_PATTERN.sub(lambda found: found.group(1) + title + found.group(3), match.group(0))
+    return SNIPPET_PATTERN.sub(lambda found: found.group(1) + snippet(listing_id) + found.group(3), article)
+
+def search_page(template, page, pages, titles=None):
+    """The recorded results page with IDs shifted for this page, or an empty list past the last page.
+
+    With titles (those of the fixture descriptions), every listing's text is
+    varied to match the detail page it links to.
+    """
+    if page > pages:
+        return RESULTS_PATTERN.sub(r'\1\3', template)
+    shifted = AD_ID_PATTERN.sub(
+        lambda match: f"{match.group(1)}{int(match.group(2)) + page * ID_PAGE_OFFSET}", template
+    )
+    if titles is None:
+        return shifted
+    return ARTICLE_PATTERN.sub(lambda match: vary_listing(match, titles), shifted)
+
+def detail_page(template, descriptions, listing_id):
+    """The recorded detail page with a fixture description for this listing"""
+    description = descriptions[listing_id % len(descriptions)]
+    text = f"{description}\nAnzeigennummer: {listing_id}".replace("\n", "<br/>")
+    return DESCRIPTION_PATTERN.sub(lambda match: match.group(1) + text + match.group(3), template)
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Answers search pages, /s-anzeige/ detail pages and GET /stats"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.rstrip("/") == "/stats":
+            with self.server.stats_lock:
+                self._send(200, json.dumps(self.server.stats), "application/json")
+            return
+
+        started = time.monotonic()
+        if path.startswith("/s-anzeige/"):
+            kind = "detail"
+            match = DETAIL_ID_PATTERN.search(path)
+            if match is None:
+                self._send(404, "<html><body>Not found</body></html>")
+                return
+            latency = self.server.detail_latency
+            body = detail_page(self.server.detail_template, self.server.descriptions, int(match.group(1)))
+        elif path.startswith("/s-"):
+            kind = "search"
+            match = PAGE_PATTERN.search(path)
+            latency = self.server.page_latency
+            body = search_page(self.server.search_template, int(match.group(1)) if match else 1, self.server.pages,
+                               self.server.titles)
+        else:
+            # Home page, used by the login and cookie checks
+            kind = "other"
+            latency = 0
+            body = '<html><body><a id="user-email" href="/m-meine-anzeigen.html">bench@example.com</a></body></html>'
+
+        if latency:
+            time.sleep(random.uniform(0.5, 1.5) * latency)
+        self._send(200, body)
+
+        with self.server.stats_lock:
+            self.server.stats["requests"][kind] = self.server.stats["requests"].get(kind, 0) + 1
+            self.server.stats["latencies"].setdefault(kind, []).append(time.monotonic() - started)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_site_server(port=8002, pages=5, page_latency=0.0, detail_latency=0.0):
+    """Start the site stand-in in a background thread and return it"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), SiteHandler)
+    server.pages = pages
+    server.page_latency = page_latency
+    server.detail_latency = detail_latency
+    server.search_template = load_fixture(SEARCH_PAGE)
+    server.detail_template = load_fixture(DETAIL_PAGE)
+    listings = json.loads(load_fixture(DESCRIPTIONS))
+    server.descriptions = [listing["detailed_description"] for listing in listings]
+    server.titles = [listing["title"] for listing in listings]
+    server.stats = {"requests": {}, "latencies": {}}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Kleinanzeigen stand-in serving recorded pages")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--pages", type=int, default=5,
+                        help="Number of result pages before the results list comes back empty")
+    parser.add_argument("--page-latency", type=float, default=0.2,
+                        help="Mean search page latency in seconds")
+    parser.add_argument("--detail-latency", type=float, default=0.2,
+                        help="Mean detail page latency in seconds")
+    args = parser.parse_args()
+
+    start_site_server(args.port, args.pages, args.page_latency, args.detail_latency)
+    print(f"Site stand-in listening on http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
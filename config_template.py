@@ -1,11 +1,65 @@
 API_KEY = "YOUR_API_KEY"
 # Scraping settings
+BASE_URL = "https://www.kleinanzeigen.de"
+FETCH_BACKEND = "selenium"  # "selenium", or "http" to fetch pages without a browser using the saved cookies
+BROWSER_PROFILE = "full"  # "full" (visible Chrome), or "lean": headless, no images/fonts/ad hosts, eager page loads
+HTTP_CONCURRENCY = 8  # Maximum parallel requests in the "http" fetch backend
+SCRAPE_PROCESSES = 1  # Processes crawling search URLs in parallel, each with its own browser and a share of the crawl rate
+COORDINATOR_BACKEND = "sqlite"  # Task queue of distributed runs (main.py --coordinate): "sqlite", or "redis" (needs the redis package)
+COORDINATOR_REDIS_URL = "redis://localhost:6379/0"  # Redis server for COORDINATOR_BACKEND = "redis"
+COORDINATOR_HOST = "127.0.0.1"  # Interface the coordinator listens on; "0.0.0.0" accepts workers from other hosts
+COORDINATOR_PORT = 3032  # Port workers (python coordinator.py) connect to
+COORDINATOR_TOKEN = ""  # Shared secret between coordinator and workers (empty: no check)
+LEASE_SECONDS = 60  # A task whose worker stops sending heartbeats for this long goes to another worker
+TASK_MAX_ATTEMPTS = 3  # Leases before a distributed task is given up
+LEASE_BATCH = 4  # Tasks a worker leases at once; their detail pages are fetched in parallel
+FRONTIER_MAX_ATTEMPTS = 3  # Attempts at a failed detail page, across runs, before the listing is saved without its description
+FRONTIER_RUN_MAX_AGE_DAYS = 7  # Days the progress of an interrupted run is kept for a run with the same searches to resume
+PARSER_BACKEND = "auto"  # "auto", "selectolax", "lxml" or "bs4" for parsing search and detail pages
 MAX_LISTINGS_PER_PAGE = 50
-DELAY_BETWEEN_PAGES = 2
-DELAY_BETWEEN_LISTINGS = 2
+DELAY_BETWEEN_LISTINGS = 2  # Starting seconds between page loads; the adaptive rate controller adjusts it
+CRAWL_MIN_RATE = 0.1  # Page loads per second never drop below this when backing off
+CRAWL_MAX_RATE = 2.0  # Page loads per second never exceed this while responses are healthy
+CRAWL_RATE_INCREASE = 0.02  # Added to the rate after each healthy page
+CRAWL_BACKOFF_FACTOR = 0.5  # Rate multiplier after a timeout, block or page without its content
+CRAWL_BURST = 2  # Page loads allowed back to back after an idle period
+BLOCK_COOLDOWN = 60  # Seconds all page loads pause after a captcha page or HTTP 403/429
+SEARCH_PAGE_TIMEOUT = 10  # Seconds to wait for the search results table
+LOGIN_CHECK_TIMEOUT = 10  # Seconds to wait for the header to show the login state
+DETAIL_TABS = 4  # Number of browser tabs fetching detail pages in parallel
+DETAIL_TIMEOUT = 10  # Seconds to wait for a detail page before giving up
 
 # LLM settings
 LLM_MODEL = "gpt-4o-mini"
 PRINT_PROMPT = False
+PROMPT_MODE = "reasoning"  # "reasoning" (step-by-step prompt) or "compact" (JSON-schema structured output)
+DESCRIPTION_TOKEN_BUDGET = 400  # Compact mode: descriptions are trimmed of boilerplate and cut to this many tokens
+LLM_BASE_URL = None  # Set to e.g. "http://127.0.0.1:8001/v1" to use an OpenAI-compatible server
+LLM_CONCURRENCY = 4  # Parallel LLM requests (1 processes listings one at a time)
+LLM_REQUESTS_PER_MINUTE = 500
+LLM_TOKENS_PER_MINUTE = 200000
+LLM_MAX_RETRIES = 6  # Retries for 429s, timeouts and 5xx errors
+LLM_WRITE_BATCH = 10  # Analyzed listings written to the store per batch
+LLM_PRIORITY_WEIGHTS = {"recency": 1.0, "price": 1.0, "prefilter": 0.5}  # Weights of the analysis priority of pending listings
+LLM_RECENCY_HALF_LIFE_HOURS = 24  # The recency part of the priority halves every this many hours
+LLM_PRICE_CEILING = None  # Price ceiling for listings whose search URL has no price filter (None: price doesn't count)
+LLM_RUN_TOKEN_BUDGET = 0  # Most API tokens one run may use (0: no limit); listings beyond it wait for a later run
+LLM_DAILY_TOKEN_BUDGET = 0  # Most API tokens per day across runs (0: no limit)
+LLM_RUN_COST_BUDGET = 0  # Most API cost per run, in the currency of the prices below (0: no limit)
+LLM_DAILY_COST_BUDGET = 0  # Most API cost per day across runs (0: no limit)
+LLM_PROMPT_PRICE = 0.15  # Price per million prompt tokens of LLM_MODEL
+LLM_COMPLETION_PRICE = 0.60  # Price per million completion tokens of LLM_MODEL
+PIPELINE_QUEUE_SIZE = 20  # Scraped listings waiting for analysis in --mode both before the scraper waits
+LLM_CACHE_ENABLED = True  # Reuse results for listings with identical title and description
+LLM_CACHE_MAX_ENTRIES = 50000  # Least recently used results are evicted beyond this
 
-PAGES_TO_SCRAPE = 2
\ No newline at end of file
+PAGES_TO_SCRAPE = 2  # Result pages per search on regular runs
+INCREMENTAL_CRAWL = True  # Stop paginating a search at the first page without new listings
+BACKFILL_PAGES = 20  # Result pages per search on the first crawl of a search and with --backfill
+CHANGE_DETECTION = True  # Re-fetch known listings whose price, title, snippet or location changed
+REPOST_DETECTION = True  # New listings that repost a stored one (same place, near-identical title/snippet) reuse its description and analysis
+REPOST_THRESHOLD = 0.7  # Minimum estimated similarity of title and snippet for a repost
+REPOST_VERIFY = False  # Fetch reposts anyway and analyze them again if the description changed
+ARCHIVE_AFTER_DAYS = 30  # Move listings not seen in any search for this many days to data/archive/ (0 keeps everything hot)
+ARCHIVE_COMPRESSION = "gzip"  # "gzip", or "zstd" (needs the zstandard package) for the archive segments
+WORKER_PORT = 3031  # Local port of the long-running scraper worker (worker.py)
\ No newline at end of file
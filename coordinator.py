@@ -0,0 +1,727 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import argparse
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import config
+import metrics
+from parsers import parse_search_results
+from scraper import (plan_results, save_results, build_page_url, page_limit, newest_id, create_backend,
+                     start_pipeline, worker_profile_dir, FETCH_BACKEND, INCREMENTAL_CRAWL)
+
+# Optional: Redis keeps the task queue outside the coordinator's data directory
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+COORDINATOR_FILENAME = "coordinator.db"
+
+# Where the task queue lives: "sqlite" (data/coordinator.db) or "redis"
+COORDINATOR_BACKEND = getattr(config, "COORDINATOR_BACKEND", "sqlite")
+COORDINATOR_REDIS_URL = getattr(config, "COORDINATOR_REDIS_URL", "redis://localhost:6379/0")
+# Use "0.0.0.0" to accept workers from other hosts
+COORDINATOR_HOST = getattr(config, "COORDINATOR_HOST", "127.0.0.1")
+COORDINATOR_PORT = getattr(config, "COORDINATOR_PORT", 3032)
+# Shared secret workers send with every request (empty: no check)
+COORDINATOR_TOKEN = getattr(config, "COORDINATOR_TOKEN", "")
+# A task whose worker stops sending heartbeats for this long is handed to another worker
+LEASE_SECONDS = getattr(config, "LEASE_SECONDS", 60)
+# Leases (from expiry or reported failures) before a task is given up
+TASK_MAX_ATTEMPTS = getattr(config, "TASK_MAX_ATTEMPTS", 3)
+# Tasks a worker leases at once; detail tasks of one batch are fetched in parallel tabs
+LEASE_BATCH = getattr(config, "LEASE_BATCH", 4)
+
+# Seconds an idle worker waits before asking again
+POLL_SECONDS = 2
+# Detail tasks are handed out before page tasks, so started pages get saved first
+DETAIL_PRIORITY = 0
+PAGE_PRIORITY = 1
+
+class SQLiteTaskQueue:
+    """Leased tasks in an SQLite table.
+
+    A lease marks a queued task as held by a worker until lease_expires;
+    heartbeats push that time back. expire() returns tasks whose lease ran out
+    to the queue, or gives them up after TASK_MAX_ATTEMPTS leases.
+    """
+
+    def __init__(self, db_path, max_attempts=TASK_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks (state, priority)")
+
+    @staticmethod
+    def _task(row):
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+
+    def reset(self):
+        """Drop the tasks of an earlier run"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM tasks")
+
+    def add(self, tasks):
+        """Queue tasks ({id, kind, payload, priority}); known IDs are ignored"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (id, kind, payload, priority) VALUES (?, ?, ?, ?)",
+                [(task["id"], task["kind"], json.dumps(task["payload"]), task["priority"]) for task in tasks]
+            )
+
+    def lease(self, worker, limit=1, lease_seconds=LEASE_SECONDS):
+        """Lease up to limit queued tasks to a worker"""
+        with self._lock, self.conn:
+            rows = self.conn.execute("""
+                UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id IN (SELECT id FROM tasks WHERE state = 'queued' ORDER BY priority, rowid LIMIT ?)
+                RETURNING id, kind, payload, attempts
+            """, (worker, time.time() + lease_seconds, limit)).fetchall()
+        return [self._task(row) for row in rows]
+
+    def heartbeat(self, worker, task_ids, lease_seconds=LEASE_SECONDS):
+        """Extend the worker's leases; return the IDs it still holds"""
+        held = []
+        with self._lock, self.conn:
+            for task_id in task_ids:
+                row = self.conn.execute(
+                    "UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = 'leased' AND worker = ? RETURNING id",
+                    (time.time() + lease_seconds, task_id, worker)
+                ).fetchone()
+                if row:
+                    held.append(row[0])
+        return held
+
+    def expire(self):
+        """Requeue tasks whose lease ran out; return the ones that used up their attempts"""
+        now = time.time()
+        with self._lock, self.conn:
+            failed = self.conn.execute("""
+                UPDATE tasks SET state = 'failed', worker = NULL, error = 'lease expired'
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?
+                RETURNING id, kind, payload, attempts
+            """, (now, self.max_attempts)).fetchall()
+            requeued = self.conn.execute(
+                "UPDATE tasks SET state = 'queued', worker = NULL WHERE state = 'leased' AND lease_expires < ?", (now,)
+            ).rowcount
+        if requeued:
+            logger.warning(f"Requeued {requeued} tasks whose worker stopped sending heartbeats")
+            metrics.inc("coordinator_leases_expired_total", requeued)
+        return [self._task(row) for row in failed]
+
+    def complete(self, worker, task_id):
+        """Mark a task done; return it, or None if another worker holds it or it was finished already.
+
+        A worker whose lease ran out may still complete the task as long as
+        no other worker has leased it since.
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute("""
+                UPDATE tasks SET state = 'done', worker = ?
+                WHERE id = ? AND (state = 'queued' OR (state = 'leased' AND worker = ?))
+                RETURNING id, kind, payload, attempts
+            """, (worker, task_id, worker)).fetchone()
+        return self._task(row) if row else None
+
+    def fail(self, worker, task_id, error):
+        """Return a task the worker couldn't finish to the queue; return it if it is given up instead"""
+        with self._lock, self.conn:
+            row = self.conn.execute("""
+                UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    worker = NULL, error = ?
+                WHERE id = ? AND state = 'leased' AND worker = ?
+                RETURNING id, kind, payload, attempts, state
+            """, (self.max_attempts, error, task_id, worker)).fetchone()
+        return self._task(row) if row and row[4] == "failed" else None
+
+    def counts(self):
+        """Number of tasks per state"""
+        with self._lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class RedisTaskQueue:
+    """The same task queue in Redis (or a Redis-compatible server).
+
+    Each task is a hash, queued task IDs sit in one list per priority and
+    leases in a sorted set scored by expiry time. Only the coordinator talks
+    to Redis, and it serializes its operations, so no scripting is needed.
+    """
+
+    def __init__(self, url=COORDINATOR_REDIS_URL, max_attempts=TASK_MAX_ATTEMPTS, prefix="kleinanzeigen:tasks"):
+        if redis is None:
+            raise RuntimeError("The redis package is needed for COORDINATOR_BACKEND = \"redis\"")
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self._lock = threading.RLock()
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def _task(self, task_id):
+        fields = self.redis.hgetall(self._key("task", task_id))
+        return {"id": task_id, "kind": fields["kind"], "payload": json.loads(fields["payload"]),
+                "attempts": int(fields["attempts"])}
+
+    def reset(self):
+        with self._lock:
+            keys = list(self.redis.scan_iter(match=self._key("*")))
+            if keys:
+                self.redis.delete(*keys)
+
+    def add(self, tasks):
+        with self._lock:
+            for task in tasks:
+                if not self.redis.sadd(self._key("ids"), task["id"]):
+                    continue
+                self.redis.hset(self._key("task", task["id"]), mapping={
+                    "kind": task["kind"], "payload": json.dumps(task["payload"]), "priority": task["priority"],
+                    "state": "queued", "worker": "", "attempts": 0, "error": ""
+                })
+                self.redis.rpush(self._key("queue", task["priority"]), task["id"])
+
+    def lease(self, worker, limit=1, lease_seconds=LEASE_SECONDS):
+        leased = []
+        with self._lock:
+            for priority in (DETAIL_PRIORITY, PAGE_PRIORITY):
+                while len(leased) < limit:
+                    task_id = self.redis.lpop(self._key("queue", priority))
+                    if task_id is None:
+                        break
+                    self.redis.hset(self._key("task", task_id), mapping={"state": "leased", "worker": worker})
+                    self.redis.hincrby(self._key("task", task_id), "attempts", 1)
+                    self.redis.zadd(self._key("leases"), {task_id: time.time() + lease_seconds})
+                    leased.append(self._task(task_id))
+        return leased
+
+    def heartbeat(self, worker, task_ids, lease_seconds=LEASE_SECONDS):
+        held = []
+        with self._lock:
+            for task_id in task_ids:
+                state, holder = self.redis.hmget(self._key("task", task_id), "state", "worker")
+                if state == "leased" and holder == worker:
+                    self.redis.zadd(self._key("leases"), {task_id: time.time() + lease_seconds})
+                    held.append(task_id)
+        return held
+
+    def _unlease(self, task_id, error):
+        """Requeue a leased task, or give it up; return it if given up"""
+        self.redis.zrem(self._key("leases"), task_id)
+        task = self._task(task_id)
+        key = self._key("task", task_id)
+        if task["attempts"] >= self.max_attempts:
+            self.redis.hset(key, mapping={"state": "failed", "worker": "", "error": error})
+            return task
+        self.redis.hset(key, mapping={"state": "queued", "worker": "", "error": error})
+        self.redis.rpush(self._key("queue", self.redis.hget(key, "priority")), task_id)
+        return None
+
+    def expire(self):
+        failed = []
+        with self._lock:
+            expired = self.redis.zrangebyscore(self._key("leases"), "-inf", time.time())
+            for task_id in expired:
+                task = self._unlease(task_id, "lease expired")
+                if task is not None:
+                    failed.append(task)
+        if len(expired) > len(failed):
+            logger.warning(f"Requeued {len(expired) - len(failed)} tasks whose worker stopped sending heartbeats")
+            metrics.inc("coordinator_leases_expired_total", len(expired) - len(failed))
+        return failed
+
+    def complete(self, worker, task_id):
+        with self._lock:
+            key = self._key("task", task_id)
+            state, holder, priority = self.redis.hmget(key, "state", "worker", "priority")
+            if state == "queued":
+                self.redis.lrem(self._key("queue", priority), 0, task_id)
+            elif state != "leased" or holder != worker:
+                return None
+            self.redis.zrem(self._key("leases"), task_id)
+            self.redis.hset(key, mapping={"state": "done", "worker": worker})
+            return self._task(task_id)
+
+    def fail(self, worker, task_id, error):
+        with self._lock:
+            state, holder = self.redis.hmget(self._key("task", task_id), "state", "worker")
+            if state != "leased" or holder != worker:
+                return None
+            return self._unlease(task_id, error)
+
+    def counts(self):
+        with self._lock:
+            task_ids = self.redis.smembers(self._key("ids"))
+            states = [self.redis.hget(self._key("task", task_id), "state") for task_id in task_ids]
+        return {state: states.count(state) for state in set(states)}
+
+    def close(self):
+        self.redis.close()
+
+def create_task_queue(data_dir, backend=COORDINATOR_BACKEND):
+    """Create the configured task queue ("sqlite" or "redis")"""
+    if backend == "redis":
+        return RedisTaskQueue(COORDINATOR_REDIS_URL)
+    return SQLiteTaskQueue(os.path.join(data_dir, COORDINATOR_FILENAME))
+
+def page_task(search_url, page):
+    """Task of loading one result page of a search"""
+    return {
+        "id": f"page:{page}:{search_url}",
+        "kind": "page",
+        "payload": {"search_url": search_url, "page": page, "url": build_page_url(search_url, page)},
+        "priority": PAGE_PRIORITY
+    }
+
+def detail_task(page_task_id, url):
+    """Task of loading the detail page of a listing found by a page task"""
+    return {
+        "id": f"detail:{url}:{page_task_id}",
+        "kind": "detail",
+        "payload": {"page": page_task_id, "url": url},
+        "priority": DETAIL_PRIORITY
+    }
+
+class Coordinator:
+    """Splits one crawl of the search URLs into tasks for remote workers and saves their results.
+
+    The crawl starts with the first result page of every search. A worker
+    that loads a page sends back the parsed results; the coordinator picks
+    the new and changed listings from them (as a local scrape would), queues
+    a detail task for each and, following the incremental crawl rules, the
+    next page of the search. Once all detail pages of a page are back, its
+    listings are saved. Only the coordinator touches the listing store;
+    workers only need a fetch backend.
+    """
+
+    def __init__(self, store, task_queue, urls, max_listings=None, backfill=False, pipeline=None,
+                 lease_seconds=LEASE_SECONDS):
+        self.store = store
+        self.queue = task_queue
+        self.urls = list(urls)
+        self.max_listings = max_listings
+        self.backfill = backfill
+        self.pipeline = pipeline
+        self.lease_seconds = lease_seconds
+        self.run_id = uuid.uuid4().hex
+        self.searches = {}
+        # Page task ID -> plan, fetched descriptions and detail tasks still out
+        self.pages = {}
+        self.scraped = 0
+        self.finished = threading.Event()
+        self._lock = threading.RLock()
+
+    def start(self):
+        """Queue the first page of every search"""
+        for url in self.urls:
+            watermark = self.store.get_watermark(url)
+            self.searches[url] = {
+                "pages": page_limit(self.store, url, self.backfill),
+                "seen_ids": [watermark["newest_id"]] if watermark and watermark["newest_id"] else [],
+                "new_listings": 0,
+                "last_page": 0,
+                "done": False
+            }
+        self.queue.reset()
+        self.queue.add([page_task(url, 1) for url in self.urls])
+        logger.info(f"Coordinating the crawl of {len(self.urls)} searches (run {self.run_id})")
+
+    def lease(self, worker, limit=1):
+        """Hand queued tasks to a worker"""
+        with self._lock:
+            self._expire()
+            tasks = self.queue.lease(worker, limit, self.lease_seconds)
+        for task in tasks:
+            metrics.inc("coordinator_tasks_leased_total", kind=task["kind"])
+        return tasks
+
+    def heartbeat(self, worker, task_ids):
+        """Extend a worker's leases; return the IDs it still holds"""
+        return self.queue.heartbeat(worker, task_ids, self.lease_seconds)
+
+    def complete(self, worker, task_id, result):
+        """Take a finished task's result; False if another worker took the task over"""
+        with self._lock:
+            task = self.queue.complete(worker, task_id)
+            if task is None:
+                return False
+            try:
+                if task["kind"] == "page":
+                    self._page_done(task, result.get("results"))
+                else:
+                    self._detail_done(task, result.get("description") or "")
+                metrics.inc("coordinator_tasks_total", kind=task["kind"], state="done")
+            except Exception as e:
+                # The task is done in the queue now, so nothing would ever finish its page or search
+                logger.error(f"Error taking the result of task {task_id}: {str(e)}")
+                self._given_up(task)
+            self._check_finished()
+        return True
+
+    def fail(self, worker, task_id, error):
+        """A worker couldn't finish a task; it is retried until it runs out of attempts"""
+        logger.warning(f"Worker {worker} failed task {task_id}: {error}")
+        with self._lock:
+            task = self.queue.fail(worker, task_id, error)
+            if task is not None:
+                self._given_up(task)
+                self._check_finished()
+
+    def expire(self):
+        """Requeue the tasks of workers that stopped sending heartbeats"""
+        with self._lock:
+            self._expire()
+            self._check_finished()
+
+    def _expire(self):
+        for task in self.queue.expire():
+            self._given_up(task)
+
+    def _given_up(self, task):
+        """Continue without a task that used up its attempts"""
+        logger.error(f"Giving up on task {task['id']} after {task['attempts']} attempts")
+        metrics.inc("coordinator_tasks_total", kind=task["kind"], state="failed")
+        if task["kind"] == "page":
+            # Like a local crawl, a page that fails to load doesn't end the search
+            self._page_done(task, None)
+        else:
+            # The listing is saved without its description
+            self._detail_done(task, "")
+
+    def _page_done(self, task, results):
+        """Plan the detail tasks of a loaded page and decide whether the search goes on"""
+        search_url, page = task["payload"]["search_url"], task["payload"]["page"]
+        search = self.searches[search_url]
+        search["last_page"] = max(search["last_page"], page)
+        stop = page >= search["pages"]
+
+        if results is not None:
+            # Ad slots between the listings parse as entries without an ID
+            organic = [result for result in results if result["id"] and not result.get("promoted")]
+            search["seen_ids"].extend(result["id"] for result in organic)
+            # Decide before saving, since scraping makes this page's listings known
+            new_ids = {result["id"] for result in organic if not self.store.contains(result["id"])}
+            search["new_listings"] += len(new_ids)
+
+            plan = plan_results(results, self.store, self.max_listings, self.run_id, search_url)
+            # Listings that stop showing up in any search are moved to the archive after a while
+            self.store.touch([result["id"] for result in results if result["id"]], datetime.datetime.now().isoformat())
+
+            entry = {"url": task["payload"]["url"], "plan": plan, "descriptions": {}, "waiting": set()}
+            details = [detail_task(task["id"], url) for url in plan["to_fetch"]]
+            if details:
+                entry["waiting"] = {detail["id"] for detail in details}
+                self.pages[task["id"]] = entry
+                self.queue.add(details)
+            else:
+                self._save_page(entry)
+
+            if INCREMENTAL_CRAWL and not organic:
+                logger.info(f"No more results after page {page - 1} of {search_url}")
+                stop = True
+            elif INCREMENTAL_CRAWL and not new_ids and not self.backfill:
+                logger.info(f"Page {page} holds only known listings, stopping pagination of {search_url}")
+                metrics.inc("scraper_pages_skipped_total", search["pages"] - page)
+                stop = True
+
+        if not stop:
+            self.queue.add([page_task(search_url, page + 1)])
+            return
+        search["done"] = True
+        self.store.set_watermark(search_url, newest_id(search["seen_ids"]), datetime.datetime.now().isoformat(),
+                                 search["last_page"], search["new_listings"])
+
+    def _detail_done(self, task, description):
+        """Collect a detail page; save its page's listings once all of them are in"""
+        entry = self.pages.get(task["payload"]["page"])
+        if entry is None:
+            return
+        entry["descriptions"][task["payload"]["url"]] = description
+        entry["waiting"].discard(task["id"])
+        if not entry["waiting"]:
+            del self.pages[task["payload"]["page"]]
+            self._save_page(entry)
+
+    def _save_page(self, entry):
+        self.scraped += len(save_results(entry["plan"], entry["descriptions"], entry["url"], self.store, self.pipeline))
+        metrics.flush()
+
+    def _check_finished(self):
+        if not self.pages and all(search["done"] for search in self.searches.values()):
+            self.finished.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "finished": self.finished.is_set(),
+                "scraped": self.scraped,
+                "tasks": self.queue.counts(),
+                "searches": {
+                    url: {"last_page": search["last_page"], "done": search["done"]}
+                    for url, search in self.searches.items()
+                }
+            }
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """POST /lease, /heartbeat, /complete and /fail for workers, GET /status"""
+
+    coordinator = None
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self):
+        if COORDINATOR_TOKEN and self.headers.get("Authorization") != f"Bearer {COORDINATOR_TOKEN}":
+            self._send_json(401, {"error": "Unauthorized"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/status":
+            self._send_json(200, self.coordinator.status())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            worker = str(body["worker"])
+            if self.path == "/lease":
+                tasks = self.coordinator.lease(worker, int(body.get("limit") or 1))
+                self._send_json(200, {"tasks": tasks, "lease_seconds": self.coordinator.lease_seconds,
+                                      "finished": self.coordinator.finished.is_set()})
+            elif self.path == "/heartbeat":
+                self._send_json(200, {"held": self.coordinator.heartbeat(worker, body["tasks"])})
+            elif self.path == "/complete":
+                self._send_json(200, {"accepted": self.coordinator.complete(worker, body["task"], body["result"])})
+            elif self.path == "/fail":
+                self.coordinator.fail(worker, body["task"], str(body.get("error")))
+                self._send_json(200, {})
+            else:
+                self._send_json(404, {"error": "Not found"})
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": f"Invalid request: {str(e)}"})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {str(e)}")
+            self._send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def run_coordinator(store, urls, max_listings=None, backfill=False, process_immediately=False,
+                    port=COORDINATOR_PORT, backend=COORDINATOR_BACKEND, spending=None):
+    """Serve the crawl of the search URLs to remote workers until it is done; returns the listings scraped"""
+    task_queue = create_task_queue(os.path.dirname(store.db_path), backend)
+    pipeline = start_pipeline(store, process_immediately, spending)
+    coordinator = Coordinator(store, task_queue, urls, max_listings, backfill, pipeline)
+    CoordinatorHandler.coordinator = coordinator
+    server = ThreadingHTTPServer((COORDINATOR_HOST, port), CoordinatorHandler)
+    threading.Thread(target=server.serve_forever, name="coordinator-http", daemon=True).start()
+    logger.info(f"Coordinator accepting workers at http://{COORDINATOR_HOST}:{port}")
+
+    try:
+        coordinator.start()
+        # Leases of dead workers must run out even while no other worker asks for work
+        while not coordinator.finished.wait(timeout=POLL_SECONDS):
+            coordinator.expire()
+            metrics.flush()
+        logger.info(f"Distributed crawl finished: {coordinator.scraped} listings scraped")
+        # Give polling workers the chance to see that the run is over
+        time.sleep(2 * POLL_SECONDS)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if pipeline is not None:
+            pipeline.close()
+        store.release_claims(coordinator.run_id)
+        task_queue.close()
+    return coordinator.scraped
+
+class CoordinatorClient:
+    """JSON requests of a worker to the coordinator"""
+
+    def __init__(self, base_url, token=COORDINATOR_TOKEN, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def post(self, path, **body):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode('utf-8'),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+class LeaseKeeper:
+    """Background heartbeats for the tasks a worker is working on"""
+
+    def __init__(self, client, worker, task_ids, lease_seconds):
+        self.client = client
+        self.worker = worker
+        self.task_ids = set(task_ids)
+        self.interval = max(1, lease_seconds / 3)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def done(self, task_id):
+        """Stop renewing a finished task"""
+        with self._lock:
+            self.task_ids.discard(task_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                task_ids = list(self.task_ids)
+            try:
+                held = set(self.client.post("/heartbeat", worker=self.worker, tasks=task_ids)["held"])
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {str(e)}")
+                continue
+            for task_id in set(task_ids) - held:
+                logger.warning(f"Lease on {task_id} was lost")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self.thread.join()
+
+def report(client, path, **body):
+    """Send a task's outcome; if the coordinator can't take it, the lease runs out and the task is retried"""
+    try:
+        client.post(path, **body)
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        logger.warning(f"Couldn't report task {body.get('task')} to the coordinator ({str(e)}), leaving it to expire")
+        metrics.inc("worker_reports_failed_total")
+
+def run_tasks(fetch_backend, client, worker, tasks, keeper):
+    """Work through leased tasks and report each one; detail pages are fetched together"""
+    for task in tasks:
+        if task["kind"] != "page":
+            continue
+        html = fetch_backend.fetch_search_page(task["payload"]["url"])
+        if html is None:
+            report(client, "/fail", worker=worker, task=task["id"], error="search page failed to load")
+        else:
+            report(client, "/complete", worker=worker, task=task["id"], result={"results": parse_search_results(html)})
+        keeper.done(task["id"])
+
+    details = [task for task in tasks if task["kind"] == "detail"]
+    if not details:
+        return
+    descriptions = fetch_backend.fetch_details([task["payload"]["url"] for task in details])
+    for task in details:
+        description = descriptions.get(task["payload"]["url"])
+        # None: the page didn't load; an empty description is a result like any other
+        if description is None:
+            report(client, "/fail", worker=worker, task=task["id"], error="detail page failed to load")
+        else:
+            report(client, "/complete", worker=worker, task=task["id"], result={"description": description})
+        keeper.done(task["id"])
+
+def run_worker(coordinator_url, backend=FETCH_BACKEND, worker=None, profile_index=None, once=False,
+               lease_batch=LEASE_BATCH):
+    """Lease and work on tasks from a coordinator, possibly on another host.
+
+    Keeps waiting for the next crawl after one finishes, unless once is set.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    os.makedirs(data_dir, exist_ok=True)
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    client = CoordinatorClient(coordinator_url)
+    # Workers sharing a host (and Chrome profile directory) each need their own profile copy
+    user_data_dir = worker_profile_dir(data_dir, profile_index) if profile_index is not None else None
+    fetch_backend = create_backend(data_dir, backend, user_data_dir=user_data_dir)
+    logger.info(f"Worker {worker} taking tasks from {coordinator_url}")
+
+    reached = False
+    try:
+        while True:
+            try:
+                reply = client.post("/lease", worker=worker, limit=lease_batch)
+                reached = True
+            except (urllib.error.URLError, ConnectionError) as e:
+                # The coordinator is not up yet, or is gone once its run finished
+                if once and reached:
+                    logger.info("Coordinator is gone, stopping")
+                    break
+                logger.info(f"Coordinator not reachable ({str(e)}), retrying")
+                time.sleep(POLL_SECONDS)
+                continue
+
+            if not reply["tasks"]:
+                if once and reply["finished"]:
+                    logger.info("Crawl finished, stopping")
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+
+            with LeaseKeeper(client, worker, [task["id"] for task in reply["tasks"]], reply["lease_seconds"]) as keeper:
+                with metrics.timer("worker_task_batch_seconds"):
+                    run_tasks(fetch_backend, client, worker, reply["tasks"], keeper)
+            metrics.inc("worker_tasks_total", len(reply["tasks"]))
+    finally:
+        fetch_backend.close()
+
+def main():
+    """Run a remote worker against a coordinator started with main.py --coordinate"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Scrape worker taking page and detail tasks from a coordinator")
+    parser.add_argument("--coordinator", default=f"http://127.0.0.1:{COORDINATOR_PORT}",
+                        help="Base URL of the coordinator")
+    parser.add_argument("--backend", choices=["selenium", "http"], default=FETCH_BACKEND, help="Fetch backend")
+    parser.add_argument("--worker-id", default=None, help="Name reported to the coordinator (default: host-pid)")
+    parser.add_argument("--profile-index", type=int, default=None,
+                        help="Use Chrome profile copy n, for several Selenium workers on one host")
+    parser.add_argument("--once", action="store_true", help="Exit when the current crawl finishes")
+    args = parser.parse_args()
+    run_worker(args.coordinator, args.backend, args.worker_id, args.profile_index, args.once)
+
+if __name__ == "__main__":
+    main()
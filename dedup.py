@@ -0,0 +1,156 @@
+import re
+import time
+import array
+import struct
+import hashlib
+import logging
+import config
+import metrics
+from parsers import DISTANCE_PATTERN
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+REPOST_DETECTION = getattr(config, "REPOST_DETECTION", True)
+# Estimated Jaccard similarity of the title/snippet shingles above which a new listing counts as a repost
+REPOST_THRESHOLD = getattr(config, "REPOST_THRESHOLD", 0.7)
+# Fetch the detail page of a repost anyway and analyze it again if the description changed
+REPOST_VERIFY = getattr(config, "REPOST_VERIFY", False)
+
+# 16 bands of 4 rows: listings at 0.7 similarity share a band with ~99% probability, at 0.3 with ~12%
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# One SHAKE-256 digest per shingle provides all 64 32-bit hash values at once
+SHINGLE_HASHES = struct.Struct(f"<{NUM_HASHES}I")
+
+# Masks for comparing all 32-bit hash values of two packed signatures in a few integer operations
+LANE_LOW_BITS = int.from_bytes(b"\xff\xff\xff\x7f" * NUM_HASHES, 'little')
+LANE_HIGH_BIT = int.from_bytes(b"\x00\x00\x00\x80" * NUM_HASHES, 'little')
+
+# Fields a repost takes over from the listing it reposts
+INHERITED_FIELDS = (
+    "detailed_description", "llm_processed", "llm_processed_time", "full_info_obtained",
+    "RAM_more", "screen_small", "screen_highres", "analysis_source"
+)
+
+# Listings signed per pass when indexing the existing store
+INDEX_BATCH = 1000
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def shingles(listing):
+    """Word bigrams (single words for one-word texts) of the title and of the short description"""
+    result = set()
+    for field in ("title", "short_description"):
+        tokens = TOKEN_PATTERN.findall(str(listing.get(field) or "").lower())
+        if len(tokens) == 1:
+            result.add(f"{field}:{tokens[0]}")
+        result.update(f"{field}:{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    return result
+
+def location_key(listing):
+    """Seller location without the search distance; reposts come from the same place"""
+    location = DISTANCE_PATTERN.sub("", str(listing.get("location") or ""))
+    return re.sub(r'\s+', ' ', location).strip().lower()
+
+def minhash(listing):
+    """MinHash signature of the listing's shingles (empty if it has no text)"""
+    hashed = [
+        SHINGLE_HASHES.unpack(hashlib.shake_256(shingle.encode('utf-8')).digest(SHINGLE_HASHES.size))
+        for shingle in shingles(listing)
+    ]
+    return list(map(min, zip(*hashed)))
+
+def band_hashes(signature, location):
+    """One LSH bucket key per band, scoped to the seller location"""
+    keys = []
+    prefix = location.encode('utf-8') + b"\0"
+    for band in range(BANDS if signature else 0):
+        rows = array.array('I', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        digest = hashlib.blake2b(prefix + bytes([band]) + rows, digest_size=8).digest()
+        # Signed, to fit an SQLite INTEGER
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+def similarity(packed, other):
+    """Estimated Jaccard similarity of two packed signatures.
+
+    The signatures are read as one integer each; a 32-bit lane of their XOR
+    is zero where the hash values agree, and the high bit of each zero lane
+    is counted at once instead of comparing 64 values one by one.
+    """
+    diff = int.from_bytes(packed, 'little') ^ int.from_bytes(other, 'little')
+    nonzero = ((diff & LANE_LOW_BITS) + LANE_LOW_BITS) | diff | LANE_LOW_BITS
+    return (~nonzero & LANE_HIGH_BIT).bit_count() / NUM_HASHES
+
+def pack(signature):
+    return array.array('I', signature).tobytes()
+
+class RepostIndex:
+    """MinHash/LSH index of stored listings for spotting reposts on search result pages.
+
+    Sellers repost the same laptop under a new ad ID with a slightly edited
+    title or price. Each listing's title and short description are reduced to
+    a 64-value MinHash signature and 16 LSH band hashes scoped to the seller
+    location, kept in the listing store. A lookup is one query on a covering
+    index of the band hashes plus a signature comparison per candidate. Its
+    cost grows with the number of similar listings from the same place, not
+    with the size of the store (bench_dedup.py reports p50/p95).
+    """
+
+    def __init__(self, store, threshold=REPOST_THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+
+    def find(self, listing):
+        """Return the stored listing this one most likely reposts, or None"""
+        started = time.perf_counter()
+        signature = minhash(listing)
+        candidates = self.store.repost_candidates(band_hashes(signature, location_key(listing)))
+        packed = pack(signature)
+        best_id, best_score = None, self.threshold
+        for candidate_id, blob in candidates.items():
+            if candidate_id == listing["id"]:
+                continue
+            score = similarity(packed, blob)
+            if score >= best_score:
+                best_id, best_score = candidate_id, score
+        metrics.observe("dedup_lookup_seconds", time.perf_counter() - started)
+        if best_id is None:
+            return None
+        # The original may have moved to the archive since
+        original = self.store.get(best_id)
+        if original is None and self.store.archive is not None:
+            original = self.store.archive.get(best_id)
+        if original is not None:
+            logger.info(f"{listing.get('title')} looks like a repost of {best_id} ({best_score:.0%} similar)")
+        return original
+
+    def add(self, listings):
+        """Index (or re-index, after a change) the given listings"""
+        entries = []
+        for listing in listings:
+            signature = minhash(listing)
+            entries.append((listing["id"], pack(signature), band_hashes(signature, location_key(listing))))
+        self.store.add_repost_signatures(entries)
+
+    def index_missing(self):
+        """Index stored listings saved before repost detection; returns how many were added"""
+        indexed = 0
+        while True:
+            listings = self.store.without_repost_signature(INDEX_BATCH)
+            if not listings:
+                break
+            self.add(listings)
+            indexed += len(listings)
+        if indexed:
+            logger.info(f"Indexed {indexed} stored listings for repost detection")
+        return indexed
+
+def inherit(listing, original):
+    """Take over the description and analysis of the listing it reposts"""
+    listing.update({field: original[field] for field in INHERITED_FIELDS if field in original})
+    listing["repost_of"] = original["id"]
+    metrics.inc("scraper_reposts_total")
+    return listing
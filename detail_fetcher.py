@@ -0,0 +1,145 @@
+import time
+import logging
+from collections import deque
+import config
+import metrics
+from rate_limit import AdaptiveRateController, block_reason
+from parsers import parse_detail_description
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DETAIL_TABS = getattr(config, "DETAIL_TABS", 4)
+DETAIL_TIMEOUT = getattr(config, "DETAIL_TIMEOUT", 10)
+
+# How often the in-flight tabs are polled for a finished page
+POLL_INTERVAL = 0.2
+
+# Navigate without blocking the driver, and leave a marker on the old document
+# so we can tell when the new page has actually replaced it
+NAVIGATE_SCRIPT = """
+window.__detailFetchPending = true;
+window.location.href = arguments[0];
+"""
+
+# Return the page HTML once the new document has its description block
+READY_SCRIPT = """
+if (window.__detailFetchPending) { return null; }
+if (!document.getElementById('viewad-description')) { return null; }
+return document.documentElement.outerHTML;
+"""
+
+class DetailFetcher:
+    """Fetch listing detail pages over a pool of tabs in one logged-in browser.
+
+    All tabs share the driver's profile and cookies. Navigations are started
+    without waiting for the page to load, so up to `tabs` detail pages are in
+    flight at once; a shared AdaptiveRateController paces the navigations
+    themselves and is told how each page turned out.
+    The search results page is never reloaded.
+    """
+
+    def __init__(self, driver, tabs=DETAIL_TABS, rate_controller=None, timeout=DETAIL_TIMEOUT, setup_tab=None):
+        self.driver = driver
+        self.timeout = timeout
+        self.rate_controller = rate_controller or AdaptiveRateController()
+        self.main_handle = driver.current_window_handle
+        self.handles = []
+
+        # Open the worker tabs up front and return to the main tab
+        for _ in range(max(1, tabs)):
+            driver.switch_to.new_window('tab')
+            if setup_tab is not None:
+                # Per-tab CDP settings (anti-detection script, blocked URLs)
+                setup_tab()
+            self.handles.append(driver.current_window_handle)
+        driver.switch_to.window(self.main_handle)
+
+    def _start(self, handle, url):
+        """Start loading url in the given tab without waiting for it"""
+        self.rate_controller.wait()
+        logger.info(f"Getting detailed description from: {url}")
+        self.driver.switch_to.window(handle)
+        self.driver.execute_script(NAVIGATE_SCRIPT, url)
+
+    def _poll(self, handle):
+        """Return the page HTML if the tab has finished loading, otherwise None"""
+        self.driver.switch_to.window(handle)
+        return self.driver.execute_script(READY_SCRIPT)
+
+    def _record_timeout(self, handle):
+        """Back off after a detail page that never showed its description"""
+        try:
+            html = self.driver.execute_script("return document.documentElement.outerHTML")
+        except Exception:
+            html = ""
+        reason = block_reason(html)
+        if reason is not None:
+            self.rate_controller.record_failure(reason, block=True)
+        else:
+            self.rate_controller.record_failure("timeout")
+
+    def fetch_all(self, urls):
+        """Fetch detailed descriptions for all URLs, returning a dict of url -> description (None if it failed)"""
+        results = {}
+        pending = deque(urls)
+        free_handles = list(self.handles)
+        in_flight = {}
+
+        try:
+            while pending or in_flight:
+                # Hand pending URLs to idle tabs
+                while pending and free_handles:
+                    handle = free_handles.pop()
+                    url = pending.popleft()
+                    try:
+                        self._start(handle, url)
+                        in_flight[handle] = (url, time.monotonic())
+                    except Exception as e:
+                        logger.error(f"Error getting detailed description: {str(e)}")
+                        metrics.inc("scraper_fetch_errors_total", backend="selenium")
+                        results[url] = None
+                        free_handles.append(handle)
+
+                # Collect finished or timed out tabs
+                for handle, (url, started) in list(in_flight.items()):
+                    try:
+                        html = self._poll(handle)
+                    except Exception as e:
+                        logger.error(f"Error getting detailed description: {str(e)}")
+                        metrics.inc("scraper_fetch_errors_total", backend="selenium")
+                        html = ""
+
+                    if html is None:
+                        if time.monotonic() - started < self.timeout:
+                            continue
+                        logger.warning(f"Timeout waiting for detailed description to load: {url}")
+                        metrics.inc("scraper_fetch_timeouts_total", backend="selenium")
+                        self._record_timeout(handle)
+                        html = ""
+                    else:
+                        metrics.observe("scraper_fetch_seconds", time.monotonic() - started,
+                                        backend="selenium", page="detail")
+                        self.rate_controller.record_success()
+
+                    results[url] = parse_detail_description(html) if html else None
+                    del in_flight[handle]
+                    free_handles.append(handle)
+
+                if in_flight:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            self.driver.switch_to.window(self.main_handle)
+
+        return results
+
+    def close(self):
+        """Close the worker tabs and return to the main tab"""
+        for handle in self.handles:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception:
+                pass
+        self.handles = []
+        self.driver.switch_to.window(self.main_handle)
@@ -0,0 +1,56 @@
+import os
+import json
+import logging
+import datetime
+import threading
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+EVENTS_FILENAME = "events.ndjson"
+
+# The event log starts over once it grows beyond this many bytes
+EVENTS_MAX_BYTES = 5 * 1024 * 1024
+
+# Fields left out of events; the web UI fetches them on request
+OMITTED_FIELDS = ("detailed_description",)
+
+_events_path = None
+_lock = threading.Lock()
+
+def configure(data_dir):
+    """Append events to data_dir/events.ndjson from now on"""
+    global _events_path
+    _events_path = os.path.join(data_dir, EVENTS_FILENAME)
+
+def listing_summary(listing):
+    """The listing as sent to the web UI"""
+    return {key: value for key, value in listing.items() if key not in OMITTED_FIELDS}
+
+def emit_many(event_type, listings):
+    """Append one event per listing to the event log, one JSON object per line.
+
+    Event types are "listing-created" and "listing-updated" (from the scraper)
+    and "listing-analyzed" (from the processor). server.js tails the file and
+    relays new lines to the browser as Server-Sent Events.
+    """
+    if _events_path is None or not listings:
+        return
+    now = datetime.datetime.now().isoformat()
+    lines = "".join(
+        json.dumps({"type": event_type, "time": now, "listing": listing_summary(listing)}, ensure_ascii=False) + "\n"
+        for listing in listings
+    )
+    with _lock:
+        try:
+            # Start a new log instead of growing forever; readers notice the file shrank
+            if os.path.exists(_events_path) and os.path.getsize(_events_path) > EVENTS_MAX_BYTES:
+                os.replace(_events_path, _events_path + ".1")
+            with open(_events_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        except OSError as e:
+            logger.error(f"Error writing events: {str(e)}")
+
+def emit(event_type, listing):
+    """Append a single listing event"""
+    emit_many(event_type, [listing])
@@ -0,0 +1,203 @@
+import os
+import json
+import sqlite3
+import logging
+import datetime
+import threading
+import config
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+FRONTIER_FILENAME = "frontier.db"
+
+# Detail pages are fetched this many times across runs before a listing is saved without its description
+FRONTIER_MAX_ATTEMPTS = getattr(config, "FRONTIER_MAX_ATTEMPTS", 3)
+# Progress of an interrupted run not resumed within this many days is forgotten
+FRONTIER_RUN_MAX_AGE_DAYS = getattr(config, "FRONTIER_RUN_MAX_AGE_DAYS", 7)
+
+def run_key(urls, backfill=False, max_listings=None):
+    """Journal key of a run: runs with the same searches and options share their progress"""
+    return json.dumps([list(urls), backfill, max_listings])
+
+class Frontier:
+    """Durable journal of a scrape run's progress, in data/frontier.db.
+
+    For every search of the run it records the last result page completed,
+    and for every new listing the detail fetch still to do (with the search
+    result it came from). Page progress is kept per run key (the searches
+    and options), so a run started again with the same searches after a
+    crash or restart continues at the next page of each search and skips
+    searches it had finished, even if runs over other searches came in
+    between. Detail fetches that failed are retried by later runs, at most
+    FRONTIER_MAX_ATTEMPTS times, and not again within the run that tried
+    them. The journal lives in its own SQLite file and can be shared by the
+    processes of a parallel scrape, which pass the run key of the parent.
+    """
+
+    def __init__(self, data_dir, max_attempts=FRONTIER_MAX_ATTEMPTS, key=None):
+        self.max_attempts = max_attempts
+        self.key = key
+        # Listings whose detail page this instance journaled (and so fetched) during the run
+        self.attempted = set()
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(data_dir, FRONTIER_FILENAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS frontier_runs (
+                    key TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    started_time TEXT
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS frontier_pages (
+                    run_key TEXT NOT NULL,
+                    search_url TEXT NOT NULL,
+                    last_page INTEGER NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    updated_time TEXT,
+                    PRIMARY KEY (run_key, search_url)
+                )
+            """)
+            # Journals from before page progress was kept per run held a single run
+            if self.conn.execute("SELECT name FROM sqlite_master WHERE name = 'frontier_searches'").fetchone():
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO frontier_pages (run_key, search_url, last_page, done, updated_time)
+                    SELECT frontier_runs.key, search_url, last_page, done, updated_time
+                    FROM frontier_searches, frontier_runs
+                """)
+                self.conn.execute("DROP TABLE frontier_searches")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS frontier_details (
+                    id TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_time TEXT
+                )
+            """)
+
+    def unfinished_runs(self):
+        """Parameters of the runs that were interrupted, oldest first"""
+        with self._lock:
+            rows = self.conn.execute("SELECT params FROM frontier_runs ORDER BY started_time").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def begin(self, urls, backfill=False, max_listings=None, process_immediately=False):
+        """Start a run, or resume the interrupted one with the same parameters; True when resuming"""
+        params = {"urls": list(urls), "backfill": backfill, "max_listings": max_listings,
+                  "process_immediately": process_immediately}
+        self.key = run_key(urls, backfill, max_listings)
+        self.attempted = set()
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=FRONTIER_RUN_MAX_AGE_DAYS)).isoformat()
+        with self._lock, self.conn:
+            # Pending detail fetches are kept; they don't depend on the searches
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT key FROM frontier_runs WHERE started_time < ? AND key != ?", (cutoff, self.key)
+            )]
+            if stale:
+                logger.info(f"Forgetting the progress of {len(stale)} crawls interrupted more than "
+                            f"{FRONTIER_RUN_MAX_AGE_DAYS} days ago")
+                self._forget(stale)
+            row = self.conn.execute("SELECT started_time FROM frontier_runs WHERE key = ?", (self.key,)).fetchone()
+            if row:
+                logger.info(f"Resuming the crawl started at {row[0]}")
+                metrics.inc("frontier_resumes_total")
+                return True
+            self.conn.execute(
+                "INSERT INTO frontier_runs (key, params, started_time) VALUES (?, ?, ?)",
+                (self.key, json.dumps(params), datetime.datetime.now().isoformat())
+            )
+        return False
+
+    def _forget(self, keys):
+        """Drop the runs and their page progress (callers hold the lock and a transaction)"""
+        self.conn.executemany("DELETE FROM frontier_runs WHERE key = ?", [(key,) for key in keys])
+        self.conn.executemany("DELETE FROM frontier_pages WHERE run_key = ?", [(key,) for key in keys])
+
+    def finish(self, urls):
+        """Forget the run's progress if all its searches are done; True if they were"""
+        urls = set(urls)
+        with self._lock, self.conn:
+            done = {row[0] for row in self.conn.execute(
+                "SELECT search_url FROM frontier_pages WHERE run_key = ? AND done = 1", (self.key,)
+            )}
+            if not urls <= done:
+                logger.warning(f"{len(urls - done)} searches did not finish; the next run with them resumes")
+                return False
+            self._forget([self.key])
+        return True
+
+    def next_page(self, search_url):
+        """First result page still to crawl for a search, or None if the run already finished it"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT last_page, done FROM frontier_pages WHERE run_key = ? AND search_url = ?",
+                (self.key, search_url)
+            ).fetchone()
+        if row is None:
+            return 1
+        last_page, done = row
+        return None if done else last_page + 1
+
+    def page_done(self, search_url, page, search_done=False):
+        """Record that a result page (and with it the search, if search_done) is complete"""
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO frontier_pages (run_key, search_url, last_page, done, updated_time) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(run_key, search_url) DO UPDATE SET
+                    last_page = MAX(last_page, excluded.last_page),
+                    done = excluded.done,
+                    updated_time = excluded.updated_time
+            """, (self.key, search_url, page, 1 if search_done else 0, datetime.datetime.now().isoformat()))
+
+    def add_details(self, results):
+        """Journal the detail fetches about to start, keeping the attempts of known ones"""
+        self.attempted.update(result["id"] for result in results)
+        now = datetime.datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier_details (id, result, updated_time) VALUES (?, ?, ?)",
+                [(result["id"], json.dumps(result, ensure_ascii=False), now) for result in results]
+            )
+
+    def details_done(self, listing_ids):
+        """Remove detail fetches whose listing is saved"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM frontier_details WHERE id = ?", [(listing_id,) for listing_id in listing_ids])
+
+    def retry_later(self, listing_id, error):
+        """Count a failed detail fetch; True if it will be retried, False once attempts are used up"""
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "UPDATE frontier_details SET attempts = attempts + 1, last_error = ?, updated_time = ? "
+                "WHERE id = ? RETURNING attempts",
+                (error, datetime.datetime.now().isoformat(), listing_id)
+            ).fetchone()
+            if row is None:
+                return False
+            if row[0] < self.max_attempts:
+                metrics.inc("frontier_detail_retries_total")
+                return True
+            self.conn.execute("DELETE FROM frontier_details WHERE id = ?", (listing_id,))
+        logger.warning(f"Giving up on the detail page of {listing_id} after {row[0]} attempts: {error}")
+        metrics.inc("frontier_detail_failures_total")
+        return False
+
+    def not_attempted(self, results):
+        """Search results whose detail page this run has not fetched yet"""
+        return [result for result in results if result["id"] not in self.attempted]
+
+    def pending_details(self):
+        """Search results of listings whose detail fetch is still to do"""
+        with self._lock:
+            rows = self.conn.execute("SELECT result FROM frontier_details ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        """Close the journal database"""
+        with self._lock:
+            self.conn.close()
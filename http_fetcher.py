@@ -0,0 +1,198 @@
+import os
+import time
+import pickle
+import asyncio
+import logging
+import aiohttp
+from yarl import URL
+import config
+import metrics
+from rate_limit import AdaptiveRateController, block_reason
+from parsers import parse_detail_description
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+BASE_URL = getattr(config, "BASE_URL", "https://www.kleinanzeigen.de").rstrip('/')
+HTTP_CONCURRENCY = getattr(config, "HTTP_CONCURRENCY", 8)
+HTTP_TIMEOUT = getattr(config, "HTTP_TIMEOUT", 15)
+HTTP_USER_AGENT = getattr(
+    config, "HTTP_USER_AGENT",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+# Status codes the site answers with when it throttles or blocks us
+BLOCK_STATUS_CODES = (401, 403, 429, 503)
+
+# Redirect targets that mean our session cookies are no longer accepted
+LOGIN_URL_MARKERS = ("/m-einloggen", "/login")
+
+def load_cookie_file(path):
+    """Load the Selenium cookies written by scraper.save_cookies"""
+    if not os.path.exists(path):
+        logger.warning(f"Cookie file not found: {path}")
+        return []
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+def has_element(html, required_id):
+    """Check that the page holds the element with the given ID"""
+    return f'id="{required_id}"' in html or f"id='{required_id}'" in html
+
+def detect_block(status, final_url, html, required_id):
+    """Return why a response looks like a block or login wall, or None if it doesn't.
+
+    A page that merely lacks the expected element (a deleted ad, a 404, a
+    redirect to the search page) is not a block.
+    """
+    if status in BLOCK_STATUS_CODES:
+        return f"HTTP {status}"
+    if any(marker in final_url for marker in LOGIN_URL_MARKERS):
+        return "login wall"
+    if not has_element(html, required_id):
+        return block_reason(html)
+    return None
+
+class HttpBackend:
+    """Browserless fetch backend reusing the saved Selenium session cookies.
+
+    Pages are fetched with aiohttp over one pooled keep-alive session at
+    bounded concurrency. When a response looks like a block or login wall the
+    backend switches to a Selenium backend (created on first use by
+    fallback_factory) for the rest of the run. A page that only lacks its
+    content counts as a failure of that URL.
+    """
+
+    def __init__(self, cookies_path, fallback_factory=None, concurrency=HTTP_CONCURRENCY, rate_controller=None):
+        self.cookies = load_cookie_file(cookies_path)
+        self.fallback_factory = fallback_factory
+        self.concurrency = concurrency
+        self.rate_controller = rate_controller or AdaptiveRateController()
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.semaphore = None
+        self.fallback = None
+        self.blocked = False
+
+    async def _get_session(self):
+        """Create the shared HTTP session on first use"""
+        if self.session is None:
+            jar = aiohttp.CookieJar(unsafe=True)
+            jar.update_cookies(
+                {cookie["name"]: cookie["value"] for cookie in self.cookies},
+                response_url=URL(BASE_URL)
+            )
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                cookie_jar=jar,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+                headers={
+                    "User-Agent": HTTP_USER_AGENT,
+                    "Accept-Language": "de-DE,de;q=0.9,en;q=0.8",
+                }
+            )
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.session
+
+    async def _fetch(self, url, required_id):
+        """Fetch one page, returning (html, block_reason); html is None if the page failed to load"""
+        session = await self._get_session()
+        page = "search" if required_id == "srchrslt-adtable" else "detail"
+        async with self.semaphore:
+            await self.rate_controller.wait_async()
+            started = time.monotonic()
+            try:
+                async with session.get(url) as response:
+                    html = await response.text()
+                    metrics.observe("scraper_fetch_seconds", time.monotonic() - started, backend="http", page=page)
+                    reason = detect_block(response.status, str(response.url), html, required_id)
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout fetching {url}")
+                metrics.inc("scraper_fetch_timeouts_total", backend="http")
+                self.rate_controller.record_failure("timeout")
+                return None, None
+            except aiohttp.ClientError as e:
+                logger.error(f"Error fetching {url}: {str(e) or type(e).__name__}")
+                metrics.inc("scraper_fetch_errors_total", backend="http")
+                self.rate_controller.record_failure("connection error")
+                return None, None
+
+            if reason is not None:
+                self.rate_controller.record_failure(reason, block=reason.startswith("HTTP") or reason == "captcha page")
+                return html, reason
+            # Not a block, just a page without its content (e.g. a deleted ad): this URL failed
+            if not has_element(html, required_id):
+                logger.warning(f"No #{required_id} in {url} (HTTP {response.status}), skipping it")
+                metrics.inc("scraper_missing_content_total", backend="http", page=page)
+                self.rate_controller.record_failure(f"missing #{required_id}")
+                return None, None
+            self.rate_controller.record_success()
+            return html, None
+
+    async def _fetch_many(self, urls, required_id):
+        """Fetch several pages concurrently"""
+        return await asyncio.gather(*(self._fetch(url, required_id) for url in urls))
+
+    def _use_fallback(self, url, reason):
+        """Switch to the Selenium backend after a detected block"""
+        if not self.blocked:
+            logger.warning(f"HTTP fetch blocked ({reason}) at {url}, falling back to Selenium")
+            metrics.inc("scraper_blocks_total", backend="http")
+            self.blocked = True
+        if self.fallback is None:
+            if self.fallback_factory is None:
+                return None
+            self.fallback = self.fallback_factory()
+        return self.fallback
+
+    def fetch_search_page(self, url):
+        """Fetch a search results page and return its HTML, or None on failure"""
+        if self.blocked:
+            fallback = self._use_fallback(url, "earlier block")
+            return fallback.fetch_search_page(url) if fallback else None
+
+        html, reason = self.loop.run_until_complete(self._fetch(url, "srchrslt-adtable"))
+        if reason:
+            fallback = self._use_fallback(url, reason)
+            return fallback.fetch_search_page(url) if fallback else None
+        return html
+
+    def fetch_details(self, urls):
+        """Fetch detailed descriptions for the given listing URLs ({url: description}, None if it failed)"""
+        if not urls:
+            return {}
+        if self.blocked:
+            fallback = self._use_fallback(urls[0], "earlier block")
+            return fallback.fetch_details(urls) if fallback else {}
+
+        responses = self.loop.run_until_complete(self._fetch_many(urls, "viewad-description"))
+
+        results = {}
+        blocked_urls = []
+        block_reason = None
+        for url, (html, reason) in zip(urls, responses):
+            if reason:
+                blocked_urls.append(url)
+                block_reason = block_reason or reason
+            else:
+                results[url] = parse_detail_description(html) if html is not None else None
+
+        if blocked_urls:
+            fallback = self._use_fallback(blocked_urls[0], block_reason)
+            if fallback:
+                results.update(fallback.fetch_details(blocked_urls))
+        return results
+
+    def is_alive(self):
+        """Check that the backend is still usable (the fallback browser, once in use, must respond)"""
+        if self.loop.is_closed():
+            return False
+        return self.fallback is None or self.fallback.is_alive()
+
+    def close(self):
+        """Close the HTTP session and any fallback browser"""
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+        self.loop.close()
+        if self.fallback is not None:
+            self.fallback.close()
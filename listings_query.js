@@ -0,0 +1,110 @@
+const fs = require('fs');
+
+// Filters on the LLM results: ?ram_more=true keeps listings whose RAM_more is true
+const booleanFilters = {
+  ram_more: 'RAM_more',
+  screen_small: 'screen_small',
+  screen_highres: 'screen_highres',
+  full_info: 'full_info_obtained'
+};
+
+const sorters = {
+  price_asc: (a, b) => comparePrices(a, b, 1),
+  price_desc: (a, b) => comparePrices(a, b, -1),
+  full_info: (a, b) => (b.full_info_obtained === true) - (a.full_info_obtained === true),
+  newest: (a, b) => (b.scraped_time || '').localeCompare(a.scraped_time || '')
+};
+
+const defaultPageSize = 50;
+const maxPageSize = 500;
+
+// Fallback for listings scraped before price_value was stored (e.g. "€ 1.200" -> 1200)
+function parsePrice(priceString) {
+  const match = (priceString || '').match(/\d[\d.]*(?:,\d+)?/);
+  if (!match) return null;
+  return parseFloat(match[0].replace(/\./g, '').replace(',', '.'));
+}
+
+// Listings without a price sort last in both directions
+function comparePrices(a, b, direction) {
+  if (a.price_value === null) return b.price_value === null ? 0 : 1;
+  if (b.price_value === null) return -1;
+  return direction * (a.price_value - b.price_value);
+}
+
+// Filter, sort and page the listings for a /api/listings query
+function queryListings(listings, query) {
+  const minPrice = query.min_price !== undefined && query.min_price !== '' ? parseFloat(query.min_price) : null;
+  const maxPrice = query.max_price !== undefined && query.max_price !== '' ? parseFloat(query.max_price) : null;
+  let matched = listings.filter(listing => {
+    for (const [param, field] of Object.entries(booleanFilters)) {
+      if (query[param] === 'true' && listing[field] !== true) return false;
+    }
+    if (minPrice !== null && (listing.price_value === null || listing.price_value < minPrice)) return false;
+    if (maxPrice !== null && (listing.price_value === null || listing.price_value > maxPrice)) return false;
+    return true;
+  });
+  
+  if (sorters[query.sort]) {
+    matched = matched.slice().sort(sorters[query.sort]);
+  }
+  
+  const pageSize = Math.min(Math.max(parseInt(query.page_size, 10) || defaultPageSize, 1), maxPageSize);
+  const page = Math.max(parseInt(query.page, 10) || 1, 1);
+  const includeDescription = (query.include || '').split(',').includes('description');
+  const pageListings = matched.slice((page - 1) * pageSize, page * pageSize).map(listing => {
+    if (includeDescription) return listing;
+    const { detailed_description, ...summary } = listing;
+    return summary;
+  });
+
+  return {
+    total: listings.length,
+    matched: matched.length,
+    page,
+    page_size: pageSize,
+    listings: pageListings
+  };
+}
+
+// Complete lines between two byte offsets of an event log; each event's id is the offset after its line
+function readEvents(eventsPath, start, end) {
+  const events = [];
+  let next = start;
+  if (end <= start) return { events, next };
+  
+  const buffer = Buffer.alloc(end - start);
+  const fd = fs.openSync(eventsPath, 'r');
+  try {
+    fs.readSync(fd, buffer, 0, buffer.length, start);
+  } finally {
+    fs.closeSync(fd);
+  }
+  
+  let lineStart = 0;
+  let newline = buffer.indexOf(10);
+  while (newline !== -1) {
+    const line = buffer.toString('utf8', lineStart, newline).trim();
+    if (line) {
+      try {
+        events.push({ id: start + newline + 1, type: JSON.parse(line).type, data: line });
+      } catch (error) {
+        console.error('Skipping malformed event:', error);
+      }
+    }
+    lineStart = newline + 1;
+    newline = buffer.indexOf(10, lineStart);
+  }
+  // A partly written last line is read again next time
+  next = start + lineStart;
+  return { events, next };
+}
+
+module.exports = {
+  defaultPageSize,
+  maxPageSize,
+  parsePrice,
+  comparePrices,
+  queryListings,
+  readEvents
+};
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import config
+from config import LLM_MODEL
+from prompts import (
+    get_laptop_analysis_prompt, get_compact_analysis_messages, COMPACT_RESPONSE_FORMAT, BOILERPLATE_PATTERNS,
+    SPEC_TOKEN_PATTERN, CLAUSE_SEPARATOR
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = getattr(config, "LLM_CACHE_ENABLED", True)
+LLM_CACHE_MAX_ENTRIES = getattr(config, "LLM_CACHE_MAX_ENTRIES", 50000)
+PROMPT_MODE = getattr(config, "PROMPT_MODE", "reasoning")
+DESCRIPTION_TOKEN_BUDGET = getattr(config, "DESCRIPTION_TOKEN_BUDGET", 400)
+
+CACHE_FILENAME = "llm_cache.db"
+
+def prompt_template_version(mode=PROMPT_MODE, description_budget=DESCRIPTION_TOKEN_BUDGET):
+    """Hash of the active prompt template, so any edit to the prompt invalidates the cache.
+
+    In compact mode the description budget and the trimming rules shape what
+    the model sees, so they are part of the version too.
+    """
+    if mode == "compact":
+        template = json.dumps([
+            get_compact_analysis_messages("{title}", "{description}", description_budget), COMPACT_RESPONSE_FORMAT,
+            description_budget, BOILERPLATE_PATTERNS.pattern, SPEC_TOKEN_PATTERN.pattern, CLAUSE_SEPARATOR.pattern
+        ])
+    else:
+        template = get_laptop_analysis_prompt("{title}", "{description}")
+    return hashlib.sha256(f"{mode}\0{template}".encode('utf-8')).hexdigest()[:16]
+
+PROMPT_VERSION = prompt_template_version()
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so trivial edits map to the same key"""
+    return re.sub(r'\s+', ' ', (text or "").lower()).strip()
+
+def cache_key(title, description, model=LLM_MODEL, prompt_version=PROMPT_VERSION):
+    """Content address of one analysis: model, prompt version and listing text"""
+    material = "\0".join([model, prompt_version, normalize_text(title), normalize_text(description)])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    """Persistent LLM result cache with size-bounded LRU eviction.
+
+    Results are stored in SQLite keyed by cache_key(); every hit refreshes
+    the entry's last_used time and the least recently used entries are
+    evicted once the cache grows past max_entries.
+    """
+
+    def __init__(self, db_path, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        self._size = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        with self._lock:
+            row = self.conn.execute("SELECT result FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self.conn:
+                self.conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store a result, evicting the least recently used entries if the cache is full"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO llm_cache (key, result, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._size += cursor.rowcount
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self.conn.execute("""
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_used LIMIT ?
+                    )
+                """, (excess,))
+                self._size -= excess
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self._size}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the shared cache in the data directory, or None if caching is disabled"""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+            os.makedirs(data_dir, exist_ok=True)
+            _cache = LLMCache(os.path.join(data_dir, CACHE_FILENAME))
+    return _cache
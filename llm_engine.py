@@ -0,0 +1,214 @@
+import time
+import random
+import logging
+import threading
+import email.utils
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
+import config
+import metrics
+import events
+from process_listings import (
+    client, request_analysis, failed_result, resolve_without_llm, remember_result
+)
+from llm_scheduler import estimate_usage, BudgetExhausted
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+LLM_CONCURRENCY = getattr(config, "LLM_CONCURRENCY", 4)
+LLM_REQUESTS_PER_MINUTE = getattr(config, "LLM_REQUESTS_PER_MINUTE", 500)
+LLM_TOKENS_PER_MINUTE = getattr(config, "LLM_TOKENS_PER_MINUTE", 200000)
+LLM_MAX_RETRIES = getattr(config, "LLM_MAX_RETRIES", 6)
+LLM_WRITE_BATCH = getattr(config, "LLM_WRITE_BATCH", 10)
+
+# Exponential backoff bounds in seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Errors worth retrying: throttling, timeouts and transient server failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+def estimate_tokens(title, description):
+    """Rough token estimate for one request (about 4 characters per token plus the reply)"""
+    return sum(estimate_usage(title, description))
+
+class RequestBudget:
+    """Sliding one-minute window enforcing request-per-minute and token-per-minute budgets"""
+
+    WINDOW = 60.0
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._entries = deque()  # [timestamp, tokens] per request in the window
+        self._tokens = 0
+
+    def _expire(self, now):
+        """Drop entries that have left the window"""
+        while self._entries and now - self._entries[0][0] >= self.WINDOW:
+            self._tokens -= self._entries.popleft()[1]
+
+    def acquire(self, tokens):
+        """Block until a request of this size fits in both budgets, then book it"""
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if (len(self._entries) < self.requests_per_minute
+                        and self._tokens + tokens <= self.tokens_per_minute):
+                    entry = [now, tokens]
+                    self._entries.append(entry)
+                    self._tokens += tokens
+                    return entry
+                # Wait until the oldest entry leaves the window
+                wait = self.WINDOW - (now - self._entries[0][0]) if self._entries else 0.1
+            time.sleep(max(wait, 0.05))
+
+    def settle(self, entry, actual_tokens):
+        """Replace a booked estimate with the token count the API reported"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            # Entries that already left the window no longer count
+            if now - entry[0] < self.WINDOW:
+                self._tokens += actual_tokens - entry[1]
+                entry[1] = actual_tokens
+
+def retry_after_seconds(error):
+    """Read the server's Retry-After hint from an API error, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        # Retry-After may also be an HTTP date
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def backoff_delay(attempt, error=None):
+    """Jittered exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class LLMEngine:
+    """Analyze listings on a thread pool under shared rate budgets.
+
+    Each worker books its estimated tokens against the RequestBudget before
+    calling the API, retries throttling and transient errors with jittered
+    exponential backoff (honouring Retry-After), and hands finished listings
+    back so they can be written to the store in batches. With a spending
+    budget (llm_scheduler.SpendingBudget), a listing whose analysis doesn't
+    fit in it is deferred instead.
+    """
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, budget=None, max_retries=LLM_MAX_RETRIES, llm_client=None,
+                 spending=None):
+        self.concurrency = concurrency
+        self.budget = budget or RequestBudget()
+        self.spending = spending
+        self.max_retries = max_retries
+        # Retries are handled here, so switch off the SDK's own retry loop
+        self.client = (llm_client or client).with_options(max_retries=0)
+
+    def analyze(self, title, description):
+        """Analyze one listing with budgets and retries; returns the result fields.
+
+        Raises BudgetExhausted if the request doesn't fit in the spending budget.
+        """
+        known = resolve_without_llm(title, description)
+        if known is not None:
+            return known
+        
+        spent = None
+        if self.spending is not None:
+            spent = self.spending.reserve(title, description)
+            if spent is None:
+                raise BudgetExhausted(title)
+        
+        result = None
+        for attempt in range(self.max_retries + 1):
+            entry = self.budget.acquire(estimate_tokens(title, description))
+            try:
+                result, response = request_analysis(title, description, llm_client=self.client)
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    self.budget.settle(entry, usage.total_tokens)
+                remember_result(title, description, result)
+                metrics.inc("llm_results_total", source="llm")
+                break
+            except RETRYABLE_ERRORS as e:
+                metrics.inc("llm_errors_total", error=type(e).__name__)
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on {title} after {attempt + 1} attempts: {str(e)}")
+                    break
+                metrics.inc("llm_retries_total")
+                delay = backoff_delay(attempt, e)
+                logger.warning(f"LLM request failed ({type(e).__name__}), retrying in {delay:.1f}s: {title}")
+                time.sleep(delay)
+            except Exception as e:
+                logger.error(f"Error processing listing with LLM: {str(e)}")
+                metrics.inc("llm_errors_total", error=type(e).__name__)
+                break
+        if spent is not None:
+            self.spending.settle(spent, result or {})
+        if result is not None:
+            return result
+        metrics.inc("llm_results_total", source="failed")
+        return failed_result()
+
+    def _analyze_listing(self, listing):
+        """Worker task: analyze a listing and merge the results into it; None if it was deferred"""
+        try:
+            listing.update(self.analyze(listing.get('title', ''), listing["detailed_description"]))
+        except BudgetExhausted:
+            return None
+        return listing
+
+    def process(self, listings, store, write_batch=LLM_WRITE_BATCH):
+        """Analyze listings concurrently, writing results to the store in batches"""
+        processed_count = 0
+        pending_writes = []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._analyze_listing, listing) for listing in listings]
+            for future in as_completed(futures):
+                listing = future.result()
+                # Deferred listings stay unprocessed for a later run
+                if listing is None:
+                    continue
+                processed_count += 1
+                logger.info(f"Processed {listing.get('title', '')} ({processed_count}/{len(futures)})")
+                pending_writes.append(listing)
+                if len(pending_writes) >= write_batch:
+                    store.upsert_many(pending_writes)
+                    events.emit_many("listing-analyzed", pending_writes)
+                    pending_writes = []
+                    metrics.flush()
+
+        store.upsert_many(pending_writes)
+        events.emit_many("listing-analyzed", pending_writes)
+        return processed_count
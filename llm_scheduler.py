@@ -0,0 +1,166 @@
+import re
+import math
+import uuid
+import logging
+import datetime
+import threading
+import config
+import metrics
+from process_listings import build_chat_request
+from spec_extractor import extract_specs
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Weights of the parts of a listing's analysis priority (each part is between 0 and 1)
+LLM_PRIORITY_WEIGHTS = getattr(config, "LLM_PRIORITY_WEIGHTS", {"recency": 1.0, "price": 1.0, "prefilter": 0.5})
+# A listing scraped this many hours ago has half the recency score of a fresh one
+LLM_RECENCY_HALF_LIFE_HOURS = getattr(config, "LLM_RECENCY_HALF_LIFE_HOURS", 24)
+# Price ceiling for listings whose search URL has no price filter (None: price doesn't count for them)
+LLM_PRICE_CEILING = getattr(config, "LLM_PRICE_CEILING", None)
+
+# Budgets for analysis with the API (0 disables a budget)
+LLM_RUN_TOKEN_BUDGET = getattr(config, "LLM_RUN_TOKEN_BUDGET", 0)
+LLM_DAILY_TOKEN_BUDGET = getattr(config, "LLM_DAILY_TOKEN_BUDGET", 0)
+LLM_RUN_COST_BUDGET = getattr(config, "LLM_RUN_COST_BUDGET", 0)
+LLM_DAILY_COST_BUDGET = getattr(config, "LLM_DAILY_COST_BUDGET", 0)
+# Price per million prompt and completion tokens, for the cost budgets
+LLM_PROMPT_PRICE = getattr(config, "LLM_PROMPT_PRICE", 0.15)
+LLM_COMPLETION_PRICE = getattr(config, "LLM_COMPLETION_PRICE", 0.60)
+
+# Price filter of a search URL, e.g. /preis::1400/ or /preis:500:1400/
+PRICE_FILTER_PATTERN = re.compile(r'/preis:(\d*):(\d+)(?:/|$)')
+
+class BudgetExhausted(Exception):
+    """Raised when a listing's analysis doesn't fit in the remaining budget"""
+
+def price_ceiling(search_url):
+    """Upper price limit of a search URL's price filter, or None"""
+    match = PRICE_FILTER_PATTERN.search(search_url or "")
+    return int(match.group(2)) if match else None
+
+def estimate_usage(title, description):
+    """Rough (prompt, completion) token estimate for one request (about 4 characters per token)"""
+    request = build_chat_request(title, description)
+    prompt_chars = sum(len(message["content"]) for message in request["messages"])
+    return prompt_chars // 4, request["max_tokens"]
+
+def request_cost(prompt_tokens, completion_tokens):
+    """Cost of a request at LLM_PROMPT_PRICE/LLM_COMPLETION_PRICE per million tokens"""
+    return (prompt_tokens * LLM_PROMPT_PRICE + completion_tokens * LLM_COMPLETION_PRICE) / 1_000_000
+
+def priority(listing, specs=None, now=None):
+    """Analysis priority of a listing: weighted recency, price against the search's ceiling and pre-filter knowledge.
+
+    Recency halves every LLM_RECENCY_HALF_LIFE_HOURS. The price part is how far
+    below the ceiling of the listing's search (or LLM_PRICE_CEILING) the price
+    is, 0 at or above it and 0.5 when either is unknown. The pre-filter part is
+    the share of the specs the rule-based extractor already settled, so the
+    analysis completes the listing for the filters.
+    """
+    now = now or datetime.datetime.now()
+    try:
+        age_hours = (now - datetime.datetime.fromisoformat(listing["scraped_time"])).total_seconds() / 3600
+        recency = math.pow(0.5, max(0.0, age_hours) / LLM_RECENCY_HALF_LIFE_HOURS)
+    except (KeyError, TypeError, ValueError):
+        recency = 0.0
+
+    ceiling = price_ceiling(listing.get("search_url")) or LLM_PRICE_CEILING
+    price = listing.get("price_value")
+    price_score = max(0.0, 1 - price / ceiling) if price is not None and ceiling else 0.5
+
+    if specs is None:
+        specs = extract_specs(listing.get("title", ""), listing.get("detailed_description", ""))
+    prefilter = sum(value is not None for value in specs.values()) / len(specs)
+
+    return (LLM_PRIORITY_WEIGHTS.get("recency", 0) * recency
+            + LLM_PRIORITY_WEIGHTS.get("price", 0) * price_score
+            + LLM_PRIORITY_WEIGHTS.get("prefilter", 0) * prefilter)
+
+def order_by_priority(listings, specs=None):
+    """Listings in the order they should be analyzed, highest priority first"""
+    now = datetime.datetime.now()
+    specs = specs if specs is not None else [None] * len(listings)
+    scored = [(priority(listing, listing_specs, now), index) for index, (listing, listing_specs) in
+              enumerate(zip(listings, specs))]
+    # Stable for equal scores, so older scrape order breaks ties
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [listings[index] for _, index in scored]
+
+class SpendingBudget:
+    """Per-run and per-day token and cost budgets for API analysis.
+
+    reserve() books a request's estimated tokens and cost before the call and
+    returns None if that would exceed a budget; settle() replaces the estimate
+    with the usage the API reported. With a store, bookings go to its
+    llm_usage (per day) and llm_run_usage (per run ID) tables in one
+    transaction, so all threads and processes of a run share the run budget
+    and all runs of a day the daily one. Spawned processes open the run's
+    budget again by its run_id. Without a store only the run budgets apply,
+    kept in memory.
+    """
+
+    def __init__(self, store=None, run_id=None, run_tokens=LLM_RUN_TOKEN_BUDGET, daily_tokens=LLM_DAILY_TOKEN_BUDGET,
+                 run_cost=LLM_RUN_COST_BUDGET, daily_cost=LLM_DAILY_COST_BUDGET):
+        self.store = store
+        self.run_id = run_id or uuid.uuid4().hex
+        self.limits = {"run_tokens": run_tokens, "daily_tokens": daily_tokens, "run_cost": run_cost,
+                       "daily_cost": daily_cost}
+        # Bookings of the run when there is no store to keep them
+        self.tokens = 0
+        self.cost = 0.0
+        self.deferred = 0
+        self._lock = threading.Lock()
+        if store is not None:
+            store.start_llm_run(self.run_id)
+
+    def _book(self, day, tokens, cost):
+        if self.store is not None:
+            return self.store.reserve_llm_usage(day, self.run_id, tokens, cost, self.limits)
+        if self.limits["run_tokens"] and self.tokens + tokens > self.limits["run_tokens"]:
+            return False
+        if self.limits["run_cost"] and self.cost + cost > self.limits["run_cost"]:
+            return False
+        self.tokens += tokens
+        self.cost += cost
+        return True
+
+    def reserve(self, title, description):
+        """Book the estimated usage of a request; None if it doesn't fit in the budgets"""
+        prompt_tokens, completion_tokens = estimate_usage(title, description)
+        entry = (prompt_tokens + completion_tokens, request_cost(prompt_tokens, completion_tokens),
+                 datetime.date.today().isoformat())
+        with self._lock:
+            if not self._book(entry[2], entry[0], entry[1]):
+                self.deferred += 1
+                metrics.inc("llm_deferred_total")
+                return None
+        return entry
+
+    def settle(self, entry, result):
+        """Replace a reservation with the usage the API reported in the result fields"""
+        prompt_tokens = result.get("llm_prompt_tokens") or 0
+        completion_tokens = result.get("llm_completion_tokens") or 0
+        cost = request_cost(prompt_tokens, completion_tokens)
+        tokens, estimated_cost, day = entry
+        with self._lock:
+            if self.store is not None:
+                # Settled on the day of the reservation, so a request made around midnight releases it
+                self.store.settle_llm_usage(day, self.run_id, tokens, estimated_cost, prompt_tokens,
+                                            completion_tokens, cost)
+            else:
+                self.tokens += prompt_tokens + completion_tokens - tokens
+                self.cost += cost - estimated_cost
+        metrics.inc("llm_cost_total", cost)
+
+    def spent(self):
+        """(tokens, cost, deferred requests) of the run so far, in all of its processes"""
+        if self.store is None:
+            return self.tokens, self.cost, self.deferred
+        usage = self.store.llm_run_usage(self.run_id)
+        return usage["prompt_tokens"] + usage["completion_tokens"], usage["cost"], usage["deferred"]
+
+    def summary(self):
+        """One-line account of the run's spending for the logs"""
+        tokens, cost, deferred = self.spent()
+        return f"{tokens} tokens, {cost:.4f} spent; {deferred} listings deferred by the budget"
@@ -2,59 +2,130 @@ import os
 import json
 import logging
 import argparse
+import metrics
+import events
 from scraper import scrape_listings
 from process_listings import update_listings_with_chatgpt
+from llm_scheduler import SpendingBudget
+from storage import open_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_SEARCH_URL = "https://www.kleinanzeigen.de/s-notebooks/preis::1400/rtx4060/k0c278"
+
+def load_search_urls(search_urls_file):
+    """Return the enabled search URLs from search_urls.json, or the default search URL"""
+    try:
+        urls = []
+        if os.path.exists(search_urls_file):
+            with open(search_urls_file, 'r') as f:
+                search_urls_data = json.load(f)
+                # Filter only enabled search URLs
+                urls = [item['url'] for item in search_urls_data if item.get('enabled', True)]
+                logger.info(f"Loaded {len(urls)} search URLs from {search_urls_file}")
+    
+        # If still no URLs, use default
+        if not urls:
+            urls = [DEFAULT_SEARCH_URL]
+            logger.info(f"Using default search URL: {urls[0]}")
+        return urls
+    except Exception as e:
+        logger.error(f"Error loading search URLs: {str(e)}")
+        return [DEFAULT_SEARCH_URL]
+
+def run_stages(store, mode, urls=None, max_listings=None, backfill=False, fetch_backend=None, data_dir=DATA_DIR,
+               coordinate=False):
+    """Run the scrape and/or process stages, exporting listings.json after each one.
+
+    With coordinate, the scrape stage hands its pages to remote workers (coordinator.py).
+    If the scrape fails, the listings it saved are still exported and analyzed
+    before its error is raised.
+    """
+    output_file = os.path.join(data_dir, "listings.json")
+    
+    # If no URLs provided, try to load from search_urls.json
+    if urls is None and mode in ["scrape", "both"]:
+        urls = load_search_urls(os.path.join(data_dir, "search_urls.json"))
+    
+    # One LLM budget for the run, shared by the analysis while scraping and the process stage
+    spending = SpendingBudget(store) if mode in ["process", "both"] else None
+    
+    scrape_error = None
+    if mode in ["scrape", "both"]:
+        logger.info("Starting scraping mode")
+        try:
+            if coordinate:
+                # Import here so local runs don't load the coordinator
+                from coordinator import run_coordinator
+                run_coordinator(store, urls, max_listings=max_listings, backfill=backfill,
+                                process_immediately=(mode == "both"), spending=spending)
+            else:
+                scrape_listings(urls, store, max_listings=max_listings, process_immediately=(mode == "both"),
+                                backfill=backfill, fetch_backend=fetch_backend, spending=spending)
+        except Exception as e:
+            # Raised once the listings saved before the error are exported and analyzed
+            logger.error(f"Scraping failed, continuing with the listings saved so far: {str(e)}")
+            scrape_error = e
+        # Move listings that dropped out of the searches to the cold archive, keeping listings.json small
+        store.archive.archive_stale(store)
+        store.export_json(output_file)
+        metrics.flush(force=True)
+    
+    if mode in ["process", "both"]:
+        logger.info("Starting processing mode")
+        update_listings_with_chatgpt(store, spending=spending)
+        store.export_json(output_file)
+        metrics.flush(force=True)
+    
+    if scrape_error is not None:
+        raise scrape_error
+
 def main():
     """Main entry point that acts as a wrapper for different functionalities"""
     parser = argparse.ArgumentParser(description="Laptop listing scraper and processor")
-    parser.add_argument("--mode", choices=["scrape", "process", "both"], default="both",
-                        help="Operation mode: scrape, process, or both")
-    parser.add_argument("--urls", nargs="+", 
+    parser.add_argument("--mode", choices=["scrape", "process", "both", "process-batch"], default="both",
+                        help="Operation mode: scrape, process, both, or process-batch")
+    parser.add_argument("--urls", nargs="+",
                         default=None,
                         help="URLs to scrape (only used in scrape or both modes)")
     parser.add_argument("--max-listings", type=int, default=None,
                         help="Maximum number of listings to scrape per URL")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Walk up to BACKFILL_PAGES result pages per search instead of stopping at known listings")
+    parser.add_argument("--coordinate", action="store_true",
+                        help="Hand the scraping to remote workers (python coordinator.py) instead of scraping here")
+    parser.add_argument("--batch-step", choices=["prepare", "submit", "ingest"], default="prepare",
+                        help="Step of the offline batch workflow (only used in process-batch mode)")
+    parser.add_argument("--batch-runner", choices=["openai", "local"], default="openai",
+                        help="Run the batch through the OpenAI Batch API or locally, one request at a time")
     
     args = parser.parse_args()
     
-    # Define paths for data
-    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-    output_file = os.path.join(data_dir, "listings.json")
-    search_urls_file = os.path.join(data_dir, "search_urls.json")
-    
     # Create data directory if it doesn't exist
-    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(DATA_DIR, exist_ok=True)
     
-    # If no URLs provided, try to load from search_urls.json
-    if args.urls is None and args.mode in ["scrape", "both"]:
-        try:
-            if os.path.exists(search_urls_file):
-                with open(search_urls_file, 'r') as f:
-                    search_urls_data = json.load(f)
-                    # Filter only enabled search URLs
-                    args.urls = [item['url'] for item in search_urls_data if item.get('enabled', True)]
-                    logger.info(f"Loaded {len(args.urls)} search URLs from {search_urls_file}")
-            
-            # If still no URLs, use default
-            if not args.urls:
-                args.urls = ["https://www.kleinanzeigen.de/s-notebooks/preis::1400/rtx4060/k0c278"]
-                logger.info(f"Using default search URL: {args.urls[0]}")
-        except Exception as e:
-            logger.error(f"Error loading search URLs: {str(e)}")
-            args.urls = ["https://www.kleinanzeigen.de/s-notebooks/preis::1400/rtx4060/k0c278"]
+    # Write per-stage metrics to data/metrics.json and data/metrics.prom
+    metrics.configure(DATA_DIR)
+    # Stream new and analyzed listings to the web UI through data/events.ndjson
+    events.configure(DATA_DIR)
     
-    if args.mode in ["scrape", "both"]:
-        logger.info("Starting scraping mode")
-        scrape_listings(args.urls, output_file, max_listings=args.max_listings, process_immediately=(args.mode == "both"))
+    # Open the listing store (imports a legacy listings.json on first use)
+    store = open_store(DATA_DIR)
     
-    if args.mode in ["process", "both"]:
-        logger.info("Starting processing mode")
-        update_listings_with_chatgpt(output_file)
+    if args.mode == "process-batch":
+        # Import here so the regular modes don't load the batch workflow
+        from batch import run_batch_step
+    
+        logger.info(f"Starting batch processing step: {args.batch_step}")
+        run_batch_step(store, DATA_DIR, args.batch_step, runner=args.batch_runner)
+        store.export_json(os.path.join(DATA_DIR, "listings.json"))
+        metrics.flush(force=True)
+    else:
+        run_stages(store, args.mode, urls=args.urls, max_listings=args.max_listings, backfill=args.backfill,
+                   coordinate=args.coordinate)
     
     logger.info("All operations completed")
 
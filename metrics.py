@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+METRICS_JSON_FILENAME = "metrics.json"
+METRICS_PROM_FILENAME = "metrics.prom"
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Minimum seconds between two metric file writes from flush()
+FLUSH_INTERVAL = 5.0
+
+def _label_key(labels):
+    """Hashable, ordered form of a label dict"""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(label_key, extra=()):
+    """Prometheus label set, e.g. {stage="search",le="0.5"}"""
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def histogram_quantile(q, buckets, count):
+    """Estimate a quantile from cumulative (upper bound, count) buckets, as Prometheus does"""
+    if not count:
+        return None
+    rank = q * count
+    lower_bound, lower_count = 0.0, 0
+    for upper_bound, cumulative in buckets:
+        if cumulative >= rank:
+            if upper_bound == float("inf"):
+                return lower_bound
+            share = (rank - lower_count) / (cumulative - lower_count) if cumulative > lower_count else 0
+            return lower_bound + (upper_bound - lower_bound) * share
+        lower_bound, lower_count = upper_bound, cumulative
+    return lower_bound
+
+class Histogram:
+    """Bucketed distribution of observed values with a running sum and count"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms for one scraper or processing run.
+
+    Metrics are identified by name plus a label set. snapshot() returns them
+    as a JSON-friendly dict (with estimated p50/p95 for histograms) and
+    to_prometheus() in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.datetime.now().isoformat()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one observation (usually seconds) in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def merge(self, counters, histograms):
+        """Add the counters and histograms of another registry (e.g. a worker process's)"""
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(other.bounds[:-1])
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, other.counts)]
+                histogram.sum += other.sum
+                histogram.count += other.count
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict"""
+        with self._lock:
+            counters = {}
+            for (name, label_key), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(label_key), "value": value})
+            histograms = {}
+            for (name, label_key), histogram in sorted(self.histograms.items()):
+                buckets = histogram.cumulative()
+                histograms.setdefault(name, []).append({
+                    "labels": dict(label_key),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "p50": histogram_quantile(0.5, buckets, histogram.count),
+                    "p95": histogram_quantile(0.95, buckets, histogram.count),
+                    "buckets": {("+Inf" if bound == float("inf") else str(bound)): count for bound, count in buckets}
+                })
+        return {
+            "started": self.started,
+            "updated": datetime.datetime.now().isoformat(),
+            "counters": counters,
+            "histograms": histograms
+        }
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, label_key), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f"{name}_bucket{_format_labels(label_key, [('le', le)])} {count}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def _write_atomic(path, content):
+    """Write through a temporary file so readers never see a half-written file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+registry = MetricsRegistry()
+
+_output_dir = None
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+def inc(name, value=1, **labels):
+    """Add value to a counter in the shared registry"""
+    registry.inc(name, value, **labels)
+
+def observe(name, value, **labels):
+    """Record an observation in the shared registry"""
+    registry.observe(name, value, **labels)
+
+@contextmanager
+def timer(name, **labels):
+    """Time the enclosed block into a histogram, in seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started, **labels)
+
+def configure(data_dir):
+    """Write metrics files to data_dir from now on"""
+    global _output_dir
+    _output_dir = data_dir
+
+def flush(force=False):
+    """Write data/metrics.json and data/metrics.prom, at most every FLUSH_INTERVAL seconds unless forced"""
+    global _last_flush
+    if _output_dir is None:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        try:
+            _write_atomic(os.path.join(_output_dir, METRICS_JSON_FILENAME), json.dumps(registry.snapshot(), indent=2))
+            _write_atomic(os.path.join(_output_dir, METRICS_PROM_FILENAME), registry.to_prometheus())
+        except OSError as e:
+            logger.error(f"Error writing metrics: {str(e)}")
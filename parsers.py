@@ -0,0 +1,319 @@
+import re
+import json
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+import config
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+BASE_URL = getattr(config, "BASE_URL", "https://www.kleinanzeigen.de").rstrip('/')
+PARSER_BACKEND = getattr(config, "PARSER_BACKEND", "auto")
+
+PARSER_BACKENDS = ("bs4", "lxml", "selectolax")
+
+# Only the results list and the description block are ever read, so the
+# BeautifulSoup backend skips building the rest of the document
+RESULTS_STRAINER = SoupStrainer("ul", id="srchrslt-adtable")
+DESCRIPTION_STRAINER = SoupStrainer(id="viewad-description-text")
+
+# JSON-LD blocks can be found without parsing the page
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+# Classes of paid top ads, which are pinned to every results page regardless of age
+PROMOTED_CLASSES = {"is-topad", "badge-topad"}
+
+# "/s-anzeige/lenovo-thinkpad/2871234567-278-3331" -> "2871234567"
+LISTING_ID_PATTERN = re.compile(r'/(\d+)-\d+-\d+/?$')
+
+# "1.200 € VB", "950 €", "1.049,99 €"
+PRICE_PATTERN = re.compile(r'\d[\d.]*(?:,\d+)?')
+
+# "10115 Mitte(3 km)": the distance depends on the search, not on the listing
+DISTANCE_PATTERN = re.compile(r'\(\s*[\d.,]+\s*km\s*\)')
+
+def _class_test(name):
+    """XPath predicate matching elements that carry the given CSS class"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# XPath equivalents of the CSS selectors used by the BeautifulSoup backend
+XPATH_ITEMS = f"//ul[@id='srchrslt-adtable']//li[{_class_test('ad-listitem')}]"
+XPATH_ARTICLE = f"(.//article[{_class_test('aditem')}])[1]"
+XPATH_TITLE = "(.//h2//a)[1]"
+XPATH_PRICE = f"(.//p[{_class_test('aditem-main--middle--price-shipping--price')}])[1]"
+XPATH_DESCRIPTION = f"(.//p[{_class_test('aditem-main--middle--description')}])[1]"
+XPATH_LOCATION = f"(.//*[{_class_test('aditem-main--top--left')}])[1]"
+
+def parse_price(price):
+    """Numeric value of a price string such as "1.200 € VB", or None for "VB" and other prices without a number"""
+    match = PRICE_PATTERN.search(price or "")
+    if match is None:
+        return 0.0 if "verschenken" in (price or "").lower() else None
+    # German format: dots separate thousands, a comma starts the cents
+    return float(match.group(0).replace('.', '').replace(',', '.'))
+
+def _listing(listing_id, title, href, price, short_description, location, classes=()):
+    """Build the listing dict every backend returns"""
+    return {
+        "id": listing_id,
+        "title": title,
+        "price": price,
+        "short_description": short_description,
+        "location": location,
+        "url": BASE_URL + href if href is not None else "",
+        "promoted": not PROMOTED_CLASSES.isdisjoint(classes)
+    }
+
+def _parse_results_bs4(html):
+    """Parse search results with BeautifulSoup, building only the results list"""
+    soup = BeautifulSoup(html, "html.parser", parse_only=RESULTS_STRAINER)
+    if soup.select_one("ul#srchrslt-adtable") is None:
+        return None
+    results = []
+
+    for item in soup.select("ul#srchrslt-adtable li.ad-listitem"):
+        try:
+            # Extract listing ID from data attributes
+            listing_id = ""
+            article_elem = item.select_one("article.aditem")
+            if article_elem and article_elem.has_attr('data-adid'):
+                listing_id = article_elem['data-adid']
+
+            title_elem = item.select_one("h2 a")
+            price_elem = item.select_one("p.aditem-main--middle--price-shipping--price")
+            desc_elem = item.select_one("p.aditem-main--middle--description")
+            location_elem = item.select_one(".aditem-main--top--left")
+
+            results.append(_listing(
+                listing_id,
+                title_elem.get_text(strip=True) if title_elem else "",
+                title_elem.get('href') if title_elem else None,
+                price_elem.get_text(strip=True) if price_elem else "",
+                desc_elem.get_text(strip=True) if desc_elem else "",
+                location_elem.get_text(strip=True) if location_elem else "",
+                item.get("class", [])
+            ))
+
+        except Exception as e:
+            logger.error(f"Error scraping listing: {str(e)}")
+            continue
+
+    return results
+
+def _lxml_text(elem):
+    """Same as BeautifulSoup's get_text(strip=True): stripped text nodes joined together"""
+    if elem is None:
+        return ""
+    return "".join(text.strip() for text in elem.itertext())
+
+def _first(elem, xpath):
+    """First node matching an XPath expression, or None"""
+    found = elem.xpath(xpath)
+    return found[0] if found else None
+
+def _parse_results_lxml(html):
+    """Parse search results with lxml"""
+    import lxml.html
+
+    root = lxml.html.fromstring(html)
+    if not root.xpath("//ul[@id='srchrslt-adtable']"):
+        return None
+    results = []
+
+    for item in root.xpath(XPATH_ITEMS):
+        try:
+            article_elem = _first(item, XPATH_ARTICLE)
+            title_elem = _first(item, XPATH_TITLE)
+            results.append(_listing(
+                article_elem.get('data-adid', "") if article_elem is not None else "",
+                _lxml_text(title_elem),
+                title_elem.get('href') if title_elem is not None else None,
+                _lxml_text(_first(item, XPATH_PRICE)),
+                _lxml_text(_first(item, XPATH_DESCRIPTION)),
+                _lxml_text(_first(item, XPATH_LOCATION)),
+                item.get("class", "").split()
+            ))
+        except Exception as e:
+            logger.error(f"Error scraping listing: {str(e)}")
+            continue
+
+    return results
+
+def _selectolax_text(node):
+    """Same as BeautifulSoup's get_text(strip=True): stripped text nodes joined together"""
+    if node is None:
+        return ""
+    return node.text(deep=True, separator="", strip=True)
+
+def _selectolax_attr(node, name):
+    """Attribute value, "" when the attribute is missing or has no value"""
+    if node is None:
+        return ""
+    return node.attributes.get(name) or ""
+
+def _parse_results_selectolax(html):
+    """Parse search results with selectolax"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    table = LexborHTMLParser(html).css_first("ul#srchrslt-adtable")
+    if table is None:
+        return None
+    results = []
+
+    for item in table.css("li.ad-listitem"):
+        try:
+            title_elem = item.css_first("h2 a")
+            results.append(_listing(
+                _selectolax_attr(item.css_first("article.aditem"), "data-adid"),
+                _selectolax_text(title_elem),
+                title_elem.attributes.get("href") if title_elem else None,
+                _selectolax_text(item.css_first("p.aditem-main--middle--price-shipping--price")),
+                _selectolax_text(item.css_first("p.aditem-main--middle--description")),
+                _selectolax_text(item.css_first(".aditem-main--top--left")),
+                (item.attributes.get("class") or "").split()
+            ))
+        except Exception as e:
+            logger.error(f"Error scraping listing: {str(e)}")
+            continue
+
+    return results
+
+def _json_ld_blocks(html):
+    """Yield every JSON-LD object embedded in the page"""
+    for match in JSON_LD_PATTERN.finditer(html):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        for block in (data if isinstance(data, list) else [data]):
+            if isinstance(block, dict):
+                # Several objects may share one block under @graph
+                yield from (block.get("@graph") or [block])
+
+def _json_ld_listing(entry):
+    """Listing dict for a JSON-LD Product/Offer entry, or None if it has no URL"""
+    offers = entry.get("offers") or {}
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    url = entry.get("url") or offers.get("url")
+    if not url:
+        return None
+    match = LISTING_ID_PATTERN.search(url)
+    price = offers.get("price")
+    listing = _listing(
+        str(entry.get("sku") or entry.get("productID") or (match.group(1) if match else "")),
+        entry.get("name", ""),
+        None,
+        f"{price} €" if price not in (None, "") else "",
+        entry.get("description", ""),
+        ""
+    )
+    listing["url"] = url if url.startswith("http") else BASE_URL + url
+    return listing
+
+def parse_structured_data(html):
+    """Read listings from the page's JSON-LD (ItemList or Product entries)"""
+    results = []
+    for block in _json_ld_blocks(html):
+        if block.get("@type") == "ItemList":
+            entries = [element.get("item", element) for element in block.get("itemListElement", [])]
+        elif block.get("@type") in ("Product", "Offer"):
+            entries = [block]
+        else:
+            continue
+        for entry in entries:
+            if isinstance(entry, dict):
+                listing = _json_ld_listing(entry)
+                if listing is not None:
+                    results.append(listing)
+    return results
+
+def _is_installed(name):
+    """Whether the library behind a parser backend can be imported"""
+    if name == "bs4":
+        return True
+    try:
+        __import__("selectolax.lexbor" if name == "selectolax" else "lxml.html")
+        return True
+    except ImportError:
+        return False
+
+def resolve_backend(name=PARSER_BACKEND):
+    """Pick the parser backend: the configured one if installed, otherwise the fastest available"""
+    if name != "auto":
+        if name not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend: {name}")
+        if _is_installed(name):
+            return name
+        logger.warning(f"Parser backend {name} is not installed, falling back to the fastest available one")
+    for candidate in ("selectolax", "lxml"):
+        if _is_installed(candidate):
+            return candidate
+    return "bs4"
+
+RESULT_PARSERS = {
+    "bs4": _parse_results_bs4,
+    "lxml": _parse_results_lxml,
+    "selectolax": _parse_results_selectolax,
+}
+
+_backend = None
+
+def active_backend():
+    """The backend used when none is passed explicitly, resolved once per run"""
+    global _backend
+    if _backend is None:
+        _backend = resolve_backend()
+        logger.info(f"Using the {_backend} parser backend")
+    return _backend
+
+def parse_search_results(html, backend=None):
+    """Extract the basic listing info from a search results page"""
+    if not html:
+        return []
+    backend = backend or active_backend()
+    with metrics.timer("scraper_parse_seconds", page="search", backend=backend):
+        results = RESULT_PARSERS[backend](html)
+    if results is None:
+        # No results list in the markup, try the embedded structured data instead
+        results = parse_structured_data(html)
+        if results:
+            logger.info(f"Read {len(results)} listings from structured data")
+    return results
+
+def _parse_description_bs4(html):
+    """Detail page description with BeautifulSoup, building only the description block"""
+    soup = BeautifulSoup(html, "html.parser", parse_only=DESCRIPTION_STRAINER)
+    desc_elem = soup.select_one("#viewad-description-text")
+    return desc_elem.get_text(separator='\n', strip=False) if desc_elem else ""
+
+def _parse_description_lxml(html):
+    """Detail page description with lxml"""
+    import lxml.html
+
+    desc_elem = _first(lxml.html.fromstring(html), "//*[@id='viewad-description-text']")
+    return "\n".join(desc_elem.itertext()) if desc_elem is not None else ""
+
+def _parse_description_selectolax(html):
+    """Detail page description with selectolax"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    desc_elem = LexborHTMLParser(html).css_first("#viewad-description-text")
+    return desc_elem.text(deep=True, separator='\n', strip=False) if desc_elem else ""
+
+DESCRIPTION_PARSERS = {
+    "bs4": _parse_description_bs4,
+    "lxml": _parse_description_lxml,
+    "selectolax": _parse_description_selectolax,
+}
+
+def parse_detail_description(html, backend=None):
+    """Extract the detailed description text from a listing detail page"""
+    if not html:
+        return ""
+    backend = backend or active_backend()
+    with metrics.timer("scraper_parse_seconds", page="detail", backend=backend):
+        return DESCRIPTION_PARSERS[backend](html)
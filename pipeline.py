@@ -0,0 +1,97 @@
+import time
+import queue
+import logging
+import threading
+import config
+import metrics
+import events
+from llm_engine import LLMEngine, LLM_CONCURRENCY
+from llm_scheduler import SpendingBudget, BudgetExhausted
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Scraped listings waiting for analysis before the scraper has to wait
+PIPELINE_QUEUE_SIZE = getattr(config, "PIPELINE_QUEUE_SIZE", 20)
+
+class AnalysisPipeline:
+    """Analyze scraped listings while the scraper keeps loading pages.
+
+    The scraper hands each saved listing to submit(), which puts it on a
+    bounded queue and only blocks when the analysis workers fall behind by
+    PIPELINE_QUEUE_SIZE listings. The workers analyze with the LLM engine
+    (rules, cache, token budget and retries) and write each result back to the
+    store. close() lets the workers drain the queue before it returns, so a
+    run's wall-clock time approaches the slower of scraping and analysis
+    rather than their sum. A listing whose analysis fails, or doesn't fit in
+    the LLM spending budget, stays unprocessed in the store for the next
+    processing run.
+    """
+
+    def __init__(self, store, concurrency=LLM_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE, engine=None, spending=None):
+        self.store = store
+        self.engine = engine or LLMEngine(concurrency=concurrency, spending=spending or SpendingBudget(store))
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.workers = [
+            threading.Thread(target=self._work, name=f"analysis-{index}", daemon=True)
+            for index in range(max(1, concurrency))
+        ]
+        self.submitted = 0
+        self.analyzed = 0
+        self.failed = 0
+        self._count_lock = threading.Lock()
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, listing):
+        """Queue a copy of a saved listing for analysis, waiting while the queue is full"""
+        started = time.perf_counter()
+        self.queue.put(dict(listing))
+        metrics.observe("pipeline_submit_wait_seconds", time.perf_counter() - started)
+        self.submitted += 1
+
+    def _work(self):
+        """Worker thread: analyze listings until the None sentinel arrives"""
+        for listing in iter(self.queue.get, None):
+            title = listing.get('title', '')
+            try:
+                result = self.engine.analyze(title, listing["detailed_description"])
+                # The engine returns a failed result once its retries are used up
+                if not result.get("llm_processed"):
+                    logger.error(f"Analysis of {title} failed, leaving it for a later run")
+                    self._count_failed()
+                    continue
+                listing.update(result)
+                self.store.upsert(listing)
+                events.emit("listing-analyzed", listing)
+                with self._count_lock:
+                    self.analyzed += 1
+                metrics.inc("pipeline_listings_total", state="analyzed")
+                logger.info(f"Analyzed while scraping: {title}")
+            except BudgetExhausted:
+                logger.info(f"LLM budget used up, leaving {title} for a later run")
+                metrics.inc("pipeline_listings_total", state="deferred")
+            except Exception as e:
+                logger.error(f"Error analyzing {title}: {str(e)}")
+                self._count_failed()
+
+    def _count_failed(self):
+        """Count a listing whose analysis failed"""
+        with self._count_lock:
+            self.failed += 1
+        metrics.inc("pipeline_listings_total", state="failed")
+
+    def close(self):
+        """Wait for the queued listings to be analyzed and stop the workers"""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        logger.info(f"Analysis pipeline finished: {self.analyzed} of {self.submitted} listings analyzed, "
+                    f"{self.failed} failed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
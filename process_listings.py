@@ -1,141 +1,302 @@
 import os
 import json
+import time
 import datetime
 import logging
 from openai import OpenAI
+import config
+import metrics
+import events
 from config import API_KEY, LLM_MODEL, PRINT_PROMPT
-from prompts import get_laptop_analysis_prompt
+from prompts import get_laptop_analysis_prompt, get_compact_analysis_messages, COMPACT_RESPONSE_FORMAT
+from storage import open_store, JSON_FILENAME
+from llm_cache import get_cache, cache_key, PROMPT_VERSION
+from spec_extractor import extract_specs, rule_based_result
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Instantiate the OpenAI client
-client = OpenAI(api_key=API_KEY)
+LLM_BASE_URL = getattr(config, "LLM_BASE_URL", None)
+LLM_CONCURRENCY = getattr(config, "LLM_CONCURRENCY", 4)
+PROMPT_MODE = getattr(config, "PROMPT_MODE", "reasoning")
+DESCRIPTION_TOKEN_BUDGET = getattr(config, "DESCRIPTION_TOKEN_BUDGET", 400)
 
-def process_listing(title, description):
-    """Send the listing title and description to ChatGPT and process the response."""
-    # Get the prompt from the prompts module
-    prompt = get_laptop_analysis_prompt(title, description)
-    
-    if PRINT_PROMPT:
-        print("\nPrompt sent to LLM:")
-        print("-" * 40)
-        print(prompt)
-        print("-" * 40)
+# Upper bound on the length of the model's reply
+MAX_RESPONSE_TOKENS = 500
+COMPACT_MAX_RESPONSE_TOKENS = 60
 
-    try:
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500  # Increased to ensure we get the full response
-        )
-
-        # Extract the response text
-        response_text = response.choices[0].message.content.strip()
-        logger.info(f"Received LLM response for: {title}")
-        
-        if PRINT_PROMPT:
-            print(f"\nModel response: {response_text}")  # Log the model's response for debugging
-
-        # Parse the response to extract the values
-        ram_more = None
-        screen_small = None
-        screen_highres = None
-        full_info_obtained = None
+# Per-call accounting fields; they describe one API call, so cached results don't carry them
+ACCOUNTING_FIELDS = ("llm_prompt_tokens", "llm_completion_tokens", "llm_cached_prompt_tokens", "llm_latency_ms")
+
+# Instantiate the OpenAI client (LLM_BASE_URL can point it at an OpenAI-compatible server)
+client = OpenAI(api_key=API_KEY, base_url=LLM_BASE_URL)
+
+# Listing accounting fields and the counters they are added to
+USAGE_METRICS = {
+    "llm_prompt_tokens": "llm_prompt_tokens_total",
+    "llm_completion_tokens": "llm_completion_tokens_total",
+    "llm_cached_prompt_tokens": "llm_cached_prompt_tokens_total"
+}
+
+def failed_result():
+    """Result fields for a listing whose LLM analysis failed"""
+    return {
+        "llm_processed": False,
+        "llm_processed_time": datetime.datetime.now().isoformat(),
+        "full_info_obtained": False,
+        "RAM_more": "unknown",
+        "screen_small": "unknown",
+        "screen_highres": "unknown"
+    }
+
+def parse_llm_response(response_text, title):
+    """Parse the RAM_more/screen_small/... lines of a model reply into listing fields"""
+    ram_more = None
+    screen_small = None
+    screen_highres = None
+    full_info_obtained = None
+    
+    # Look for the specific format lines in the response
+    for line in response_text.split('\n'):
+        line = line.strip().lower()  # Convert to lowercase for easier matching
         
-        # Look for the specific format lines in the response
-        for line in response_text.split('\n'):
-            line = line.strip().lower()  # Convert to lowercase for easier matching
+        if line.startswith("ram_more ="):
+            if "true" in line:
+                ram_more = True
+            elif "false" in line:
+                ram_more = False
+            elif "unknown" in line:
+                ram_more = "unknown"  # Explicitly set to "unknown" string
             
-            if line.startswith("ram_more ="):
-                if "true" in line:
-                    ram_more = True
-                elif "false" in line:
-                    ram_more = False
-                elif "unknown" in line:
-                    ram_more = "unknown"  # Explicitly set to "unknown" string
-                
-            elif line.startswith("screen_small ="):
-                if "true" in line:
-                    screen_small = True
-                elif "false" in line:
-                    screen_small = False
-                elif "unknown" in line:
-                    screen_small = "unknown"  # Explicitly set to "unknown" string
-                
-            elif line.startswith("screen_highres ="):
-                if "true" in line:
-                    screen_highres = True
-                elif "false" in line:
-                    screen_highres = False
-                elif "unknown" in line:
-                    screen_highres = "unknown"  # Explicitly set to "unknown" string
-                
-            elif line.startswith("full_info_obtained ="):
-                if "true" in line:
-                    full_info_obtained = True
-                elif "false" in line:
-                    full_info_obtained = False
-        
-        # If we couldn't parse the values properly, set defaults
-        if ram_more is None and screen_small is None and screen_highres is None and full_info_obtained is None:
-            logger.warning(f"Could not parse the model's response properly for: {title}")
-            return {
-                "llm_processed": True,
-                "llm_processed_time": datetime.datetime.now().isoformat(),
-                "full_info_obtained": False,
-                "RAM_more": "unknown",
-                "screen_small": "unknown",
-                "screen_highres": "unknown"
-            }
-        
-        # If full_info_obtained wasn't explicitly set, calculate it
-        if full_info_obtained is None:
-            # If any value is "unknown", full_info_obtained should be False
-            full_info_obtained = (ram_more is not None and ram_more != "unknown" and 
-                                 screen_small is not None and screen_small != "unknown" and 
-                                 screen_highres is not None and screen_highres != "unknown")
-
-        # Add timestamp to the results
+        elif line.startswith("screen_small ="):
+            if "true" in line:
+                screen_small = True
+            elif "false" in line:
+                screen_small = False
+            elif "unknown" in line:
+                screen_small = "unknown"  # Explicitly set to "unknown" string
+            
+        elif line.startswith("screen_highres ="):
+            if "true" in line:
+                screen_highres = True
+            elif "false" in line:
+                screen_highres = False
+            elif "unknown" in line:
+                screen_highres = "unknown"  # Explicitly set to "unknown" string
+            
+        elif line.startswith("full_info_obtained ="):
+            if "true" in line:
+                full_info_obtained = True
+            elif "false" in line:
+                full_info_obtained = False
+    
+    # If we couldn't parse the values properly, set defaults
+    if ram_more is None and screen_small is None and screen_highres is None and full_info_obtained is None:
+        logger.warning(f"Could not parse the model's response properly for: {title}")
         return {
             "llm_processed": True,
             "llm_processed_time": datetime.datetime.now().isoformat(),
-            "full_info_obtained": full_info_obtained if full_info_obtained is not None else False,
-            "RAM_more": ram_more if ram_more is not None else "unknown",
-            "screen_small": screen_small if screen_small is not None else "unknown",
-            "screen_highres": screen_highres if screen_highres is not None else "unknown"
-        }
-
-    except Exception as e:
-        logger.error(f"Error processing listing with LLM: {str(e)}")
-        return {
-            "llm_processed": False,
-            "llm_processed_time": datetime.datetime.now().isoformat(),
             "full_info_obtained": False,
             "RAM_more": "unknown",
             "screen_small": "unknown",
-            "screen_highres": "unknown"
+            "screen_highres": "unknown",
+            "analysis_source": "llm"
         }
-
-def update_listings_with_chatgpt(input_file):
-    """Read listings from a JSON file, process them with ChatGPT, and update the file in place."""
-    if not os.path.exists(input_file):
-        logger.error(f"Input file not found: {input_file}")
-        return
     
+    # If full_info_obtained wasn't explicitly set, calculate it
+    if full_info_obtained is None:
+        # If any value is "unknown", full_info_obtained should be False
+        full_info_obtained = (ram_more is not None and ram_more != "unknown" and 
+                             screen_small is not None and screen_small != "unknown" and 
+                             screen_highres is not None and screen_highres != "unknown")
+
+    # Add timestamp to the results
+    return {
+        "llm_processed": True,
+        "llm_processed_time": datetime.datetime.now().isoformat(),
+        "full_info_obtained": full_info_obtained if full_info_obtained is not None else False,
+        "RAM_more": ram_more if ram_more is not None else "unknown",
+        "screen_small": screen_small if screen_small is not None else "unknown",
+        "screen_highres": screen_highres if screen_highres is not None else "unknown",
+        "analysis_source": "llm"
+    }
+
+def parse_structured_response(response_text, title):
+    """Parse the JSON reply of the compact prompt mode into listing fields"""
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            listings = json.load(f)
+        data = json.loads(response_text)
     except json.JSONDecodeError:
-        logger.error(f"Error: Could not parse input file {input_file}.")
-        return
+        data = None
+    
+    if not isinstance(data, dict):
+        logger.warning(f"Could not parse the model's response properly for: {title}")
+        data = {}
+    
+    values = {}
+    for field in ("RAM_more", "screen_small", "screen_highres"):
+        values[field] = {"true": True, "false": False}.get(str(data.get(field, "")).lower(), "unknown")
+    
+    return {
+        "llm_processed": True,
+        "llm_processed_time": datetime.datetime.now().isoformat(),
+        "full_info_obtained": all(value != "unknown" for value in values.values()),
+        **values,
+        "analysis_source": "llm"
+    }
+
+def parse_response(response_text, title, mode=PROMPT_MODE):
+    """Parse a model reply with the parser matching the prompt mode"""
+    if mode == "compact":
+        return parse_structured_response(response_text, title)
+    return parse_llm_response(response_text, title)
+
+def usage_fields(usage, latency_ms=None):
+    """Token and latency accounting for one API call, as listing fields"""
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    
+    fields = {
+        "llm_prompt_tokens": usage.get("prompt_tokens"),
+        "llm_completion_tokens": usage.get("completion_tokens")
+    }
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached_tokens is not None:
+        fields["llm_cached_prompt_tokens"] = cached_tokens
+    if latency_ms is not None:
+        fields["llm_latency_ms"] = latency_ms
+    return fields
+
+def record_usage(fields):
+    """Add the token counts of one API call to the metrics"""
+    for field, metric in USAGE_METRICS.items():
+        if fields.get(field):
+            metrics.inc(metric, fields[field])
+
+def build_chat_request(title, description, mode=PROMPT_MODE):
+    """Build the chat completion request body for one listing"""
+    if mode == "compact":
+        # Short structured answer behind a static, cacheable prefix
+        return {
+            "model": LLM_MODEL,
+            "messages": get_compact_analysis_messages(title, description, DESCRIPTION_TOKEN_BUDGET),
+            "max_tokens": COMPACT_MAX_RESPONSE_TOKENS,
+            "response_format": COMPACT_RESPONSE_FORMAT
+        }
+    
+    # Get the prompt from the prompts module
+    prompt = get_laptop_analysis_prompt(title, description)
+    
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": MAX_RESPONSE_TOKENS  # Increased to ensure we get the full response
+    }
+
+def request_analysis(title, description, llm_client=None):
+    """Send one analysis request and return (result, response). API errors are raised to the caller."""
+    request = build_chat_request(title, description)
+    
+    if PRINT_PROMPT:
+        print("\nPrompt sent to LLM:")
+        print("-" * 40)
+        print(request["messages"][-1]["content"])
+        print("-" * 40)
+
+    started = time.perf_counter()
+    response = (llm_client or client).chat.completions.create(**request)
+    elapsed = time.perf_counter() - started
+    metrics.observe("llm_request_seconds", elapsed)
+    latency_ms = round(elapsed * 1000)
+
+    # Extract the response text
+    response_text = response.choices[0].message.content.strip()
+    logger.info(f"Received LLM response for: {title}")
+    
+    if PRINT_PROMPT:
+        print(f"\nModel response: {response_text}")  # Log the model's response for debugging
+
+    result = parse_response(response_text, title)
+    result.update(usage_fields(response.usage, latency_ms))
+    record_usage(result)
+    return result, response
+
+def cached_result(title, description):
+    """Return the cached analysis of an identical listing text, or None"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    result = cache.get(cache_key(title, description))
+    if result is None:
+        return None
+    logger.info(f"Using cached LLM result for: {title}")
+    result.update({"llm_processed_time": datetime.datetime.now().isoformat(), "llm_cached": True})
+    return result
+
+def remember_result(title, description, result, prompt_version=PROMPT_VERSION):
+    """Cache a successful analysis for listings with the same text"""
+    cache = get_cache()
+    if cache is not None and result.get("llm_processed"):
+        cache.put(cache_key(title, description, prompt_version=prompt_version),
+                  {key: value for key, value in result.items() if key not in ACCOUNTING_FIELDS})
+
+def resolve_without_llm(title, description):
+    """Answer from the rule-based extractor or the cache if possible, otherwise None"""
+    result = rule_based_result(extract_specs(title, description))
+    if result is not None:
+        logger.info(f"Specs settled by rules, skipping LLM for: {title}")
+        metrics.inc("llm_results_total", source="rules")
+        return result
+    result = cached_result(title, description)
+    if result is not None:
+        metrics.inc("llm_results_total", source="cache")
+    return result
+
+def process_listing(title, description):
+    """Send the listing title and description to ChatGPT and process the response."""
+    known = resolve_without_llm(title, description)
+    if known is not None:
+        return known
+    return analyze_with_llm(title, description)
+
+def analyze_with_llm(title, description):
+    """Ask the LLM about a listing the rules and the cache couldn't answer; a failed result on errors"""
+    try:
+        result, _ = request_analysis(title, description)
+        remember_result(title, description, result)
+        metrics.inc("llm_results_total", source="llm")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error processing listing with LLM: {str(e)}")
+        metrics.inc("llm_errors_total", error=type(e).__name__)
+        metrics.inc("llm_results_total", source="failed")
+        return failed_result()
+
+def log_cache_stats():
+    """Log the LLM cache hit/miss counters"""
+    cache = get_cache()
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+def update_listings_with_chatgpt(store, concurrency=LLM_CONCURRENCY, spending=None):
+    """Process all unanalyzed listings in the store with ChatGPT and save each result.
+
+    Listings the rules can't settle are analyzed in priority order
+    (llm_scheduler.priority) until the run's or the day's LLM budget is used;
+    the rest stay unprocessed for a later run. spending is the run's
+    SpendingBudget (a new one if not given).
+    """
+    # Import here to avoid circular imports
+    from llm_scheduler import SpendingBudget, order_by_priority
     
     # Count total and unprocessed listings
-    total_listings = len(listings)
-    unprocessed_listings = sum(1 for listing in listings if not listing.get('llm_processed', False))
+    total_listings, unprocessed_listings = store.counts()
     
     logger.info(f"Total listings: {total_listings}")
     logger.info(f"Unprocessed listings: {unprocessed_listings}")
@@ -147,18 +308,51 @@ def update_listings_with_chatgpt(input_file):
     
     logger.info(f"Starting processing of {unprocessed_listings} listings...")
     
+    # Settle whatever the rule-based extractor can answer before any request is made
+    pending = [listing for listing in store.unprocessed() if listing.get("detailed_description")]
+    settled = []
+    remaining = []
+    remaining_specs = []
+    for listing in pending:
+        specs = extract_specs(listing.get("title", ""), listing["detailed_description"])
+        result = rule_based_result(specs)
+        if result is not None:
+            listing.update(result)
+            settled.append(listing)
+        else:
+            remaining.append(listing)
+            remaining_specs.append(specs)
+    store.upsert_many(settled)
+    events.emit_many("listing-analyzed", settled)
+    metrics.inc("llm_results_total", len(settled), source="rules")
+    if pending:
+        logger.info(f"Rules settled {len(settled)} of {len(pending)} listings "
+                    f"({100 * len(settled) / len(pending):.0f}% of LLM calls avoided)")
+    
+    # Most useful listings first, so a budget cut-off leaves the least useful ones for later
+    remaining = order_by_priority(remaining, remaining_specs)
+    if spending is None:
+        spending = SpendingBudget(store)
+    
+    # Hand the work to the concurrent engine unless we're asked to go one by one
+    if concurrency > 1:
+        # Import here to avoid circular imports
+        from llm_engine import LLMEngine
+        
+        processed_count = len(settled) + LLMEngine(concurrency=concurrency, spending=spending).process(remaining, store)
+        logger.info(f"Processing completed. Processed {processed_count} out of {unprocessed_listings} unprocessed listings.")
+        logger.info(f"LLM spending: {spending.summary()}")
+        log_cache_stats()
+        return
+    
     # Track how many listings we've processed in this run
-    processed_count = 0
+    processed_count = len(settled)
     
     # Process each listing
-    for i, listing in enumerate(listings):
+    for listing in remaining:
         listing_id = listing.get('id')
         title = listing.get('title', 'Unknown Title')
         
-        # Skip if already processed
-        if listing.get('llm_processed', False):
-            continue
-        
         if "detailed_description" in listing and listing["detailed_description"]:
             # Display nice separated headline
             separator_line = "-" * 70
@@ -166,28 +360,39 @@ def update_listings_with_chatgpt(input_file):
             logger.info(f"Processing {title} ({processed_count+1}/{unprocessed_listings})")
             logger.info(f"{separator_line}")
             
-            # Pass both title and description to the process_listing function
-            chatgpt_results = process_listing(title, listing["detailed_description"])
+            # Only a request to the API is booked against the budget, so a cache hit is never deferred
+            chatgpt_results = resolve_without_llm(title, listing["detailed_description"])
+            if chatgpt_results is None:
+                spent = spending.reserve(title, listing["detailed_description"])
+                if spent is None:
+                    logger.info(f"LLM budget used up, leaving {title} for a later run")
+                    continue
+                chatgpt_results = analyze_with_llm(title, listing["detailed_description"])
+                spending.settle(spent, chatgpt_results)
             listing.update(chatgpt_results)
             processed_count += 1
             
-            # Write the updated listings back to the file after each processing
+            # Write the updated listing back to the store after each processing
             try:
-                with open(input_file, 'w', encoding='utf-8') as f:
-                    json.dump(listings, f, ensure_ascii=False, indent=4)
+                store.upsert(listing)
+                events.emit("listing-analyzed", listing)
+                metrics.flush()
                 
-                logger.info(f"Updated listing saved to {input_file}: {title} (ID: {listing_id})")
+                logger.info(f"Updated listing saved: {title} (ID: {listing_id})")
             except Exception as e:
                 logger.error(f"Error saving updates: {str(e)}")
                 logger.info("Continuing with next listing...")
     
     logger.info(f"Processing completed. Processed {processed_count} out of {unprocessed_listings} unprocessed listings.")
+    logger.info(f"LLM spending: {spending.summary()}")
+    log_cache_stats()
 
 if __name__ == "__main__":
     # Set up logging when run as a standalone script
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
     data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-    input_file = os.path.join(data_dir, "listings.json")
+    store = open_store(data_dir)
     
-    update_listings_with_chatgpt(input_file)
\ No newline at end of file
+    update_listings_with_chatgpt(store)
+    store.export_json(os.path.join(data_dir, JSON_FILENAME))
\ No newline at end of file
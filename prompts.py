@@ -1,3 +1,5 @@
+import re
+
 def get_laptop_analysis_prompt(title, description):
     """Returns the prompt for analyzing laptop listings"""
     return (
@@ -56,4 +58,91 @@ def get_laptop_analysis_prompt(title, description):
         f"Description: {description}\n\n"
         
         "Remember to first show your reasoning process for each question, and then provide your final answers in the exact format specified."
-    )
\ No newline at end of file
+    )
+
+# Static instructions for the compact prompt mode. They never change between calls and come
+# before the listing text. At about 500 tokens they are below the 1024 tokens OpenAI needs
+# before it caches a prefix, so every call pays for them in full; keep them short.
+COMPACT_SYSTEM_PROMPT = (
+    "You extract laptop specifications from German or English classified ads. "
+    "Answer each question with \"true\", \"false\" or \"unknown\" using only facts stated in the listing.\n\n"
+    "RAM_more: true if the installed RAM is 32GB or more, false if it is less than 32GB. "
+    "Ignore GPU memory (VRAM/GDDR), SSD/HDD storage and 'upgradeable to' maximums.\n"
+    "screen_small: true if the screen diagonal is 14 inches or smaller, false if it is larger. "
+    "Zoll, inch, \" and ″ all mean inches; 15,6 means 15.6.\n"
+    "screen_highres: true if the resolution is higher than Full HD (1920x1080), false if it is Full HD or lower. "
+    "FHD/Full HD/1080p are not higher; QHD, WQHD, WQXGA, 2.5K, 2.8K, 3K, 4K/UHD and 2560x1600 are higher.\n"
+    "Use \"unknown\" whenever the listing doesn't state the value. Do not guess from the model name.\n\n"
+    "Examples:\n"
+    "Listing: 'Lenovo LOQ i5-13450hx rtx 4060 32gb ram, 2 * 1tb ssd, Fullhd Display'\n"
+    "Answer: {\"RAM_more\": \"true\", \"screen_small\": \"unknown\", \"screen_highres\": \"false\"}\n"
+    "Listing: 'Zephyrus G14, 14 Zoll 2560x1600 165Hz, 16 GB DDR5, RTX 4060 8GB GDDR6'\n"
+    "Answer: {\"RAM_more\": \"false\", \"screen_small\": \"true\", \"screen_highres\": \"true\"}\n"
+    "Listing: 'Victus 15,6\" 144Hz, 16GB RAM erweiterbar bis 64GB, 512GB SSD'\n"
+    "Answer: {\"RAM_more\": \"false\", \"screen_small\": \"false\", \"screen_highres\": \"unknown\"}\n"
+    "Listing: 'Yoga Pro 7, 14,5 Zoll 3K Display, 32GB LPDDR5X'\n"
+    "Answer: {\"RAM_more\": \"true\", \"screen_small\": \"false\", \"screen_highres\": \"true\"}\n"
+    "Listing: 'Gaming Laptop RTX 4060, 1TB Speicher, top Zustand'\n"
+    "Answer: {\"RAM_more\": \"unknown\", \"screen_small\": \"unknown\", \"screen_highres\": \"unknown\"}"
+)
+
+# JSON schema for the compact mode's structured output
+LAPTOP_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "RAM_more": {"type": "string", "enum": ["true", "false", "unknown"]},
+        "screen_small": {"type": "string", "enum": ["true", "false", "unknown"]},
+        "screen_highres": {"type": "string", "enum": ["true", "false", "unknown"]}
+    },
+    "required": ["RAM_more", "screen_small", "screen_highres"],
+    "additionalProperties": False
+}
+
+COMPACT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "laptop_specs", "strict": True, "schema": LAPTOP_ANALYSIS_SCHEMA}
+}
+
+# Seller boilerplate that never carries spec information
+BOILERPLATE_PATTERNS = re.compile(
+    r'privatverkauf|keine\s+(garantie|gewährleistung|rücknahme)|gewährleistung|rücknahme|'
+    r'tierfrei|nichtraucher|versand|abholung|paypal|überweisung|bei\s+fragen|'
+    r'preis\s+(ist\s+)?(vb|verhandlungsbasis|fest)|festpreis|keine\s+tausch|tausch\s+nicht|'
+    r'schreib(en\s+sie|t)?\s+(mir|mich)|meld(e|en\s+sie)\s+(dich|sich)',
+    re.IGNORECASE
+)
+
+# Digits and unit tokens mark spec information; a clause holding one is never dropped
+SPEC_TOKEN_PATTERN = re.compile(r'\d|\b(gb|tb|ram|ssd|zoll|inch|hz|hd|fhd|qhd|wqhd|uhd|oled|display)\b|["″]', re.IGNORECASE)
+
+# Clause boundaries: sentence ends and commas followed by a space (not the comma in "15,6")
+CLAUSE_SEPARATOR = re.compile(r'((?<=[.!?;])\s+|,\s+)')
+
+def trim_line(line):
+    """Remove the boilerplate clauses of one line, keeping any clause with spec tokens"""
+    parts = CLAUSE_SEPARATOR.split(line.strip())
+    kept = []
+    # parts alternates clause, separator, clause, ...
+    for index in range(0, len(parts), 2):
+        clause = parts[index]
+        if BOILERPLATE_PATTERNS.search(clause) and not SPEC_TOKEN_PATTERN.search(clause):
+            continue
+        kept.append(clause + (parts[index + 1] if index + 1 < len(parts) else ""))
+    return "".join(kept).strip().rstrip(",").strip()
+
+def trim_description(description, max_tokens=400):
+    """Drop seller boilerplate clauses and cut the description to a rough token budget.
+
+    Falls back to the untrimmed text if nothing but boilerplate was found.
+    """
+    lines = [trim_line(line) for line in description.split('\n') if line.strip()]
+    trimmed = '\n'.join(line for line in lines if line) or description.strip()
+    # About 4 characters per token
+    return trimmed[:max_tokens * 4]
+
+def get_compact_analysis_messages(title, description, max_description_tokens=400):
+    """Returns the chat messages for the compact structured-output mode"""
+    return [
+        {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Title: {title}\n\nDescription: {trim_description(description, max_description_tokens)}"}
+    ]
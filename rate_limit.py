@@ -0,0 +1,111 @@
+import time
+import asyncio
+import logging
+import threading
+import config
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DELAY_BETWEEN_LISTINGS = getattr(config, "DELAY_BETWEEN_LISTINGS", 2)
+CRAWL_MIN_RATE = getattr(config, "CRAWL_MIN_RATE", 0.1)
+CRAWL_MAX_RATE = getattr(config, "CRAWL_MAX_RATE", 2.0)
+CRAWL_RATE_INCREASE = getattr(config, "CRAWL_RATE_INCREASE", 0.02)
+CRAWL_BACKOFF_FACTOR = getattr(config, "CRAWL_BACKOFF_FACTOR", 0.5)
+CRAWL_BURST = getattr(config, "CRAWL_BURST", 2)
+BLOCK_COOLDOWN = getattr(config, "BLOCK_COOLDOWN", 60)
+
+# Markers of captcha and bot-challenge pages
+CAPTCHA_MARKERS = ("captcha", "cf-challenge", "zugriff verweigert", "access denied")
+# Markers of the cookie consent interstitial shown instead of the page
+CONSENT_MARKERS = ("gdpr-banner", "consent-banner", "zustimmen", "einwilligung")
+
+def block_reason(html):
+    """Why a page without the expected content looks blocked ("captcha page" or "consent page"), or None"""
+    lowered = (html or "").lower()
+    if any(marker in lowered for marker in CAPTCHA_MARKERS):
+        return "captcha page"
+    if any(marker in lowered for marker in CONSENT_MARKERS):
+        return "consent page"
+    return None
+
+class AdaptiveRateController:
+    """Shared pacing of page loads: a token bucket whose rate follows AIMD.
+
+    Every page load (search or detail, browser or HTTP) takes one token; the
+    bucket refills at `rate` tokens per second and holds at most `burst`. Each
+    healthy response raises the rate by `increase` up to `max_rate`. A timeout
+    or a page without the expected content multiplies it by `backoff` (at most
+    once per current request interval, so one bad burst counts once), down to
+    `min_rate`. A block (captcha or consent page, 429/403) also pauses all loads for `cooldown`
+    seconds. With `shares` > 1 the rates are divided among that many
+    controllers in parallel scrape processes.
+    """
+
+    def __init__(self, rate=None, min_rate=CRAWL_MIN_RATE, max_rate=CRAWL_MAX_RATE, increase=CRAWL_RATE_INCREASE,
+                 backoff=CRAWL_BACKOFF_FACTOR, burst=CRAWL_BURST, cooldown=BLOCK_COOLDOWN, shares=1):
+        if rate is None:
+            rate = 1 / DELAY_BETWEEN_LISTINGS if DELAY_BETWEEN_LISTINGS > 0 else max_rate
+        # Processes crawling in parallel split the budget evenly
+        rate, min_rate, max_rate, increase = (value / shares for value in (rate, min_rate, max_rate, increase))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max_rate, max(min_rate, rate))
+        self.increase = increase
+        self.backoff = backoff
+        self.burst = max(1, burst)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._last_backoff = float("-inf")
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self):
+        """Take a token, possibly ahead of time, and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def wait(self):
+        """Block until the next page load is allowed"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Asyncio variant of wait()"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        """A page loaded normally: additive increase"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_failure(self, reason, block=False):
+        """A page timed out, was blocked or lacked its content: multiplicative decrease"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            backed_off = now - self._last_backoff >= 1 / self.rate
+            if backed_off:
+                self._last_backoff = now
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+            if block:
+                # Owe cooldown seconds worth of tokens so every caller pauses
+                self._tokens = min(self._tokens, -self.cooldown * self.rate)
+            rate = self.rate
+        if not backed_off:
+            return
+        metrics.inc("scraper_backoffs_total", reason=reason)
+        logger.warning(f"Backing off after {reason}: {rate:.2f} page loads/s"
+                       + (f", pausing {self.cooldown}s" if block else ""))
@@ -1,20 +1,70 @@
 import os
-import json
-import time
+import datetime
 import pickle
 import logging
 import re
+import uuid
+import queue
+import shutil
+import hashlib
+import multiprocessing
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from bs4 import BeautifulSoup
-from config import DELAY_BETWEEN_PAGES, DELAY_BETWEEN_LISTINGS, PAGES_TO_SCRAPE
+import config
+import metrics
+import events
+from config import PAGES_TO_SCRAPE
+from detail_fetcher import DetailFetcher
+from parsers import parse_search_results, parse_price, DISTANCE_PATTERN
+from rate_limit import AdaptiveRateController, block_reason
+from dedup import RepostIndex, inherit, REPOST_DETECTION, REPOST_VERIFY
+from frontier import Frontier
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+BASE_URL = getattr(config, "BASE_URL", "https://www.kleinanzeigen.de").rstrip('/')
+FETCH_BACKEND = getattr(config, "FETCH_BACKEND", "selenium")
+INCREMENTAL_CRAWL = getattr(config, "INCREMENTAL_CRAWL", True)
+BACKFILL_PAGES = getattr(config, "BACKFILL_PAGES", 20)
+CHANGE_DETECTION = getattr(config, "CHANGE_DETECTION", True)
+LOGIN_CHECK_TIMEOUT = getattr(config, "LOGIN_CHECK_TIMEOUT", 10)
+SEARCH_PAGE_TIMEOUT = getattr(config, "SEARCH_PAGE_TIMEOUT", 10)
+BROWSER_PROFILE = getattr(config, "BROWSER_PROFILE", "full")
+SCRAPE_PROCESSES = getattr(config, "SCRAPE_PROCESSES", 1)
+
+# Left out when copying the Chrome profile for a scrape process: the running browser's locks and caches
+PROFILE_COPY_IGNORE = shutil.ignore_patterns(
+    "Singleton*", "lockfile", "*.lock", "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache", "Crashpad"
+)
+
+# Requests the lean browser profile never makes: images, media, fonts and ad/analytics hosts
+LEAN_BLOCKED_URLS = getattr(config, "LEAN_BLOCKED_URLS", [
+    "*.jpg", "*.jpeg", "*.JPG", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.mp3", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*img.kleinanzeigen.de/*", "*googletagmanager.com/*", "*google-analytics.com/*",
+    "*doubleclick.net/*", "*googlesyndication.com/*", "*adservice.google.*", "*amazon-adsystem.com/*",
+    "*criteo.com/*", "*criteo.net/*", "*adform.net/*", "*adnxs.com/*", "*taboola.com/*", "*outbrain.com/*",
+    "*facebook.net/*", "*hotjar.com/*", "*scorecardresearch.com/*", "*ioam.de/*", "*yieldlove*",
+])
+
+# Hide navigator.webdriver from the site's bot detection
+ANTI_DETECTION_SCRIPT = """
+        Object.defineProperty(navigator, 'webdriver', {
+            get: () => undefined
+        })
+        """
+
+# Header elements shown to logged-in and to logged-out visitors
+LOGGED_IN_SELECTOR = "#user-email, #user-logout"
+LOGGED_OUT_SELECTOR = "#site-signin, a[href*='m-einloggen']"
+
+# Search result fields that identify a changed listing
+SNIPPET_FIELDS = ("title", "price", "short_description", "location")
+
 def save_cookies(driver, path):
     """Save browser cookies to a file"""
     if not os.path.exists(os.path.dirname(path)):
@@ -44,15 +94,20 @@ def load_cookies(driver, path):
 def check_login_status(driver):
     """Check if the user is logged in"""
     # Navigate to the homepage
-    driver.get("https://www.kleinanzeigen.de/")
+    driver.get(f"{BASE_URL}/")
     
-    # Wait for the page to load
-    time.sleep(2)
+    # Wait until the header shows either the logged-in or the logged-out state
+    try:
+        WebDriverWait(driver, LOGIN_CHECK_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, f"{LOGGED_IN_SELECTOR}, {LOGGED_OUT_SELECTOR}"))
+        )
+    except TimeoutException:
+        logger.warning("Timeout waiting for the login state to show")
     
     # Look for elements that indicate a logged-in state
     try:
         # Check for user email or logout link which indicates logged-in state
-        logged_in_indicators = driver.find_elements(By.CSS_SELECTOR, "#user-email, #user-logout")
+        logged_in_indicators = driver.find_elements(By.CSS_SELECTOR, LOGGED_IN_SELECTOR)
         return len(logged_in_indicators) > 0
     except:
         return False
@@ -62,7 +117,7 @@ def manual_login(driver, cookies_path):
     # First try to load cookies
     if os.path.exists(cookies_path):
         # Load the site first (cookies need a matching domain)
-        driver.get("https://www.kleinanzeigen.de/")
+        driver.get(f"{BASE_URL}/")
         load_cookies(driver, cookies_path)
         driver.refresh()  # Refresh to apply cookies
         
@@ -72,261 +127,678 @@ def manual_login(driver, cookies_path):
             return
     
     # If we get here, we need manual login
-    driver.get("https://www.kleinanzeigen.de/")
+    if BROWSER_PROFILE == "lean":
+        raise RuntimeError('Not logged in. The lean browser is headless, so log in once with BROWSER_PROFILE = "full"')
+    driver.get(f"{BASE_URL}/")
     input("Please log in manually and then press Enter to continue...")
     
     # Save the cookies for next time
     save_cookies(driver, cookies_path)
     logger.info("Manual login completed and cookies saved")
 
-def get_detailed_description(driver, url):
-    """Get detailed description from a listing's detail page"""
-    try:
-        # Store current URL to return to later
-        current_url = driver.current_url
+def browser_options(user_data_dir, profile=BROWSER_PROFILE):
+    """Chrome options for the persistent profile; "lean" runs headless without images and waits for the DOM only"""
+    options = webdriver.ChromeOptions()
+    options.add_argument(f"user-data-dir={user_data_dir}")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    
+    if profile == "lean":
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1366,900")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        # driver.get returns at DOMContentLoaded; the scraper waits for the elements it reads anyway
+        options.page_load_strategy = "eager"
+    return options
+
+def setup_tab(driver, profile=BROWSER_PROFILE):
+    """Apply the CDP tweaks to the current tab (CDP settings are per tab, so call this for every new one)"""
+    # Execute CDP commands to make the browser less detectable
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": ANTI_DETECTION_SCRIPT})
+    
+    if profile == "lean":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+        # Headless Chrome announces itself in the user agent
+        user_agent = driver.execute_script("return navigator.userAgent")
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {
+            "userAgent": user_agent.replace("HeadlessChrome", "Chrome")
+        })
+
+def create_driver(user_data_dir, profile=BROWSER_PROFILE):
+    """Start Chrome with the persistent profile and anti-detection tweaks"""
+    driver = webdriver.Chrome(options=browser_options(user_data_dir, profile))
+    setup_tab(driver, profile)
+    return driver
+
+class BrowserBackend:
+    """Fetch backend that loads pages in the logged-in Selenium browser"""
+
+    def __init__(self, driver, rate_controller=None):
+        self.driver = driver
+        # Paces search and detail page loads alike
+        self.rate_controller = rate_controller or AdaptiveRateController()
+        # Pool of tabs for fetching detail pages in parallel
+        self.detail_fetcher = DetailFetcher(driver, rate_controller=self.rate_controller,
+                                            setup_tab=lambda: setup_tab(driver))
+
+    @classmethod
+    def start(cls, data_dir, rate_controller=None, user_data_dir=None):
+        """Launch Chrome, log in and return a ready backend"""
+        cookies_path = os.path.join(data_dir, "cookies.pkl")
+        user_data_dir = user_data_dir or os.path.join(data_dir, "chrome_profile")
+        os.makedirs(user_data_dir, exist_ok=True)
         
-        # Navigate to the listing detail page
-        logger.info(f"Getting detailed description from: {url}")
-        driver.get(url)
+        driver = create_driver(user_data_dir)
+        try:
+            # Handle login with cookie persistence
+            manual_login(driver, cookies_path)
+            return cls(driver, rate_controller)
+        except Exception:
+            driver.quit()
+            raise
+
+    def fetch_search_page(self, url):
+        """Load a search results page and return its HTML, or None on timeout"""
+        self.rate_controller.wait()
+        self.driver.get(url)
         
-        # Wait for the description to load
+        # Wait for the main content to load
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "viewad-description"))
+            WebDriverWait(self.driver, SEARCH_PAGE_TIMEOUT).until(
+                EC.presence_of_element_located((By.ID, "srchrslt-adtable"))
             )
         except TimeoutException:
-            logger.warning(f"Timeout waiting for detailed description to load: {url}")
-            driver.get(current_url)  # Go back to the search results
-            return ""
-        
-        # Parse the page with BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        
-        # Extract detailed description
-        detailed_description = ""
-        desc_elem = soup.select_one("#viewad-description-text")
-        if desc_elem:
-            detailed_description = desc_elem.get_text(separator='\n', strip=False)
+            logger.error("Timeout waiting for page to load")
+            reason = block_reason(self.driver.page_source)
+            if reason is not None:
+                self.rate_controller.record_failure(reason, block=True)
+            else:
+                self.rate_controller.record_failure("missing #srchrslt-adtable")
+            return None
         
-        # Go back to the search results
-        driver.get(current_url)
-        
-        return detailed_description
-        
-    except Exception as e:
-        logger.error(f"Error getting detailed description: {str(e)}")
-        # Try to go back to the search results
+        self.rate_controller.record_success()
+        return self.driver.page_source
+
+    def fetch_details(self, urls):
+        """Fetch detailed descriptions for the given listing URLs ({url: description}, None if it failed)"""
+        return self.detail_fetcher.fetch_all(urls)
+
+    def is_alive(self):
+        """Check that the browser session still responds"""
         try:
-            driver.get(current_url)
-        except:
-            pass
-        return ""
+            self.driver.current_window_handle
+            return True
+        except Exception:
+            return False
 
-def scrape_page(driver, url, output_file=None, max_listings=None, process_immediately=False):
-    """Scrape a page and get detailed descriptions without LLM processing"""
-    # Import here to avoid circular imports
-    if process_immediately:
-        from process_listings import process_listing
-    
+    def close(self):
+        """Shut down the browser"""
+        self.driver.quit()
+
+def fetch_search_results(backend, url):
+    """Load a search results page and parse its listings, or return None if it failed to load"""
     # Open the target URL and wait for the content to load
     logger.info(f"Scraping page: {url}")
-    driver.get(url)
-    
-    # Wait for the main content to load
-    try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "srchrslt-adtable"))
-        )
-    except TimeoutException:
-        logger.error("Timeout waiting for page to load")
-        return []
+    with metrics.timer("scraper_search_page_seconds"):
+        html = backend.fetch_search_page(url)
+    if html is None:
+        metrics.inc("scraper_search_page_failures_total")
+        return None
+    return parse_search_results(html)
+
+def snippet_hash(listing):
+    """Hash of the fields a search results page shows for a listing"""
+    values = []
+    for field in SNIPPET_FIELDS:
+        value = re.sub(r'\s+', ' ', str(listing.get(field) or "")).strip()
+        if field == "location":
+            value = DISTANCE_PATTERN.sub("", value).strip()
+        values.append(value)
+    return hashlib.sha256("\0".join(values).encode('utf-8')).hexdigest()[:16]
+
+def refresh_known_listing(store, result, stored_hash):
+    """Return the stored listing updated from its search snippet, or None if the snippet is unchanged"""
+    current_hash = snippet_hash(result)
+    stored = None
+    if stored_hash is None:
+        # Listings saved before change detection have no hash yet
+        stored = store.get(result["id"])
+        stored_hash = snippet_hash(stored)
+        if stored_hash == current_hash:
+            stored["snippet_hash"] = current_hash
+            store.upsert(stored)
+            return None
+    elif stored_hash == current_hash:
+        return None
     
-    # Parse the page with BeautifulSoup
-    soup = BeautifulSoup(driver.page_source, "html.parser")
+    stored = stored or store.get(result["id"])
+    now = datetime.datetime.now().isoformat()
+    if stored.get("price") != result["price"]:
+        # Start the history with the price we first saw
+        history = stored.get("price_history") or [{"price": stored.get("price", ""), "time": stored.get("scraped_time")}]
+        history.append({"price": result["price"], "time": now})
+        stored["price_history"] = history
+        logger.info(f"Price of {result['title']} changed: {stored.get('price')} -> {result['price']}")
     
-    # Load existing listings to check for duplicates
-    existing_listings = []
-    existing_ids = set()
-    if output_file and os.path.exists(output_file):
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                existing_listings = json.load(f)
-                existing_ids = {item.get('id', '') for item in existing_listings}
-                logger.info(f"Loaded {len(existing_ids)} existing listing IDs to check for duplicates")
-        except (json.JSONDecodeError, IOError) as e:
-            logger.warning(f"Error loading existing listings: {str(e)}")
-            existing_listings = []
-            existing_ids = set()
-    
-    # Loop through each listing in the search results
-    scraped_listings = []
-    listing_count = 0
+    stored.update({field: result[field] for field in SNIPPET_FIELDS})
+    stored.update({
+        "url": result["url"] or stored.get("url", ""),
+        "price_value": parse_price(result["price"]),
+        "snippet_hash": current_hash,
+        "updated_time": now
+    })
+    return stored
+
+def plan_results(results, store=None, max_listings=None, run_id=None, search_url=None):
+    """Pick the new and changed listings among search results and the detail pages they need.
+
+    Returns a plan for save_results(): the listings to save, the detail URLs
+    to fetch for them, and what save_results() needs to decide which ones to
+    analyze again. A new listing that reposts a stored one takes over its
+    description and analysis instead of being fetched (unless REPOST_VERIFY).
+    With a run_id (set when several processes scrape in parallel) a listing
+    is only planned by the process that claims it first. New listings record
+    the search_url they were found by (its price filter counts for their
+    analysis priority).
+    """
+    # Collect the new listings on this page before fetching any detail pages
+    new_listings = []
+    # (title, description) of changed listings before the refresh
+    previous_text = {}
+    # Descriptions reposts took over from the listing they repost
+    inherited_text = {}
+    # Search results of the new listings, as journaled in the frontier
+    new_results = {}
+    known_hashes = store.snippet_hashes([result["id"] for result in results]) if store is not None else {}
+    repost_index = RepostIndex(store) if store is not None and REPOST_DETECTION else None
     
-    for item in soup.select("ul#srchrslt-adtable li.ad-listitem"):
+    for result in results:
         # Check if we've reached the maximum number of listings to process
-        if max_listings is not None and listing_count >= max_listings:
+        if max_listings is not None and len(new_listings) >= max_listings:
             logger.info(f"Reached maximum number of listings to scrape: {max_listings}")
             break
-            
-        try:
-            # Extract listing ID from data attributes first to check for duplicates
-            listing_id = ""
-            article_elem = item.select_one("article.aditem")
-            if article_elem and article_elem.has_attr('data-adid'):
-                listing_id = article_elem['data-adid']
-            
-            # Skip if this listing ID already exists in our data
-            if listing_id in existing_ids:
+        
+        # Known listings are only fetched again if their search snippet changed
+        listing_id = result["id"]
+        if listing_id in known_hashes:
+            listing = refresh_known_listing(store, result, known_hashes[listing_id]) if CHANGE_DETECTION else None
+            if listing is None:
                 logger.info(f"Skipping already scraped listing ID: {listing_id}")
                 continue
+            logger.info(f"Listing changed since last scrape, fetching it again: {listing['title']}")
+            metrics.inc("scraper_listings_changed_total")
+            previous_text[listing_id] = (listing.get("title"), listing.get("detailed_description", ""))
+            new_listings.append(listing)
+            continue
+        
+        # Listings without a detail URL can't be scraped further
+        if not result["url"]:
+            continue
+        
+        # Create listing object with basic info
+        listing = dict(result)
+        listing.update({
+            # Numeric price for sorting and filtering in the web UI
+            "price_value": parse_price(result["price"]),
+            "detailed_description": "",
+            "llm_processed": False,
+            "scraped_time": datetime.datetime.now().isoformat(),
+            "snippet_hash": snippet_hash(result)
+        })
+        if search_url:
+            listing["search_url"] = search_url
+        
+        # A repost of a stored listing reuses its description and analysis
+        original = repost_index.find(listing) if repost_index is not None else None
+        if original is not None:
+            inherit(listing, original)
+            inherited_text[listing_id] = listing["detailed_description"]
+        new_results[listing_id] = dict(result, search_url=search_url) if search_url else result
+        new_listings.append(listing)
+    
+    # Another process of this run may be fetching the same listing from an overlapping search
+    if run_id is not None and store is not None:
+        claimed = store.claim([listing["id"] for listing in new_listings], run_id)
+        if len(claimed) < len(new_listings):
+            logger.info(f"Skipping {len(new_listings) - len(claimed)} listings another scrape process took on")
+            metrics.inc("scraper_claims_lost_total", len(new_listings) - len(claimed))
+        new_listings = [listing for listing in new_listings if listing["id"] in claimed]
+    
+    return {
+        "listings": new_listings,
+        "to_fetch": [
+            listing["url"] for listing in new_listings
+            if REPOST_VERIFY or not inherited_text.get(listing["id"])
+        ],
+        "previous_text": previous_text,
+        "inherited_text": inherited_text,
+        "new_results": new_results
+    }
+
+def save_results(plan, descriptions, url, store=None, pipeline=None, frontier=None):
+    """Save the planned listings with their fetched detailed descriptions ({url: description}, None on failure).
+
+    Saved listings that need analysis are handed to the pipeline, if given.
+    With a frontier, a new listing whose detail page failed to load is left
+    for a later run to retry instead of being saved.
+    """
+    previous_text = plan["previous_text"]
+    inherited_text = plan["inherited_text"]
+    new_results = plan["new_results"]
+    scraped_listings = []
+    
+    for listing in plan["listings"]:
+        try:
+            title = listing["title"]
+            # None marks a detail page that failed to load; "" is a page without a description
+            fetched = descriptions.get(listing["url"])
+            failed = fetched is None and listing["url"] in plan["to_fetch"]
+            # A failed re-fetch keeps the description we already have
+            detailed_description = fetched if fetched is not None else listing["detailed_description"]
             
-            # Extract basic listing information
-            title_elem = item.select_one("h2 a")
-            title = title_elem.get_text(strip=True) if title_elem else ""
-            
-            # Extract the listing URL for detailed view
-            listing_url = ""
-            if title_elem and title_elem.has_attr('href'):
-                listing_url = "https://www.kleinanzeigen.de" + title_elem['href']
-            
-            price_elem = item.select_one("p.aditem-main--middle--price-shipping--price")
-            price = price_elem.get_text(strip=True) if price_elem else ""
-            
-            desc_elem = item.select_one("p.aditem-main--middle--description")
-            short_description = desc_elem.get_text(strip=True) if desc_elem else ""
-            
-            location_elem = item.select_one(".aditem-main--top--left")
-            location = location_elem.get_text(strip=True) if location_elem else ""
+            # Changed listings are analyzed again only if their text changed, not just the price
+            previous = previous_text.get(listing["id"])
+            if previous is not None and previous != (title, detailed_description):
+                listing["llm_processed"] = False
+            # A verified repost whose description was edited is analyzed again
+            if inherited_text.get(listing["id"], detailed_description) != detailed_description:
+                logger.info(f"Description of repost {title} changed, analyzing it again")
+                listing["llm_processed"] = False
+            listing["detailed_description"] = detailed_description
             
-            # Create listing object with basic info
-            listing = {
-                "id": listing_id,
-                "title": title,
-                "price": price,
-                "short_description": short_description,
-                "location": location,
-                "url": listing_url,
-                "detailed_description": "",
-                "llm_processed": False
-            }
+            # A new listing whose detail page didn't load is retried by a later run
+            if (frontier is not None and failed and listing["id"] in new_results
+                    and frontier.retry_later(listing["id"], "detail page failed to load")):
+                continue
             
-            # If we have a valid URL, get detailed information
-            if listing_url:
-                # Get detailed description
-                detailed_description = get_detailed_description(driver, listing_url)
-                listing["detailed_description"] = detailed_description
-                
-                # Process the listing immediately if requested
-                if process_immediately and detailed_description:
-                    logger.info(f"Processing listing immediately: {title}")
-                    separator_line = "-" * 70
-                    logger.info(f"{separator_line}")
-                    logger.info(f"Processing {title}")
-                    logger.info(f"{separator_line}")
-                    
-                    chatgpt_results = process_listing(title, detailed_description)
-                    listing.update(chatgpt_results)
-                
-                # Save after each detailed fetch if output_file is provided
-                if output_file:
-                    # Add current listing to existing listings and save
-                    existing_listings.append(listing)
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        json.dump(existing_listings, f, ensure_ascii=False, indent=4)
-                    logger.info(f"Saved scraped listing to {output_file}: {title}")
-                
-                listing_count += 1
-                scraped_listings.append(listing)
+            # Save after each detailed fetch if a store is provided
+            if store is not None:
+                store.upsert(listing)
+                logger.info(f"Saved scraped listing: {title}")
+                # Let the web UI show the listing right away
+                events.emit("listing-updated" if listing["id"] in previous_text else "listing-created", listing)
                 
-                # Add a small delay between processing listings to avoid rate limits
-                time.sleep(DELAY_BETWEEN_LISTINGS)
+                # Analysis runs alongside the scrape; the browser moves on to the next page
+                if pipeline is not None and detailed_description and not listing["llm_processed"]:
+                    pipeline.submit(listing)
+            
+            scraped_listings.append(listing)
             
         except Exception as e:
             logger.error(f"Error scraping listing: {str(e)}")
             continue
     
+    # Later reposts of these listings can now be recognized
+    if store is not None and REPOST_DETECTION:
+        RepostIndex(store).add(scraped_listings)
+    if frontier is not None:
+        frontier.details_done([listing["id"] for listing in scraped_listings])
+    
+    metrics.inc("scraper_listings_scraped_total", len(scraped_listings))
     logger.info(f"Scraped {len(scraped_listings)} new listings from {url}")
     return scraped_listings
 
-def scrape_listings(urls, output_file, max_listings=None, process_immediately=False):
-    """Main function to scrape listings from multiple URLs"""
-    # Import here to avoid circular imports
-    from config import PAGES_TO_SCRAPE, DELAY_BETWEEN_PAGES
+def scrape_results(backend, results, url, store=None, max_listings=None, pipeline=None, run_id=None,
+                   frontier=None, search_url=None):
+    """Fetch detailed descriptions for the new and changed listings among search results and save them.
+
+    See plan_results() and save_results(). With a frontier, the detail
+    fetches of new listings are journaled before they start, and listings
+    whose detail page the run already tried are left for the next run.
+    """
+    if frontier is not None:
+        results = frontier.not_attempted(results)
+    plan = plan_results(results, store, max_listings, run_id, search_url)
+    
+    # Journal the new listings first, so an interruption during the fetch doesn't lose them
+    if frontier is not None:
+        frontier.add_details([
+            plan["new_results"][listing["id"]] for listing in plan["listings"] if listing["id"] in plan["new_results"]
+        ])
+    # Fetch all detail pages in parallel; the search page is never reloaded
+    with metrics.timer("scraper_detail_batch_seconds"):
+        descriptions = backend.fetch_details(plan["to_fetch"])
+    
+    return save_results(plan, descriptions, url, store, pipeline, frontier)
+
+def scrape_page(backend, url, store=None, max_listings=None, pipeline=None):
+    """Scrape a page and get detailed descriptions, handing them to the analysis pipeline if given"""
+    results = fetch_search_results(backend, url)
+    if results is None:
+        return []
+    return scrape_results(backend, results, url, store, max_listings, pipeline)
+
+def build_page_url(base_url, page):
+    """Return the URL of the given results page of a search"""
+    if page == 1:
+        # First page uses the original URL
+        return base_url
+    
+    # For subsequent pages, insert the page number into the URL
+    # Check if the URL already contains a page parameter
+    if "/seite:" in base_url:
+        # Replace existing page parameter
+        return re.sub(r'/seite:\d+/', f'/seite:{page}/', base_url)
+    
+    # Find the position to insert the page parameter
+    # Typically after the search path but before any filters
+    parts = base_url.split('/')
+    domain_part = '/'.join(parts[:3])  # e.g., https://www.kleinanzeigen.de
+    path_part = parts[3]  # e.g., s-notebooks
+    
+    # Insert the page parameter after the path part
+    remaining_parts = '/'.join(parts[4:]) if len(parts) > 4 else ""
+    return f"{domain_part}/{path_part}/seite:{page}/{remaining_parts}"
+
+def create_backend(data_dir, backend=FETCH_BACKEND, rate_controller=None, user_data_dir=None):
+    """Create the configured fetch backend ("selenium" or "http")"""
+    # One controller paces all page loads, including those of the Selenium fallback
+    rate_controller = rate_controller or AdaptiveRateController()
+    if backend == "http":
+        # Import here so the selenium-only setup doesn't need aiohttp
+        from http_fetcher import HttpBackend
+        return HttpBackend(
+            os.path.join(data_dir, "cookies.pkl"),
+            fallback_factory=lambda: BrowserBackend.start(data_dir, rate_controller, user_data_dir),
+            rate_controller=rate_controller
+        )
+    return BrowserBackend.start(data_dir, rate_controller, user_data_dir)
+
+def newest_id(listing_ids):
+    """Highest numeric ad ID in the list, or None"""
+    numeric = [int(listing_id) for listing_id in listing_ids if str(listing_id).isdigit()]
+    return str(max(numeric)) if numeric else None
+
+def page_limit(store, base_url, backfill=False):
+    """Number of result pages to walk for a search: the backfill limit for new searches"""
+    if backfill or (INCREMENTAL_CRAWL and store.get_watermark(base_url) is None):
+        return max(BACKFILL_PAGES, PAGES_TO_SCRAPE)
+    return PAGES_TO_SCRAPE
+
+def crawl_search(fetch_backend, base_url, store, max_listings=None, pipeline=None, backfill=False, run_id=None,
+                 frontier=None):
+    """Walk the result pages of one search, stopping early once a page holds nothing new.
+
+    Results are sorted newest first, so a page whose regular (non-promoted)
+    listings are all already stored means the following pages are known too.
+    Promoted top ads are shown on every page regardless of age and are
+    ignored for that decision. Backfills walk up to BACKFILL_PAGES pages
+    without stopping early. With a frontier, completed pages are journaled
+    and a resumed run continues after the last one.
+    """
+    first_page = frontier.next_page(base_url) if frontier is not None else 1
+    if first_page is None:
+        logger.info(f"Search already finished before the interruption: {base_url}")
+        return []
+    if first_page > 1:
+        logger.info(f"Resuming {base_url} at page {first_page}")
+    
+    pages = page_limit(store, base_url, backfill)
+    watermark = store.get_watermark(base_url)
+    seen_ids = [watermark["newest_id"]] if watermark and watermark["newest_id"] else []
+    scraped = []
+    new_listings = 0
+    page = first_page - 1
+    
+    for page in range(first_page, pages + 1):
+        current_url = build_page_url(base_url, page)
+        logger.info(f"Scraping page {page} of {pages}: {current_url}")
+        
+        results = fetch_search_results(fetch_backend, current_url)
+        if results is not None:
+            # Ad slots between the listings parse as entries without an ID
+            organic = [result for result in results if result["id"] and not result.get("promoted")]
+            seen_ids.extend(result["id"] for result in organic)
+            # Decide before saving, since scraping makes this page's listings known
+            new_ids = {result["id"] for result in organic if not store.contains(result["id"])}
+            new_listings += len(new_ids)
+            
+            scraped.extend(scrape_results(
+                fetch_backend,
+                results,
+                current_url,
+                store=store,
+                max_listings=max_listings,
+                pipeline=pipeline,
+                run_id=run_id,
+                frontier=frontier,
+                search_url=base_url
+            ))
+            # Listings that stop showing up in any search are moved to the archive after a while
+            store.touch([result["id"] for result in results if result["id"]], datetime.datetime.now().isoformat())
+            if frontier is not None:
+                frontier.page_done(base_url, page)
+            metrics.flush()
+            
+            if INCREMENTAL_CRAWL and not organic:
+                logger.info(f"No more results after page {page - 1} of {base_url}")
+                break
+            if INCREMENTAL_CRAWL and not new_ids and not backfill:
+                logger.info(f"Page {page} holds only known listings, stopping pagination of {base_url}")
+                metrics.inc("scraper_pages_skipped_total", pages - page)
+                break
+    
+    store.set_watermark(base_url, newest_id(seen_ids), datetime.datetime.now().isoformat(), page, new_listings)
+    if frontier is not None:
+        frontier.page_done(base_url, page, search_done=True)
+    return scraped
+
+def retry_pending_details(fetch_backend, store, frontier, pipeline=None, run_id=None):
+    """Fetch the detail pages an interrupted or earlier run left pending (claimed for run_id, if given)"""
+    pending = frontier.pending_details()
+    # Listings saved just before an interruption only need their journal entry removed
+    saved = {result["id"] for result in pending if store.contains(result["id"])}
+    frontier.details_done(saved)
+    pending = [result for result in pending if result["id"] not in saved]
+    if not pending:
+        return []
+    logger.info(f"Retrying {len(pending)} pending detail pages")
+    return scrape_results(fetch_backend, pending, "pending detail pages", store=store, pipeline=pipeline,
+                          run_id=run_id, frontier=frontier)
+
+def start_pipeline(store, process_immediately, spending=None, spending_run_id=None):
+    """Analysis pipeline for a run that analyzes listings as they are scraped, else None.
+
+    spending is the run's SpendingBudget; spawned processes, which can't be
+    handed the object, pass its run ID instead.
+    """
+    if not process_immediately:
+        return None
+    # Import here so scrape-only runs don't load the LLM client
+    from pipeline import AnalysisPipeline
+    from llm_scheduler import SpendingBudget
+    return AnalysisPipeline(store, spending=spending or SpendingBudget(store, spending_run_id))
+
+def worker_profile_dir(data_dir, worker_index):
+    """Chrome profile of one scrape process, copied from the logged-in main profile on first use"""
+    profile_dir = os.path.join(data_dir, f"chrome_profile_worker{worker_index}")
+    main_profile = os.path.join(data_dir, "chrome_profile")
+    if not os.path.exists(profile_dir) and os.path.isdir(main_profile):
+        shutil.copytree(main_profile, profile_dir, ignore=PROFILE_COPY_IGNORE)
+    return profile_dir
+
+class ScrapeError(Exception):
+    """Raised when a parallel scrape finished with failed or lost processes"""
+
+def crawl_worker(worker_index, processes, data_dir, db_path, backend, url_queue, result_queue, run_id, frontier_key,
+                 options):
+    """Scrape process: crawl search URLs from url_queue until it hands out None"""
+    # Import here, storage is only needed by the spawned processes
+    from storage import open_store
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - worker {worker_index} - %(message)s')
+    # Events go next to the store, as in the parent
+    events.configure(os.path.dirname(db_path))
+    store = open_store(os.path.dirname(db_path))
+    # Rate state is per process, so each one gets its share of the crawl budget
+    rate_controller = AdaptiveRateController(shares=processes)
+    
+    # The run's journal is shared by all processes
+    frontier = Frontier(os.path.dirname(db_path), key=frontier_key)
+    
+    scraped = 0
+    error = None
+    fetch_backend = None
+    pipeline = None
+    try:
+        pipeline = start_pipeline(store, options.pop("process_immediately", False),
+                                  spending_run_id=options.pop("spending_run_id", None))
+        fetch_backend = create_backend(data_dir, backend, rate_controller, worker_profile_dir(data_dir, worker_index))
+        # One process picks up the detail pages earlier runs left pending
+        if worker_index == 0:
+            # Claimed, so no other process fetches them again when they show up in its searches
+            scraped += len(retry_pending_details(fetch_backend, store, frontier, pipeline, run_id))
+        for base_url in iter(url_queue.get, None):
+            scraped += len(crawl_search(fetch_backend, base_url, store, pipeline=pipeline, run_id=run_id,
+                                        frontier=frontier, **options))
+    except Exception as e:
+        # As in a single-process run the process stops at its first error; the others take the remaining searches
+        logger.error(f"Error in scrape process {worker_index}: {str(e)}")
+        error = str(e)
+    finally:
+        if fetch_backend is not None:
+            fetch_backend.close()
+        if pipeline is not None:
+            pipeline.close()
+        frontier.close()
+        store.close()
+        # The parent reports the metrics of the whole run
+        result_queue.put((worker_index, scraped, error, metrics.registry.counters, metrics.registry.histograms))
+
+def scrape_listings_parallel(urls, store, data_dir, processes, backend=FETCH_BACKEND, frontier_key=None, **options):
+    """Crawl the search URLs in several processes, each with its own browser and store connection.
+
+    The processes take search URLs from a shared queue. Listings that turn up
+    in more than one search are claimed in the store, so only one process
+    fetches their detail page. Returns the number of listings scraped, or
+    raises ScrapeError once all processes are done if any of them failed.
+    """
+    # Spawn rather than fork: the parent may hold a browser session and SQLite connection
+    context = multiprocessing.get_context("spawn")
+    url_queue = context.Queue()
+    result_queue = context.Queue()
+    for url in urls:
+        url_queue.put(url)
+    for _ in range(processes):
+        url_queue.put(None)
+    
+    run_id = uuid.uuid4().hex
+    workers = [
+        context.Process(
+            target=crawl_worker,
+            args=(index, processes, data_dir, store.db_path, backend, url_queue, result_queue, run_id, frontier_key,
+                  options),
+            name=f"scrape-worker-{index}"
+        )
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
     
+    scraped = 0
+    reported = 0
+    errors = []
+    while reported < len(workers):
+        try:
+            worker_index, count, error, counters, histograms = result_queue.get(timeout=5)
+        except queue.Empty:
+            # A process that died without reporting (e.g. killed) would keep us waiting forever
+            if not any(worker.is_alive() for worker in workers):
+                errors.append(f"{len(workers) - reported} scrape processes exited without reporting")
+                logger.error(errors[-1])
+                break
+            continue
+        logger.info(f"Scrape process {worker_index} scraped {count} listings")
+        scraped += count
+        reported += 1
+        if error is not None:
+            errors.append(f"process {worker_index}: {error}")
+        metrics.registry.merge(counters, histograms)
+    
+    for worker in workers:
+        worker.join()
+    store.release_claims(run_id)
+    if errors:
+        raise ScrapeError(f"Scraped {scraped} listings, but " + "; ".join(errors))
+    return scraped
+
+def scrape_listings(urls, store, max_listings=None, process_immediately=False, backend=FETCH_BACKEND, backfill=False,
+                    fetch_backend=None, processes=SCRAPE_PROCESSES, spending=None):
+    """Main function to scrape listings from multiple URLs.
+
+    A running fetch_backend (e.g. the worker's warm browser) is used as is and
+    left open; otherwise one is started for this run and closed afterwards.
+    Errors are raised to the caller once the backend and pipeline are closed.
+    With processes > 1 and several URLs the searches are crawled in parallel
+    processes instead, each starting its own backend. With process_immediately,
+    the analysis while scraping books against spending, the run's LLM budget.
+    """
     # Define paths for persistent data
     data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-    cookies_path = os.path.join(data_dir, "cookies.pkl")
-    user_data_dir = os.path.join(data_dir, "chrome_profile")
     
     # Create directories if they don't exist
     os.makedirs(data_dir, exist_ok=True)
-    os.makedirs(user_data_dir, exist_ok=True)
     
-    # Initialize your Selenium driver with persistent profile
-    options = webdriver.ChromeOptions()
-    options.add_argument(f"user-data-dir={user_data_dir}")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
+    # Listings saved before repost detection need a signature to be matched against
+    if REPOST_DETECTION:
+        RepostIndex(store).index_missing()
     
-    driver = webdriver.Chrome(options=options)
-    # Execute CDP commands to make the browser less detectable
-    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-        "source": """
-        Object.defineProperty(navigator, 'webdriver', {
-            get: () => undefined
-        })
-        """
-    })
+    # Journal the run's progress so an interrupted run resumes where it stopped
+    frontier = Frontier(os.path.dirname(store.db_path))
+    frontier.begin(urls, backfill, max_listings, process_immediately)
+    
+    if processes > 1 and len(urls) > 1:
+        processes = min(processes, len(urls))
+        logger.info(f"Scraping {len(urls)} searches in {processes} processes")
+        try:
+            scraped = scrape_listings_parallel(
+                urls, store, data_dir, processes, backend, frontier.key,
+                max_listings=max_listings, process_immediately=process_immediately, backfill=backfill,
+                spending_run_id=spending.run_id if spending is not None else None
+            )
+            logger.info(f"Successfully scraped {scraped} listings across all pages")
+            frontier.finish(urls)
+        except Exception as e:
+            # The journal stays unfinished, so the next run resumes; the caller sees the failure
+            logger.error(f"Error in scraping process: {str(e)}")
+            raise
+        finally:
+            frontier.close()
+        return
+    
+    owns_backend = fetch_backend is None
+    if owns_backend:
+        fetch_backend = create_backend(data_dir, backend)
+    pipeline = None
     
     try:
-        # Handle login with cookie persistence
-        manual_login(driver, cookies_path)
-        
-        all_scraped_listings = []
+        pipeline = start_pipeline(store, process_immediately, spending)
+        all_scraped_listings = retry_pending_details(fetch_backend, store, frontier, pipeline)
         
         for base_url in urls:
             # Process multiple pages for each base URL
-            for page in range(1, PAGES_TO_SCRAPE + 1):
-                if page == 1:
-                    # First page uses the original URL
-                    current_url = base_url
-                else:
-                    # For subsequent pages, insert the page number into the URL
-                    # Check if the URL already contains a page parameter
-                    if "/seite:" in base_url:
-                        # Replace existing page parameter
-                        current_url = re.sub(r'/seite:\d+/', f'/seite:{page}/', base_url)
-                    else:
-                        # Find the position to insert the page parameter
-                        # Typically after the search path but before any filters
-                        parts = base_url.split('/')
-                        domain_part = '/'.join(parts[:3])  # e.g., https://www.kleinanzeigen.de
-                        path_part = parts[3]  # e.g., s-notebooks
-                        
-                        # Insert the page parameter after the path part
-                        remaining_parts = '/'.join(parts[4:]) if len(parts) > 4 else ""
-                        current_url = f"{domain_part}/{path_part}/seite:{page}/{remaining_parts}"
-                
-                logger.info(f"Scraping page {page} of {PAGES_TO_SCRAPE}: {current_url}")
-                
-                # Scrape the current page
-                scraped_listings = scrape_page(
-                    driver, 
-                    current_url, 
-                    output_file=output_file, 
-                    max_listings=max_listings,
-                    process_immediately=process_immediately
-                )
-                all_scraped_listings.extend(scraped_listings)
-                
-                # Add a delay between pages to avoid being flagged as a bot
-                if page < PAGES_TO_SCRAPE:
-                    time.sleep(DELAY_BETWEEN_PAGES)
+            all_scraped_listings.extend(crawl_search(
+                fetch_backend,
+                base_url,
+                store,
+                max_listings=max_listings,
+                pipeline=pipeline,
+                backfill=backfill,
+                frontier=frontier
+            ))
         
         logger.info(f"Successfully scraped {len(all_scraped_listings)} listings across all pages")
+        frontier.finish(urls)
         
     except Exception as e:
+        # The journal stays unfinished, so the next run resumes; the caller sees the failure
         logger.error(f"Error in scraping process: {str(e)}")
+        raise
     finally:
-        driver.quit() 
\ No newline at end of file
+        if owns_backend:
+            fetch_backend.close()
+        # Let the analysis of the last pages finish before the run ends
+        if pipeline is not None:
+            pipeline.close()
+        frontier.close()
@@ -1,29 +1,173 @@
 const express = require('express');
+const compression = require('compression');
+const crypto = require('crypto');
 const fs = require('fs');
 const path = require('path');
+const { defaultPageSize, parsePrice, queryListings, readEvents } = require('./listings_query');
 const app = express();
 const port = 3030;
+const http = require('http');
 const { spawn } = require('child_process');
 
+// Port of the long-running Python worker (worker.py, WORKER_PORT in config.py)
+const workerPort = parseInt(process.env.WORKER_PORT || '3031', 10);
+let workerProcess = null;
+
+// Gzip responses (the listings API in particular)
+app.use(compression());
+
 // Serve static files from the public directory
 app.use(express.static('public'));
 app.use(express.json());
 
+// Data directory shared with the scraper (DATA_DIR lets the tests use their own)
+const dataDir = process.env.DATA_DIR || path.join(__dirname, 'data');
+
 // Path to search URLs file
-const searchUrlsPath = path.join(__dirname, 'data', 'search_urls.json');
+const searchUrlsPath = path.join(dataDir, 'search_urls.json');
+
+// Parsed listings.json, kept until the file changes
+const listingsPath = path.join(dataDir, 'listings.json');
+let listingsCache = null;
+let watchingListings = false;
+
+// Drop the cached listings whenever the scraper replaces listings.json, relay new events
+function watchDataFiles() {
+  try {
+    fs.mkdirSync(dataDir, { recursive: true });
+    // Watch the directory: listings.json is replaced, not modified in place
+    fs.watch(dataDir, (eventType, filename) => {
+      if (!filename || filename === 'listings.json') {
+        listingsCache = null;
+      }
+      if (!filename || filename === 'events.ndjson') {
+        relayNewEvents();
+      }
+    });
+    watchingListings = true;
+  } catch (error) {
+    console.error('Error watching data directory, polling instead:', error);
+    setInterval(relayNewEvents, 1000);
+  }
+}
+
+// Listing events the scraper and processor append to data/events.ndjson, one JSON object per line
+const eventsPath = path.join(dataDir, 'events.ndjson');
+const eventClients = new Set();
+let eventsOffset = fs.existsSync(eventsPath) ? fs.statSync(eventsPath).size : 0;
 
-// API endpoint to get the listings data
+function sendEvent(res, event) {
+  res.write(`id: ${event.id}\nevent: ${event.type}\ndata: ${event.data}\n\n`);
+  // Push the event through the gzip stream right away
+  if (res.flush) res.flush();
+}
+
+function relayNewEvents() {
+  let size;
+  try {
+    size = fs.statSync(eventsPath).size;
+  } catch (error) {
+    return;
+  }
+  // The log was started over
+  if (size < eventsOffset) eventsOffset = 0;
+  
+  try {
+    const { events, next } = readEvents(eventsPath, eventsOffset, size);
+    eventsOffset = next;
+    events.forEach(event => eventClients.forEach(res => sendEvent(res, event)));
+  } catch (error) {
+    console.error('Error reading events file:', error);
+  }
+}
+
+function loadListings() {
+  const stat = fs.statSync(listingsPath);
+  const version = `${Math.round(stat.mtimeMs).toString(36)}-${stat.size.toString(36)}`;
+  if (listingsCache && (watchingListings || listingsCache.version === version)) {
+    return listingsCache;
+  }
+  
+  const listings = JSON.parse(fs.readFileSync(listingsPath, 'utf8'));
+  listings.forEach(listing => {
+    if (typeof listing.price_value !== 'number') {
+      listing.price_value = parsePrice(listing.price);
+    }
+  });
+  listingsCache = { version, listings };
+  return listingsCache;
+}
+
+// API endpoint to query the listings:
+// ?page=1&page_size=50&sort=price_asc|price_desc|full_info|newest&min_price=&max_price=
+// &ram_more=true&screen_small=true&screen_highres=true&full_info=true&include=description
 app.get('/api/listings', (req, res) => {
   try {
-    const dataPath = path.join(__dirname, 'data', 'listings.json');
-    const listings = JSON.parse(fs.readFileSync(dataPath, 'utf8'));
-    res.json(listings);
+    if (!fs.existsSync(listingsPath)) {
+      return res.json({ total: 0, matched: 0, page: 1, page_size: defaultPageSize, listings: [] });
+    }
+    const { version, listings } = loadListings();
+    
+    // Same file and same query: let the browser reuse its copy
+    const queryHash = crypto.createHash('sha1').update(req.originalUrl).digest('hex').slice(0, 16);
+    res.set('ETag', `W/"${version}-${queryHash}"`);
+    res.set('Cache-Control', 'no-cache');
+    if (req.fresh) {
+      return res.status(304).end();
+    }
+    
+    res.json(queryListings(listings, req.query));
   } catch (error) {
     console.error('Error reading listings file:', error);
     res.status(500).json({ error: 'Failed to load listings data' });
   }
 });
 
+// API endpoint streaming listing-created, listing-updated and listing-analyzed events (Server-Sent Events)
+app.get('/api/events', (req, res) => {
+  res.set({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive'
+  });
+  res.flushHeaders();
+  res.write('retry: 3000\n\n');
+  
+  // Replay what a reconnecting browser missed
+  const lastEventId = parseInt(req.get('Last-Event-ID'), 10);
+  if (!isNaN(lastEventId) && lastEventId < eventsOffset) {
+    try {
+      readEvents(eventsPath, lastEventId, eventsOffset).events.forEach(event => sendEvent(res, event));
+    } catch (error) {
+      console.error('Error replaying events:', error);
+    }
+  }
+  
+  eventClients.add(res);
+  req.on('close', () => eventClients.delete(res));
+});
+
+// API endpoint to get the metrics of the latest scraper run (?format=prometheus for the text format)
+app.get('/api/metrics', (req, res) => {
+  try {
+    const prometheus = req.query.format === 'prometheus';
+    const metricsPath = path.join(dataDir, prometheus ? 'metrics.prom' : 'metrics.json');
+    if (!fs.existsSync(metricsPath)) {
+      return res.status(404).json({ error: 'No metrics recorded yet' });
+    }
+
+    const metrics = fs.readFileSync(metricsPath, 'utf8');
+    if (prometheus) {
+      res.type('text/plain; version=0.0.4').send(metrics);
+    } else {
+      res.type('application/json').send(metrics);
+    }
+  } catch (error) {
+    console.error('Error reading metrics file:', error);
+    res.status(500).json({ error: 'Failed to load metrics' });
+  }
+});
+
 // API endpoint to get search URLs
 app.get('/api/search-urls', (req, res) => {
   try {
@@ -57,43 +201,124 @@ app.post('/api/search-urls', (req, res) => {
   }
 });
 
-// API endpoint to trigger scraping
+// Send a request to the worker and resolve with { status, body }
+function workerRequest(method, workerPath, body) {
+  return new Promise((resolve, reject) => {
+    const payload = body ? JSON.stringify(body) : null;
+    const request = http.request({
+      host: '127.0.0.1',
+      port: workerPort,
+      path: workerPath,
+      method,
+      headers: payload ? { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(payload) } : {}
+    }, (response) => {
+      let data = '';
+      response.on('data', (chunk) => { data += chunk; });
+      response.on('end', () => {
+        try {
+          resolve({ status: response.statusCode, body: JSON.parse(data) });
+        } catch (error) {
+          reject(error);
+        }
+      });
+    });
+    request.on('error', reject);
+    request.setTimeout(5000, () => request.destroy(new Error('Worker request timed out')));
+    if (payload) request.write(payload);
+    request.end();
+  });
+}
+
+// Start worker.py unless it is already running (it keeps the browser warm between runs)
+function ensureWorker() {
+  return workerRequest('GET', '/health').catch(() => {
+    if (!workerProcess) {
+      console.log('Starting scraper worker...');
+      workerProcess = spawn('python3', ['worker.py', '--port', String(workerPort)]);
+      
+      workerProcess.stdout.on('data', (data) => {
+        console.log(`Worker stdout: ${data}`);
+      });
+      
+      workerProcess.stderr.on('data', (data) => {
+        console.error(`Worker stderr: ${data}`);
+      });
+      
+      workerProcess.on('close', (code) => {
+        console.log(`Worker process exited with code ${code}`);
+        workerProcess = null;
+      });
+    }
+    
+    // Wait until the worker accepts requests
+    return new Promise((resolve, reject) => {
+      let attempts = 0;
+      const poll = setInterval(() => {
+        workerRequest('GET', '/health').then((result) => {
+          clearInterval(poll);
+          resolve(result);
+        }).catch(() => {
+          attempts += 1;
+          if (attempts >= 60) {
+            clearInterval(poll);
+            reject(new Error('Worker did not start'));
+          }
+        });
+      }, 500);
+    });
+  });
+}
+
+// Queue a job on the worker; identical queued or running jobs are deduplicated
+function submitJob(job) {
+  return ensureWorker().then(() => workerRequest('POST', '/jobs', job));
+}
+
+// API endpoint to trigger scraping (returns as soon as the job is queued)
 app.post('/api/scrape', (req, res) => {
   try {
-    const { interval } = req.body;
+    const { interval, mode, urls, maxListings, backfill } = req.body;
     
     // Update the cron schedule if provided
     if (interval) {
-      const configPath = path.join(__dirname, 'data', 'schedule_config.json');
+      const configPath = path.join(dataDir, 'schedule_config.json');
       fs.writeFileSync(configPath, JSON.stringify({ interval }, null, 2));
     }
     
-    // Run the scraper script
-    const python = spawn('python3', ['main.py']);
-    
-    python.stdout.on('data', (data) => {
-      console.log(`Python stdout: ${data}`);
-    });
-    
-    python.stderr.on('data', (data) => {
-      console.error(`Python stderr: ${data}`);
-    });
-    
-    python.on('close', (code) => {
-      console.log(`Python process exited with code ${code}`);
-      res.json({ success: true, message: 'Scraping completed' });
-    });
-    
+    submitJob({ mode: mode || 'both', urls, max_listings: maxListings, backfill })
+      .then(({ status, body }) => {
+        if (status >= 400) {
+          return res.status(status).json(body);
+        }
+        res.status(202).json({ success: true, message: 'Scraping queued', job: body });
+      })
+      .catch((error) => {
+        console.error('Error queueing scrape job:', error);
+        res.status(503).json({ error: 'Scraper worker unavailable' });
+      });
   } catch (error) {
     console.error('Error triggering scrape:', error);
     res.status(500).json({ error: 'Failed to trigger scraping' });
   }
 });
 
+// API endpoints to get the status of scrape jobs
+app.get('/api/jobs', (req, res) => {
+  workerRequest('GET', '/jobs')
+    .then(({ status, body }) => res.status(status).json(body))
+    .catch(() => res.status(503).json({ error: 'Scraper worker unavailable' }));
+});
+
+app.get('/api/jobs/:id', (req, res) => {
+  workerRequest('GET', `/jobs/${encodeURIComponent(req.params.id)}`)
+    .then(({ status, body }) => res.status(status).json(body))
+    .catch(() => res.status(503).json({ error: 'Scraper worker unavailable' }));
+});
+
 // API endpoint to get current schedule
 app.get('/api/schedule', (req, res) => {
   try {
-    const configPath = path.join(__dirname, 'data', 'schedule_config.json');
+    const configPath = path.join(dataDir, 'schedule_config.json');
     if (!fs.existsSync(configPath)) {
       fs.writeFileSync(configPath, JSON.stringify({ interval: 60 }, null, 2));
     }
@@ -114,7 +339,7 @@ app.get('/', (req, res) => {
 // Set up scheduled scraping
 function setupScheduledScraping() {
   try {
-    const configPath = path.join(__dirname, 'data', 'schedule_config.json');
+    const configPath = path.join(dataDir, 'schedule_config.json');
     if (!fs.existsSync(configPath)) {
       fs.writeFileSync(configPath, JSON.stringify({ interval: 60 }, null, 2));
     }
@@ -138,23 +363,32 @@ function setupScheduledScraping() {
 
 function runScraper() {
   console.log('Running scheduled scraping...');
-  const python = spawn('python3', ['main.py']);
-  
-  python.stdout.on('data', (data) => {
-    console.log(`Python stdout: ${data}`);
-  });
+  submitJob({ mode: 'both' })
+    .then(({ body }) => {
+      console.log(`Scheduled scrape job ${body.id} ${body.deduplicated ? 'already queued' : 'queued'}`);
+    })
+    .catch((error) => {
+      console.error('Error queueing scheduled scrape:', error);
+    });
+}
+
+// Start the server and set up scheduled scraping (the tests require the app without starting it)
+if (require.main === module) {
+  watchDataFiles();
   
-  python.stderr.on('data', (data) => {
-    console.error(`Python stderr: ${data}`);
-  });
+  // Keep idle event streams open through proxies
+  setInterval(() => {
+    eventClients.forEach(res => {
+      res.write(': keep-alive\n\n');
+      if (res.flush) res.flush();
+    });
+  }, 25000);
   
-  python.on('close', (code) => {
-    console.log(`Python process exited with code ${code}`);
+  app.listen(port, () => {
+    console.log(`Listings viewer app running at http://localhost:${port}`);
+    ensureWorker().catch((error) => console.error('Error starting scraper worker:', error));
+    setupScheduledScraping();
   });
 }
 
-// Start the server and set up scheduled scraping
-app.listen(port, () => {
-  console.log(`Listings viewer app running at http://localhost:${port}`);
-  setupScheduledScraping();
-});
\ No newline at end of file
+module.exports = app;
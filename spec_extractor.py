@@ -0,0 +1,110 @@
+import re
+import datetime
+
+# Plausible laptop RAM sizes in GB, anything else is most likely storage or VRAM
+RAM_SIZES = {4, 6, 8, 12, 16, 18, 20, 24, 32, 36, 40, 48, 64, 96, 128}
+
+# "32GB RAM", "16 GB DDR5", "8gb lpddr4x", "32GB Arbeitsspeicher"
+RAM_SIZE_FIRST = re.compile(
+    r'(?<![\d.,])(\d{1,3})\s*gb\s*(?:(?:lp)?ddr\d\w*|ram\b|arbeitsspeicher|memory\b)',
+    re.IGNORECASE
+)
+# "RAM: 32 GB", "Arbeitsspeicher 16GB", "Memory - 64 GB"
+RAM_LABEL_FIRST = re.compile(
+    r'\b(?:ram|arbeitsspeicher|memory)\b\s*[:=\-]?\s*(\d{1,3})\s*gb',
+    re.IGNORECASE
+)
+# Upgrade hints like "erweiterbar bis 64GB" describe a maximum, not the installed RAM
+RAM_UPGRADE_HINT = re.compile(
+    r'(?:bis\s+(?:zu\s+)?|up\s+to|max(?:\.|imal)?|erweiterbar|aufrüstbar|upgrad(?:e)?able)\W*(?:\w+\W+)?$',
+    re.IGNORECASE
+)
+
+# '14"', '15,6 Zoll', '13.3-inch', '16″', "14''"
+SCREEN_SIZE = re.compile(
+    r'(?<![\d.,])(1\d(?:[.,]\d{1,2})?)\s*(?:-\s*)?(?:"|\'\'|″|”|“|zoll\b|inch\b|in\b)',
+    re.IGNORECASE
+)
+
+# '2560x1600', '1920 x 1080', '3840×2400'
+RESOLUTION = re.compile(r'(?<!\d)(\d{3,4})\s*[x×*]\s*(\d{3,4})(?!\d)')
+
+# Resolution names that are clearly above Full HD
+HIGHRES_ALIASES = re.compile(
+    r'\b(?:w?qhd\+?|wqxga|wquxga|uhd|4k|3k|2[.,][58]k|3[.,][25]k|1440p|1600p|1800p|2160p|retina)(?![\w+])',
+    re.IGNORECASE
+)
+# Resolution names that are Full HD or lower; "FHD+" is 1920x1200 and left to the LLM
+LOWRES_ALIASES = re.compile(
+    r'\b(?:fhd|full[\s-]?hd|1080p|hd[\s-]?ready)(?!\s*\+)\b',
+    re.IGNORECASE
+)
+
+FULL_HD_PIXELS = 1920 * 1080
+QHD_PIXELS = 2560 * 1440
+
+def _decide(values, threshold_test):
+    """True/False when all found values agree on the threshold, None when absent or conflicting"""
+    outcomes = {threshold_test(value) for value in values}
+    return outcomes.pop() if len(outcomes) == 1 else None
+
+def extract_ram(text):
+    """Return True if RAM is >= 32GB, False if smaller, None if unknown or ambiguous"""
+    sizes = []
+    for pattern in (RAM_SIZE_FIRST, RAM_LABEL_FIRST):
+        for match in pattern.finditer(text):
+            if RAM_UPGRADE_HINT.search(text[max(0, match.start() - 30):match.start()]):
+                continue
+            size = int(match.group(1))
+            if size in RAM_SIZES:
+                sizes.append(size)
+    return _decide(sizes, lambda size: size >= 32)
+
+def extract_screen_small(text):
+    """Return True if the screen is <= 14 inches, False if larger, None if unknown or ambiguous"""
+    sizes = []
+    for match in SCREEN_SIZE.finditer(text):
+        size = float(match.group(1).replace(',', '.'))
+        if 10 <= size <= 18.5:
+            sizes.append(size)
+    return _decide(sizes, lambda size: size <= 14)
+
+def extract_screen_highres(text):
+    """Return True if the resolution is above Full HD, False if Full HD or lower, None if unknown"""
+    outcomes = []
+    for match in RESOLUTION.finditer(text):
+        width, height = sorted((int(match.group(1)), int(match.group(2))), reverse=True)
+        if not (1000 <= width <= 7680 and 600 <= height <= 4320):
+            continue
+        pixels = width * height
+        # Between FHD and QHD (e.g. 1920x1200) is too close to call
+        if pixels >= QHD_PIXELS:
+            outcomes.append(True)
+        elif pixels <= FULL_HD_PIXELS:
+            outcomes.append(False)
+    outcomes.extend(True for _ in HIGHRES_ALIASES.finditer(text))
+    outcomes.extend(False for _ in LOWRES_ALIASES.finditer(text))
+    return _decide(outcomes, lambda outcome: outcome)
+
+def extract_specs(title, description):
+    """Read RAM, screen size and resolution flags straight from the listing text"""
+    text = f"{title}\n{description or ''}"
+    return {
+        "RAM_more": extract_ram(text),
+        "screen_small": extract_screen_small(text),
+        "screen_highres": extract_screen_highres(text),
+    }
+
+def rule_based_result(specs):
+    """Listing fields for specs the rules fully settled, or None if the LLM is still needed"""
+    if any(value is None for value in specs.values()):
+        return None
+    return {
+        "llm_processed": True,
+        "llm_processed_time": datetime.datetime.now().isoformat(),
+        "full_info_obtained": True,
+        "RAM_more": specs["RAM_more"],
+        "screen_small": specs["screen_small"],
+        "screen_highres": specs["screen_highres"],
+        "analysis_source": "rules"
+    }
@@ -0,0 +1,484 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+import metrics
+from archive import ListingArchive, ARCHIVE_DIRNAME
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DB_FILENAME = "listings.db"
+JSON_FILENAME = "listings.json"
+
+class ListingStore:
+    """SQLite-backed listing store shared by the scraper and the LLM processor.
+
+    Each listing is kept as one row holding the full listing dict as JSON, with
+    the fields we query on (id, llm_processed, scraped_time) mirrored into
+    indexed columns. Writes are per-row upserts, so saving a listing no longer
+    costs a rewrite of the whole archive. Listings that dropped out of the
+    searches move to an attached ListingArchive (the cold tier) and come back
+    when they show up in search results again.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # One connection shared between threads, serialized by our own lock
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Cold tier, attached by open_store
+        self.archive = None
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create tables and indexes if they don't exist yet"""
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS listings (
+                    id TEXT PRIMARY KEY,
+                    scraped_time TEXT,
+                    llm_processed INTEGER NOT NULL DEFAULT 0,
+                    snippet_hash TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            # Stores created before change detection lack the snippet_hash column
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(listings)")}
+            if "snippet_hash" not in columns:
+                self.conn.execute("ALTER TABLE listings ADD COLUMN snippet_hash TEXT")
+            # When the listing last showed up in search results
+            if "last_seen" not in columns:
+                self.conn.execute("ALTER TABLE listings ADD COLUMN last_seen TEXT")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_listings_llm_processed ON listings (llm_processed)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_listings_scraped_time ON listings (scraped_time)"
+            )
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            # Listings a scrape run's worker processes have taken on, so each is fetched once
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS listing_claims (
+                    id TEXT NOT NULL,
+                    run_id TEXT NOT NULL,
+                    claimed_time TEXT,
+                    PRIMARY KEY (id, run_id)
+                )
+            """)
+            # MinHash signatures and LSH band hashes for repost detection (dedup.py)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS repost_signatures (
+                    id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS repost_bands (
+                    band_hash INTEGER NOT NULL,
+                    id TEXT NOT NULL
+                )
+            """)
+            # Covering index: a band lookup never has to read the table itself
+            self.conn.execute("DROP INDEX IF EXISTS idx_repost_bands_hash")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_repost_bands_hash_id ON repost_bands (band_hash, id)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_repost_bands_id ON repost_bands (id)"
+            )
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_watermarks (
+                    search_url TEXT PRIMARY KEY,
+                    newest_id TEXT,
+                    updated_time TEXT,
+                    pages_scraped INTEGER,
+                    new_listings INTEGER
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_usage (
+                    day TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    reserved_tokens INTEGER NOT NULL DEFAULT 0,
+                    reserved_cost REAL NOT NULL DEFAULT 0
+                )
+            """)
+            # Stores created before reservations were kept here lack their columns
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(llm_usage)")}
+            if "reserved_tokens" not in columns:
+                self.conn.execute("ALTER TABLE llm_usage ADD COLUMN reserved_tokens INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute("ALTER TABLE llm_usage ADD COLUMN reserved_cost REAL NOT NULL DEFAULT 0")
+            # The same per run, so the processes of one run share its budget
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_run_usage (
+                    run_id TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    reserved_tokens INTEGER NOT NULL DEFAULT 0,
+                    reserved_cost REAL NOT NULL DEFAULT 0,
+                    deferred INTEGER NOT NULL DEFAULT 0,
+                    started_time TEXT
+                )
+            """)
+
+    @staticmethod
+    def _row_values(listing):
+        """Map a listing dict to the column values of its row"""
+        return (
+            listing.get("id", ""),
+            listing.get("scraped_time"),
+            1 if listing.get("llm_processed", False) else 0,
+            listing.get("snippet_hash"),
+            json.dumps(listing, ensure_ascii=False),
+        )
+
+    def upsert(self, listing):
+        """Insert a listing or replace the stored version with the same ID"""
+        self.upsert_many([listing])
+
+    def upsert_many(self, listings):
+        """Insert or replace several listings in a single transaction"""
+        rows = [self._row_values(listing) for listing in listings]
+        if not rows:
+            return
+        with metrics.timer("store_write_seconds", op="upsert"), self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO listings (id, scraped_time, llm_processed, snippet_hash, data)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    scraped_time = excluded.scraped_time,
+                    llm_processed = excluded.llm_processed,
+                    snippet_hash = excluded.snippet_hash,
+                    data = excluded.data
+            """, rows)
+
+    def contains(self, listing_id):
+        """Check whether a listing with this ID is already stored, hot or archived"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM listings WHERE id = ?", (listing_id,)
+            ).fetchone()
+        return row is not None or (self.archive is not None and self.archive.contains(listing_id))
+
+    def get(self, listing_id):
+        """Return the stored listing with this ID, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM listings WHERE id = ?", (listing_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def snippet_hashes(self, listing_ids):
+        """Return {id: snippet_hash} for those of the given IDs that are stored (None for unhashed rows).
+
+        Archived listings among them are back in search results, so they move
+        back to the hot table first.
+        """
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return {}
+        placeholders = ",".join("?" * len(listing_ids))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, snippet_hash FROM listings WHERE id IN ({placeholders})", listing_ids
+            ).fetchall()
+        hashes = dict(rows)
+        
+        missing = [listing_id for listing_id in listing_ids if listing_id not in hashes]
+        if self.archive is not None and missing:
+            restored = self.archive.get_many(missing)
+            if restored:
+                # last_seen lives in its own column while a listing is hot
+                for listing in restored:
+                    listing.pop("last_seen", None)
+                self.upsert_many(restored)
+                self.archive.forget([listing["id"] for listing in restored])
+                metrics.inc("archive_restored_total", len(restored))
+                logger.info(f"Restored {len(restored)} archived listings that reappeared in search results")
+                hashes.update({listing["id"]: listing.get("snippet_hash") for listing in restored})
+        return hashes
+
+    def existing_ids(self):
+        """Return the set of all stored listing IDs"""
+        with self._lock:
+            return {row[0] for row in self.conn.execute("SELECT id FROM listings")}
+
+    def touch(self, listing_ids, seen_time):
+        """Record that these listings showed up in search results at seen_time"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE listings SET last_seen = ? WHERE id = ?", [(seen_time, listing_id) for listing_id in listing_ids]
+            )
+
+    def stale(self, cutoff, limit=None):
+        """Return up to limit listings last seen (or, if never seen, scraped) before the cutoff time"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT data, last_seen FROM listings WHERE COALESCE(last_seen, scraped_time) < ? "
+                "ORDER BY rowid LIMIT ?", (cutoff, -1 if limit is None else limit)
+            ).fetchall()
+        listings = []
+        for data, last_seen in rows:
+            listing = json.loads(data)
+            listing["last_seen"] = last_seen
+            listings.append(listing)
+        return listings
+
+    def delete_many(self, listing_ids):
+        """Remove listings from the hot table"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM listings WHERE id = ?", [(listing_id,) for listing_id in listing_ids])
+
+    def unprocessed(self):
+        """Return all listings not yet analyzed by the LLM, in insertion order"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT data FROM listings WHERE llm_processed = 0 ORDER BY rowid"
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def all(self):
+        """Return all listings in insertion order"""
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM listings ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def counts(self):
+        """Return a (total, unprocessed) tuple of listing counts"""
+        with self._lock:
+            total, unprocessed = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(llm_processed = 0), 0) FROM listings"
+            ).fetchone()
+        return total, unprocessed
+
+    def get_meta(self, key, default=None):
+        """Read a value from the meta table"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Write a value to the meta table"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def get_watermark(self, search_url):
+        """Return the crawl watermark of a search URL as a dict, or None if it was never crawled"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT newest_id, updated_time, pages_scraped, new_listings "
+                "FROM search_watermarks WHERE search_url = ?", (search_url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("newest_id", "updated_time", "pages_scraped", "new_listings"), row))
+
+    def set_watermark(self, search_url, newest_id, updated_time, pages_scraped, new_listings):
+        """Record the newest ad ID seen for a search URL and what the last crawl did"""
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO search_watermarks (search_url, newest_id, updated_time, pages_scraped, new_listings)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(search_url) DO UPDATE SET
+                    newest_id = excluded.newest_id,
+                    updated_time = excluded.updated_time,
+                    pages_scraped = excluded.pages_scraped,
+                    new_listings = excluded.new_listings
+            """, (search_url, newest_id, updated_time, pages_scraped, new_listings))
+
+    def llm_usage(self, day):
+        """Return the LLM requests, tokens and cost booked on a day (YYYY-MM-DD) as a dict"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT requests, prompt_tokens, completion_tokens, cost FROM llm_usage WHERE day = ?", (day,)
+            ).fetchone()
+        return dict(zip(("requests", "prompt_tokens", "completion_tokens", "cost"), row or (0, 0, 0, 0.0)))
+
+    def llm_run_usage(self, run_id):
+        """Return the LLM requests, tokens and cost booked by a run, and the requests it deferred, as a dict"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT requests, prompt_tokens, completion_tokens, cost, deferred FROM llm_run_usage WHERE run_id = ?",
+                (run_id,)
+            ).fetchone()
+        columns = ("requests", "prompt_tokens", "completion_tokens", "cost", "deferred")
+        return dict(zip(columns, row or (0, 0, 0, 0.0, 0)))
+
+    def start_llm_run(self, run_id):
+        """Register a run's LLM usage, dropping that of runs started over a week ago"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM llm_run_usage WHERE started_time < datetime('now', '-7 days')")
+            self.conn.execute(
+                "INSERT OR IGNORE INTO llm_run_usage (run_id, started_time) VALUES (?, datetime('now'))", (run_id,)
+            )
+
+    def reserve_llm_usage(self, day, run_id, tokens, cost, limits):
+        """Book a request's estimated tokens and cost for the day and the run; False if that exceeds a limit.
+
+        limits holds daily_tokens, daily_cost, run_tokens and run_cost (0: no
+        limit). Settled usage and the reservations of requests in flight both
+        count. The checks and bookings run in one write transaction, so
+        processes sharing the store can't overshoot a limit together. A
+        request that doesn't fit is counted as deferred for the run.
+        """
+        values = {"day": day, "run_id": run_id, "tokens": tokens, "cost": cost, **limits}
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO llm_usage (day) VALUES (?)", (day,))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO llm_run_usage (run_id, started_time) VALUES (?, datetime('now'))", (run_id,)
+            )
+            booked = self.conn.execute("""
+                UPDATE llm_usage
+                SET reserved_tokens = reserved_tokens + :tokens, reserved_cost = reserved_cost + :cost
+                WHERE day = :day
+                    AND (:daily_tokens = 0
+                         OR prompt_tokens + completion_tokens + reserved_tokens + :tokens <= :daily_tokens)
+                    AND (:daily_cost = 0 OR cost + reserved_cost + :cost <= :daily_cost)
+            """, values).rowcount and self.conn.execute("""
+                UPDATE llm_run_usage
+                SET reserved_tokens = reserved_tokens + :tokens, reserved_cost = reserved_cost + :cost
+                WHERE run_id = :run_id
+                    AND (:run_tokens = 0
+                         OR prompt_tokens + completion_tokens + reserved_tokens + :tokens <= :run_tokens)
+                    AND (:run_cost = 0 OR cost + reserved_cost + :cost <= :run_cost)
+            """, values).rowcount
+            if not booked:
+                self.conn.rollback()
+                self.conn.execute("UPDATE llm_run_usage SET deferred = deferred + 1 WHERE run_id = ?", (run_id,))
+        return bool(booked)
+
+    def settle_llm_usage(self, day, run_id, reserved_tokens, reserved_cost, prompt_tokens, completion_tokens, cost):
+        """Replace a reservation with the usage the API reported (none for a failed request)"""
+        values = (1 if prompt_tokens or completion_tokens else 0, prompt_tokens, completion_tokens, cost,
+                  reserved_tokens, reserved_cost)
+        with self._lock, self.conn:
+            for table, key_column, key in (("llm_usage", "day", day), ("llm_run_usage", "run_id", run_id)):
+                self.conn.execute(f"""
+                    UPDATE {table} SET
+                        requests = requests + ?,
+                        prompt_tokens = prompt_tokens + ?,
+                        completion_tokens = completion_tokens + ?,
+                        cost = cost + ?,
+                        reserved_tokens = MAX(0, reserved_tokens - ?),
+                        reserved_cost = MAX(0, reserved_cost - ?)
+                    WHERE {key_column} = ?
+                """, values + (key,))
+
+    def claim(self, listing_ids, run_id):
+        """Claim listings for a scrape run; return the IDs no other process of the run claimed first"""
+        claimed = set()
+        with self._lock, self.conn:
+            for listing_id in listing_ids:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO listing_claims (id, run_id, claimed_time) VALUES (?, ?, datetime('now'))",
+                    (listing_id, run_id)
+                )
+                if cursor.rowcount:
+                    claimed.add(listing_id)
+        return claimed
+
+    def release_claims(self, run_id):
+        """Drop the claims of a finished run, and any a crashed run left behind"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM listing_claims WHERE run_id = ? OR claimed_time < datetime('now', '-1 day')", (run_id,)
+            )
+
+    def add_repost_signatures(self, entries):
+        """Store (id, signature, band_hashes) entries, replacing earlier ones of the same listings"""
+        with self._lock, self.conn:
+            for listing_id, signature, band_hashes in entries:
+                self.conn.execute("DELETE FROM repost_bands WHERE id = ?", (listing_id,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO repost_signatures (id, signature) VALUES (?, ?)", (listing_id, signature)
+                )
+                self.conn.executemany(
+                    "INSERT INTO repost_bands (band_hash, id) VALUES (?, ?)",
+                    [(band_hash, listing_id) for band_hash in band_hashes]
+                )
+
+    def repost_candidates(self, band_hashes):
+        """Return {id: signature} of listings sharing at least one LSH band hash"""
+        band_hashes = list(band_hashes)
+        if not band_hashes:
+            return {}
+        placeholders = ",".join("?" * len(band_hashes))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, signature FROM repost_signatures WHERE id IN "
+                f"(SELECT id FROM repost_bands WHERE band_hash IN ({placeholders}))", band_hashes
+            ).fetchall()
+        return dict(rows)
+
+    def without_repost_signature(self, limit):
+        """Return up to limit stored listings that have no repost signature yet"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT data FROM listings WHERE id NOT IN (SELECT id FROM repost_signatures) "
+                "ORDER BY rowid LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def import_json(self, json_path):
+        """One-time import of a legacy listings.json file into the store"""
+        if self.get_meta("json_imported"):
+            return 0
+
+        imported = 0
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    listings = json.load(f)
+                self.upsert_many(listings)
+                imported = len(listings)
+                logger.info(f"Imported {imported} listings from {json_path}")
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"Error importing listings from {json_path}: {str(e)}")
+                return 0
+
+        self.set_meta("json_imported", json_path)
+        return imported
+
+    def export_json(self, json_path):
+        """Export all listings to a JSON file for the web UI"""
+        with metrics.timer("store_write_seconds", op="export_json"):
+            listings = self.all()
+            # Write to a temporary file first so readers never see a half-written file
+            tmp_path = json_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(listings, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, json_path)
+        logger.info(f"Exported {len(listings)} listings to {json_path}")
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self.conn.close()
+        if self.archive is not None:
+            self.archive.close()
+
+def open_store(data_dir):
+    """Open the listing store in data_dir, importing a legacy listings.json once"""
+    os.makedirs(data_dir, exist_ok=True)
+    store = ListingStore(os.path.join(data_dir, DB_FILENAME))
+    store.archive = ListingArchive(os.path.join(data_dir, ARCHIVE_DIRNAME))
+    store.import_json(os.path.join(data_dir, JSON_FILENAME))
+    return store
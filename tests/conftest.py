@@ -0,0 +1,12 @@
+import os
+import sys
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Without a local config.py, run against the template's settings (as install.sh would create it)
+try:
+    importlib.import_module("config")
+except ImportError:
+    sys.modules["config"] = importlib.import_module("config_template")
@@ -0,0 +1,82 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { comparePrices, parsePrice, queryListings, readEvents } = require('../listings_query');
+
+function listing(id, priceValue, fields = {}) {
+  return { id, price_value: priceValue, detailed_description: `Beschreibung ${id}`, ...fields };
+}
+
+const listings = Array.from({ length: 12 }, (_, index) => listing(String(index + 1), (index + 1) * 100));
+
+test('pages are cut from the matched listings', () => {
+  const result = queryListings(listings, { page: '3', page_size: '5' });
+  assert.deepStrictEqual(result.listings.map(item => item.id), ['11', '12']);
+  assert.strictEqual(result.total, 12);
+  assert.strictEqual(result.matched, 12);
+  assert.strictEqual(result.page, 3);
+  // Past the last page is empty, not the last page again
+  assert.deepStrictEqual(queryListings(listings, { page: '4', page_size: '5' }).listings, []);
+});
+
+test('invalid page and page size fall back to their bounds', () => {
+  assert.strictEqual(queryListings(listings, { page: '0', page_size: 'abc' }).page, 1);
+  assert.strictEqual(queryListings(listings, { page_size: 'abc' }).page_size, 50);
+  assert.strictEqual(queryListings(listings, { page_size: '-3' }).page_size, 1);
+  assert.strictEqual(queryListings(listings, { page_size: '100000' }).page_size, 500);
+});
+
+test('filters count towards matched, not total', () => {
+  const tagged = listings.concat([listing('13', null, { RAM_more: true }), listing('14', 450, { RAM_more: true })]);
+  const result = queryListings(tagged, { min_price: '300', max_price: '600', ram_more: 'true' });
+  // Listings without a price never pass a price bound
+  assert.deepStrictEqual(result.listings.map(item => item.id), ['14']);
+  assert.strictEqual(result.total, 14);
+  assert.strictEqual(result.matched, 1);
+  assert.strictEqual(queryListings(listings, { min_price: '', max_price: '300' }).matched, 3);
+});
+
+test('descriptions are only sent when asked for', () => {
+  assert.ok(!('detailed_description' in queryListings(listings, {}).listings[0]));
+  assert.strictEqual(queryListings(listings, { include: 'description' }).listings[0].detailed_description,
+    'Beschreibung 1');
+});
+
+test('listings without a price sort last in both directions', () => {
+  const mixed = [listing('a', null), listing('b', 300), listing('c', null), listing('d', 100)];
+  const ids = sort => queryListings(mixed, { sort }).listings.map(item => item.id);
+  assert.deepStrictEqual(ids('price_asc'), ['d', 'b', 'a', 'c']);
+  assert.deepStrictEqual(ids('price_desc'), ['b', 'd', 'a', 'c']);
+  assert.strictEqual(comparePrices(listing('a', null), listing('c', null), 1), 0);
+});
+
+test('prices are parsed from the German format', () => {
+  assert.strictEqual(parsePrice('1.200 € VB'), 1200);
+  assert.strictEqual(parsePrice('99,50 €'), 99.5);
+  assert.strictEqual(parsePrice('Zu verschenken'), null);
+});
+
+test('a partly written last event is left for the next read', (t) => {
+  const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'listings-events-'));
+  t.after(() => fs.rmSync(dir, { recursive: true, force: true }));
+  const eventsPath = path.join(dir, 'events.ndjson');
+  const first = '{"type": "listing-created", "id": "1"}\n';
+  const second = '{"type": "listing-analyzed", "id": "1"}\n';
+  fs.writeFileSync(eventsPath, first + second.slice(0, 10));
+
+  const size = fs.statSync(eventsPath).size;
+  const { events, next } = readEvents(eventsPath, 0, size);
+  assert.deepStrictEqual(events.map(event => [event.id, event.type]), [[first.length, 'listing-created']]);
+  assert.strictEqual(next, first.length);
+
+  // Once the line is complete it is read from where the last read stopped
+  fs.appendFileSync(eventsPath, second.slice(10));
+  const rest = readEvents(eventsPath, next, fs.statSync(eventsPath).size);
+  assert.deepStrictEqual(rest.events.map(event => [event.id, event.type]),
+    [[first.length + second.length, 'listing-analyzed']]);
+  assert.strictEqual(rest.next, first.length + second.length);
+  // Nothing new to read
+  assert.deepStrictEqual(readEvents(eventsPath, rest.next, rest.next), { events: [], next: rest.next });
+});
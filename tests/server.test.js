@@ -0,0 +1,71 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const http = require('http');
+const os = require('os');
+const path = require('path');
+
+// The app reads its files from DATA_DIR and the end of the event log when it is required
+const dataDir = fs.mkdtempSync(path.join(os.tmpdir(), 'listings-viewer-'));
+const events = ['{"type": "listing-created", "id": "1"}\n', '{"type": "listing-analyzed", "id": "1"}\n'];
+fs.writeFileSync(path.join(dataDir, 'events.ndjson'), events.join(''));
+process.env.DATA_DIR = dataDir;
+const app = require('../server');
+
+function get(port, requestPath, headers = {}) {
+  return new Promise((resolve, reject) => {
+    http.get({ host: '127.0.0.1', port, path: requestPath, headers }, (response) => {
+      let body = '';
+      response.on('data', (chunk) => { body += chunk; });
+      response.on('end', () => resolve({ status: response.statusCode, headers: response.headers, body }));
+    }).on('error', reject);
+  });
+}
+
+test('an unchanged listings file and query answer 304', async (t) => {
+  fs.writeFileSync(path.join(dataDir, 'listings.json'), JSON.stringify([
+    { id: '1', price: '1.200 €' },
+    { id: '2', price_value: 800 }
+  ]));
+  const server = app.listen(0);
+  t.after(() => server.close());
+  const { port } = server.address();
+
+  const first = await get(port, '/api/listings?sort=price_asc');
+  assert.strictEqual(first.status, 200);
+  assert.deepStrictEqual(JSON.parse(first.body).listings.map(listing => listing.id), ['2', '1']);
+  const etag = first.headers.etag;
+
+  assert.strictEqual((await get(port, '/api/listings?sort=price_asc', { 'If-None-Match': etag })).status, 304);
+  // Another query has its own ETag
+  assert.strictEqual((await get(port, '/api/listings?sort=price_desc', { 'If-None-Match': etag })).status, 200);
+});
+
+test('a reconnecting browser is sent the events after its Last-Event-ID', async (t) => {
+  const server = app.listen(0);
+  t.after(() => server.close());
+  const { port } = server.address();
+
+  const body = await new Promise((resolve, reject) => {
+    const request = http.get({
+      host: '127.0.0.1',
+      port,
+      path: '/api/events',
+      headers: { 'Last-Event-ID': String(events[0].length) }
+    }, (response) => {
+      let data = '';
+      response.setEncoding('utf8');
+      response.on('data', (chunk) => {
+        data += chunk;
+        // The stream stays open, so stop once the replayed event is in
+        if (data.includes('event: listing-analyzed')) {
+          request.destroy();
+          resolve(data);
+        }
+      });
+    });
+    request.on('error', reject);
+  });
+  assert.ok(!body.includes('listing-created'));
+  assert.ok(body.includes(`id: ${events[0].length + events[1].length}\nevent: listing-analyzed\n`));
+});
@@ -0,0 +1,48 @@
+import datetime
+import archive
+from storage import open_store
+
+OLD = "2026-01-01T12:00:00"
+
+def listing(listing_id, scraped_time=OLD):
+    return {"id": listing_id, "title": f"Laptop {listing_id}", "detailed_description": "Notebook mit Netzteil",
+            "scraped_time": scraped_time, "llm_processed": False}
+
+def test_stale_listings_move_to_the_archive_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_BLOCK_SIZE", 2)
+    store = open_store(str(tmp_path))
+    store.upsert_many([listing(str(index)) for index in range(5)] + [listing("fresh")])
+    store.touch(["fresh"], datetime.datetime.now().isoformat())
+    assert store.archive.archive_stale(store, older_than_days=30) == 5
+    # The archived rows are gone from the live store, the fresh one stays
+    assert store.existing_ids() == {"fresh"}
+    assert store.archive.stats()["listings"] == 5
+    # Five listings in blocks of two: three blocks, each read back on its own
+    locations = store.archive._locations([str(index) for index in range(5)])
+    assert len(set(locations.values())) == 3
+    assert store.archive.get("3")["title"] == "Laptop 3"
+    assert store.archive.get("fresh") is None
+    found = store.archive.get_many(["0", "1", "4", "missing"])
+    assert sorted(item["id"] for item in found) == ["0", "1", "4"]
+    store.close()
+
+def test_zero_days_archives_nothing(tmp_path):
+    store = open_store(str(tmp_path))
+    store.upsert(listing("1"))
+    assert store.archive.archive_stale(store, older_than_days=0) == 0
+    assert store.existing_ids() == {"1"}
+    assert store.archive.stats()["listings"] == 0
+    store.close()
+
+def test_reappearing_listing_leaves_the_archive(tmp_path):
+    store = open_store(str(tmp_path))
+    store.upsert(listing("1"))
+    store.archive.archive_stale(store, older_than_days=30)
+    assert store.existing_ids() == set()
+    assert store.contains("1")
+    # Showing up in search results again restores it to the hot store and drops its index entry
+    assert "1" in store.snippet_hashes(["1"])
+    assert store.get("1")["title"] == "Laptop 1"
+    assert not store.archive.contains("1")
+    assert store.archive.stats()["listings"] == 0
+    store.close()
@@ -0,0 +1,73 @@
+import io
+import json
+import types
+import pytest
+import batch
+import llm_cache
+from storage import open_store
+from batch import ingest_batch_results
+
+def batch_result(listing_id, content):
+    body = {"choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10}}
+    return {"custom_id": listing_id, "response": {"status_code": 200, "body": body}, "error": None}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_cache", llm_cache.LLMCache(str(tmp_path / "cache.db")))
+    store = open_store(str(tmp_path / "data"))
+    store.upsert_many([
+        {"id": "1", "title": "Laptop A", "detailed_description": "Notebook", "llm_processed": False},
+        {"id": "2", "title": "Laptop B", "detailed_description": "Notebook", "llm_processed": True,
+         "llm_processed_time": "2026-10-02T12:00:00", "RAM_more": False, "analysis_source": "llm"},
+        {"id": "3", "title": "Laptop C", "detailed_description": "Notebook", "llm_processed": True,
+         "llm_processed_time": "2026-09-30T12:00:00", "RAM_more": False, "analysis_source": "llm"},
+    ])
+    yield store
+    store.close()
+
+def test_ingest_uses_prepared_mode_and_keeps_newer_analyses(store, tmp_path):
+    meta_path = tmp_path / "batch_meta.json"
+    meta_path.write_text(json.dumps({"prompt_mode": "compact", "prompt_version": "v-test",
+                                     "prepared_time": "2026-10-01T12:00:00"}))
+    reply = json.dumps({"RAM_more": True, "screen_small": False, "screen_highres": True})
+    results_path = tmp_path / "batch_results.jsonl"
+    results_path.write_text("".join(json.dumps(batch_result(listing_id, reply)) + "\n" for listing_id in "123"))
+
+    assert ingest_batch_results(store, str(results_path), str(meta_path)) == 2
+    # Parsed as a compact JSON reply, not with the reasoning-mode parser
+    assert store.get("1")["RAM_more"] is True
+    assert store.get("1")["full_info_obtained"] is True
+    assert store.get("3")["RAM_more"] is True
+    # Analyzed after the batch was prepared, so the batch reply is stale
+    assert store.get("2")["RAM_more"] is False
+
+def test_refused_reply_counts_as_failed(store, tmp_path):
+    meta_path = tmp_path / "batch_meta.json"
+    meta_path.write_text(json.dumps({"prompt_mode": "compact", "prompt_version": "v-test",
+                                     "prepared_time": "2026-10-01T12:00:00"}))
+    reply = json.dumps({"RAM_more": True, "screen_small": False, "screen_highres": True})
+    results_path = tmp_path / "batch_results.jsonl"
+    results_path.write_text(json.dumps(batch_result("1", None)) + "\n" + json.dumps(batch_result("3", reply)) + "\n")
+
+    # The refusal doesn't abort the ingest of the other results
+    assert ingest_batch_results(store, str(results_path), str(meta_path)) == 1
+    assert store.get("1")["llm_processed"] is False
+    assert store.get("3")["RAM_more"] is True
+
+def test_download_of_a_batch_whose_requests_all_failed(tmp_path, monkeypatch):
+    error_line = json.dumps({"custom_id": "1", "response": {"status_code": 400, "body": {}}, "error": None})
+    files = {"file-errors": error_line.encode()}
+
+    class FakeClient:
+        batches = types.SimpleNamespace(retrieve=lambda batch_id: types.SimpleNamespace(
+            id=batch_id, status="completed", output_file_id=None, error_file_id="file-errors"))
+        files = types.SimpleNamespace(content=lambda file_id: io.BytesIO(files[file_id]))
+
+    monkeypatch.setattr(batch, "client", FakeClient())
+    state_path = tmp_path / "batch_state.json"
+    state_path.write_text(json.dumps({"batch_id": "batch_1"}))
+    results_path = tmp_path / "batch_results.jsonl"
+
+    assert batch.download_batch_results(str(state_path), str(results_path))
+    assert results_path.read_text() == error_line + "\n"
@@ -0,0 +1,100 @@
+import urllib.error
+import coordinator
+from coordinator import Coordinator, SQLiteTaskQueue, detail_task, page_task, run_tasks
+from storage import open_store
+
+SEARCH_URL = "http://127.0.0.1:1/s-notebooks/k0"
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.error = error
+        self.posts = []
+
+    def post(self, path, **body):
+        self.posts.append((path, body))
+        if self.error is not None:
+            raise self.error
+        return {}
+
+class FakeKeeper:
+    def __init__(self):
+        self.done_ids = []
+
+    def done(self, task_id):
+        self.done_ids.append(task_id)
+
+class DetailBackend:
+    def __init__(self, descriptions):
+        self.descriptions = descriptions
+
+    def fetch_details(self, urls):
+        return {url: self.descriptions.get(url) for url in urls}
+
+def test_expired_lease_goes_to_another_worker(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "coordinator.db"))
+    queue.add([page_task(SEARCH_URL, 1)])
+    [task] = queue.lease("w1", lease_seconds=-1)
+    assert queue.expire() == []
+    [again] = queue.lease("w2")
+    assert again["id"] == task["id"] and again["attempts"] == 2
+    # The first worker lost the task and can't complete it any more
+    assert queue.complete("w1", task["id"]) is None
+    assert queue.complete("w2", task["id"])["id"] == task["id"]
+    assert queue.counts() == {"done": 1}
+    queue.close()
+
+def test_heartbeat_keeps_only_held_leases(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "coordinator.db"))
+    queue.add([page_task(SEARCH_URL, 1), page_task(SEARCH_URL, 2)])
+    first, second = queue.lease("w1", limit=2)
+    queue.complete("w1", second["id"])
+    assert queue.heartbeat("w1", [first["id"], second["id"]]) == [first["id"]]
+    assert queue.heartbeat("w2", [first["id"]]) == []
+    queue.close()
+
+def test_task_is_given_up_after_its_attempts(tmp_path):
+    queue = SQLiteTaskQueue(str(tmp_path / "coordinator.db"), max_attempts=2)
+    queue.add([page_task(SEARCH_URL, 1)])
+    [task] = queue.lease("w1")
+    assert queue.fail("w1", task["id"], "timeout") is None
+    queue.lease("w1")
+    assert queue.fail("w1", task["id"], "timeout")["id"] == task["id"]
+    assert queue.counts() == {"failed": 1}
+    queue.close()
+
+def test_result_that_cannot_be_taken_does_not_stall_the_crawl(tmp_path, monkeypatch):
+    def broken_plan(*args, **kwargs):
+        raise RuntimeError("store is locked")
+
+    monkeypatch.setattr(coordinator, "page_limit", lambda *args: 1)
+    monkeypatch.setattr(coordinator, "plan_results", broken_plan)
+    store = open_store(str(tmp_path))
+    queue = SQLiteTaskQueue(str(tmp_path / "coordinator.db"))
+    crawl = Coordinator(store, queue, [SEARCH_URL])
+    crawl.start()
+    [task] = crawl.lease("w1")
+    results = [{"id": "123", "title": "ThinkPad", "url": "http://127.0.0.1:1/s-anzeige/123"}]
+    assert crawl.complete("w1", task["id"], {"results": results})
+    # The page is given up like one that failed to load, which ends its search
+    assert crawl.finished.is_set()
+    assert crawl.status()["searches"][SEARCH_URL]["done"]
+    queue.close()
+    store.close()
+
+def test_worker_completes_empty_descriptions_and_fails_missing_ones():
+    tasks = [detail_task("page:1", "http://127.0.0.1:1/a"), detail_task("page:1", "http://127.0.0.1:1/b")]
+    client = FakeClient()
+    keeper = FakeKeeper()
+    run_tasks(DetailBackend({"http://127.0.0.1:1/a": ""}), client, "w1", tasks, keeper)
+    assert [path for path, _ in client.posts] == ["/complete", "/fail"]
+    assert client.posts[0][1]["result"] == {"description": ""}
+    assert keeper.done_ids == [task["id"] for task in tasks]
+
+def test_worker_leaves_unreported_tasks_to_expire():
+    tasks = [detail_task("page:1", "http://127.0.0.1:1/a")]
+    error = urllib.error.HTTPError("http://127.0.0.1:1/complete", 500, "Internal Server Error", {}, None)
+    client = FakeClient(error)
+    keeper = FakeKeeper()
+    run_tasks(DetailBackend({"http://127.0.0.1:1/a": "Akku neu"}), client, "w1", tasks, keeper)
+    assert client.posts[0][0] == "/complete"
+    assert keeper.done_ids == [tasks[0]["id"]]
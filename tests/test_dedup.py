@@ -0,0 +1,48 @@
+import operator
+import random
+import pytest
+from storage import ListingStore
+from dedup import RepostIndex, minhash, pack, similarity, NUM_HASHES
+
+LISTING = {
+    "id": "100",
+    "title": "Lenovo ThinkPad X1 Carbon Gen 9 i7 32GB",
+    "short_description": "Top Zustand, Akku sehr gut, mit Ladegerät und OVP",
+    "location": "10115 Mitte (3 km)",
+}
+
+@pytest.fixture
+def index(tmp_path):
+    store = ListingStore(str(tmp_path / "listings.db"))
+    store.upsert_many([LISTING])
+    index = RepostIndex(store)
+    index.add([LISTING])
+    yield index
+    store.close()
+
+def test_similarity_counts_equal_hash_values():
+    rng = random.Random(3)
+    signature = [rng.getrandbits(32) for _ in range(NUM_HASHES)]
+    for changed in (0, 1, 20, 64):
+        other = list(signature)
+        for position in rng.sample(range(NUM_HASHES), changed):
+            other[position] ^= 1 << rng.randrange(32)
+        expected = sum(map(operator.eq, signature, other)) / NUM_HASHES
+        assert similarity(pack(signature), pack(other)) == expected == (NUM_HASHES - changed) / NUM_HASHES
+
+def test_identical_text_has_the_same_signature():
+    assert similarity(pack(minhash(LISTING)), pack(minhash(dict(LISTING, id="101")))) == 1.0
+
+def test_repost_with_edited_title_is_found(index):
+    repost = dict(LISTING, id="200", title=LISTING["title"] + " VB", location="10115 Mitte (12 km)")
+    assert index.find(repost)["id"] == "100"
+
+def test_unrelated_listing_is_not_a_repost(index):
+    other = dict(LISTING, id="300", title="Dell XPS 15 9520 RTX 3050", short_description="Kaum benutzt, Rechnung da")
+    assert index.find(other) is None
+
+def test_same_text_from_another_place_is_not_a_repost(index):
+    assert index.find(dict(LISTING, id="400", location="80331 München (5 km)")) is None
+
+def test_listing_is_not_a_repost_of_itself(index):
+    assert index.find(LISTING) is None
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import pytest
+import scraper
+from frontier import Frontier, FRONTIER_FILENAME
+from storage import open_store
+from parsers import parse_search_results
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+SEARCH_URL = "https://www.kleinanzeigen.de/s-notebooks/c278"
+
+with open(os.path.join(FIXTURES, "search_results.html"), encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+LISTINGS = [result for result in parse_search_results(SEARCH_PAGE) if result["id"] and not result["promoted"]]
+
+def test_progress_is_kept_per_run(tmp_path):
+    frontier = Frontier(str(tmp_path))
+    assert frontier.begin(["a", "b"]) is False
+    frontier.page_done("a", 3)
+    # A run over other searches neither sees nor discards the first run's progress
+    other = Frontier(str(tmp_path))
+    assert other.begin(["c"]) is False
+    assert other.next_page("a") == 1
+    other.page_done("c", 1, search_done=True)
+    assert other.finish(["c"]) is True
+
+    resumed = Frontier(str(tmp_path))
+    assert resumed.begin(["a", "b"]) is True
+    assert resumed.next_page("a") == 4
+    assert resumed.next_page("b") == 1
+    assert [run["urls"] for run in resumed.unfinished_runs()] == [["a", "b"]]
+    for frontier in (frontier, other, resumed):
+        frontier.close()
+
+def test_other_options_are_another_run(tmp_path):
+    frontier = Frontier(str(tmp_path))
+    frontier.begin(["a"])
+    frontier.page_done("a", 2)
+    assert frontier.begin(["a"], backfill=True) is False
+    assert frontier.next_page("a") == 1
+    frontier.close()
+
+def test_old_single_run_journal_is_migrated(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / FRONTIER_FILENAME))
+    conn.execute("CREATE TABLE frontier_runs (key TEXT PRIMARY KEY, params TEXT NOT NULL, started_time TEXT)")
+    conn.execute("CREATE TABLE frontier_searches (search_url TEXT PRIMARY KEY, last_page INTEGER NOT NULL DEFAULT 0, "
+                 "done INTEGER NOT NULL DEFAULT 0, updated_time TEXT)")
+    conn.execute("INSERT INTO frontier_runs VALUES (?, ?, datetime('now'))",
+                 ('[["a"], false, null]', '{"urls": ["a"], "backfill": false, "max_listings": null, '
+                                          '"process_immediately": false}'))
+    conn.execute("INSERT INTO frontier_searches VALUES ('a', 2, 0, NULL)")
+    conn.commit()
+    conn.close()
+    frontier = Frontier(str(tmp_path))
+    assert frontier.begin(["a"]) is True
+    assert frontier.next_page("a") == 3
+    frontier.close()
+
+class FakeBackend:
+    """One results page per search; detail pages answer from a {url: description or None} table"""
+
+    def __init__(self, descriptions):
+        self.descriptions = descriptions
+        self.fetched = []
+
+    def fetch_search_page(self, url):
+        if "/seite:" in url:
+            return "<html><body><ul id=\"srchrslt-adtable\"></ul></body></html>"
+        return SEARCH_PAGE
+
+    def fetch_details(self, urls):
+        self.fetched.extend(urls)
+        return {url: self.descriptions.get(url, "Laptop in gutem Zustand") for url in urls}
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Fixture listings are compared by ID here, not by text
+    monkeypatch.setattr(scraper, "REPOST_DETECTION", False)
+    store = open_store(str(tmp_path))
+    yield store
+    store.close()
+
+def test_failed_detail_is_retried_once_per_run_and_empty_description_is_done(store, tmp_path):
+    failing, empty = LISTINGS[0], LISTINGS[1]
+    backend = FakeBackend({failing["url"]: None, empty["url"]: ""})
+
+    scraper.scrape_listings([SEARCH_URL], store, fetch_backend=backend, processes=1)
+    assert backend.fetched.count(failing["url"]) == 1
+    assert not store.contains(failing["id"])
+    # An empty description from a page that loaded is a result, not a failure
+    assert store.get(empty["id"])["detailed_description"] == ""
+
+    # The next run retries the pending page first and doesn't fetch it again for the search
+    scraper.scrape_listings([SEARCH_URL], store, fetch_backend=backend, processes=1)
+    assert backend.fetched.count(failing["url"]) == 2
+    assert backend.fetched.count(empty["url"]) == 1
+
+    frontier = Frontier(str(tmp_path))
+    assert [result["id"] for result in frontier.pending_details()] == [failing["id"]]
+    frontier.close()
@@ -0,0 +1,77 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from http_fetcher import HttpBackend, detect_block
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+with open(os.path.join(FIXTURES, "detail_page.html"), encoding="utf-8") as f:
+    DETAIL_PAGE = f.read()
+
+def test_missing_element_is_not_a_block():
+    assert detect_block(404, "https://example.org/s-anzeige/1", "<html>Anzeige gelöscht</html>", "viewad-description") is None
+    assert detect_block(200, "https://example.org/s-notebooks/k0", "<html></html>", "viewad-description") is None
+
+def test_block_signals():
+    assert detect_block(429, "https://example.org/x", "", "viewad-description") == "HTTP 429"
+    assert detect_block(200, "https://example.org/m-einloggen.html", "", "viewad-description") == "login wall"
+    assert detect_block(200, "https://example.org/x", "<div>captcha</div>", "viewad-description") == "captcha page"
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, body = {
+            "/ok": (200, DETAIL_PAGE),
+            "/gone": (404, "<html>Diese Anzeige ist nicht mehr verfügbar</html>"),
+            "/blocked": (403, "<html>Forbidden</html>"),
+        }[self.path]
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeFallback:
+    def __init__(self):
+        self.fetched = []
+
+    def fetch_details(self, urls):
+        self.fetched.extend(urls)
+        return {url: "from browser" for url in urls}
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+def make_backend(tmp_path, fallback):
+    return HttpBackend(str(tmp_path / "cookies.pkl"), fallback_factory=lambda: fallback)
+
+def test_deleted_ad_is_a_per_url_failure(site, tmp_path):
+    fallback = FakeFallback()
+    backend = make_backend(tmp_path, fallback)
+    try:
+        results = backend.fetch_details([f"{site}/ok", f"{site}/gone"])
+    finally:
+        backend.close()
+    assert results[f"{site}/ok"]
+    assert results[f"{site}/gone"] is None
+    assert not backend.blocked
+    assert fallback.fetched == []
+
+def test_block_switches_to_fallback(site, tmp_path):
+    fallback = FakeFallback()
+    backend = make_backend(tmp_path, fallback)
+    try:
+        results = backend.fetch_details([f"{site}/blocked"])
+    finally:
+        backend.close()
+    assert backend.blocked
+    assert results == {f"{site}/blocked": "from browser"}
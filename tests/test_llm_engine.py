@@ -0,0 +1,55 @@
+import time
+import types
+import email.utils
+import llm_engine
+from llm_engine import RequestBudget, retry_after_seconds, backoff_delay
+
+def api_error(headers):
+    return Exception() if headers is None else types.SimpleNamespace(response=types.SimpleNamespace(headers=headers))
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(api_error(None)) is None
+    assert retry_after_seconds(api_error({})) is None
+    assert retry_after_seconds(api_error({"retry-after": "7"})) == 7.0
+    assert retry_after_seconds(api_error({"retry-after-ms": "1500", "retry-after": "7"})) == 1.5
+    assert retry_after_seconds(api_error({"retry-after": "soon"})) is None
+
+def test_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_seconds(api_error({"retry-after": value})) <= 30
+
+def test_backoff_delay_bounds():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt) <= min(llm_engine.BACKOFF_MAX, llm_engine.BACKOFF_BASE * 2 ** attempt)
+
+def test_backoff_delay_honours_retry_after():
+    assert backoff_delay(0, api_error({"retry-after": "20"})) >= 20
+
+def test_request_budget_books_and_settles():
+    budget = RequestBudget(requests_per_minute=10, tokens_per_minute=1000)
+    entry = budget.acquire(600)
+    assert budget._tokens == 600
+    budget.settle(entry, 250)
+    assert budget._tokens == 250
+    # Oversized requests are capped to the whole budget so they can still run
+    budget.settle(budget.acquire(750), 750)
+    assert budget._tokens == 1000
+
+def test_request_budget_waits_for_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(llm_engine.time, "monotonic", lambda: clock[0])
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(llm_engine.time, "sleep", sleep)
+    budget = RequestBudget(requests_per_minute=2, tokens_per_minute=1000)
+    budget.acquire(10)
+    clock[0] += 15
+    budget.acquire(10)
+    budget.acquire(10)
+    # The third request waits for the first one to leave the window
+    assert sleeps == [45.0]
+    assert len(budget._entries) == 2
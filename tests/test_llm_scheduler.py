@@ -0,0 +1,87 @@
+import datetime
+import threading
+import process_listings
+from llm_scheduler import SpendingBudget, estimate_usage
+from storage import open_store
+
+TITLE = "Lenovo Legion 5"
+DESCRIPTION = "Gebraucht, guter Zustand, mit Netzteil."
+
+def request_tokens():
+    prompt_tokens, completion_tokens = estimate_usage(TITLE, DESCRIPTION)
+    return prompt_tokens + completion_tokens
+
+def test_processes_of_a_run_share_its_budget(tmp_path):
+    store = open_store(str(tmp_path))
+    other = open_store(str(tmp_path))
+    budget = SpendingBudget(store, run_tokens=request_tokens() * 2)
+    # A spawned process opens the same run's budget by its ID
+    in_process = SpendingBudget(other, run_id=budget.run_id, run_tokens=request_tokens() * 2)
+    assert budget.reserve(TITLE, DESCRIPTION) is not None
+    assert in_process.reserve(TITLE, DESCRIPTION) is not None
+    assert budget.reserve(TITLE, DESCRIPTION) is None
+    assert in_process.reserve(TITLE, DESCRIPTION) is None
+    # Deferrals of all the run's processes are counted for it
+    assert budget.spent()[2] == 2
+    # Another run starts with its own run budget
+    assert SpendingBudget(store, run_tokens=request_tokens() * 2).reserve(TITLE, DESCRIPTION) is not None
+    other.close()
+    store.close()
+
+def test_settle_replaces_the_estimate(tmp_path):
+    store = open_store(str(tmp_path))
+    budget = SpendingBudget(store, daily_tokens=request_tokens() * 2)
+    entry = budget.reserve(TITLE, DESCRIPTION)
+    budget.settle(entry, {"llm_prompt_tokens": 10, "llm_completion_tokens": 5})
+    usage = store.llm_usage(datetime.date.today().isoformat())
+    assert (usage["requests"], usage["prompt_tokens"], usage["completion_tokens"]) == (1, 10, 5)
+    assert budget.spent()[0] == 15
+    # A failed request releases its reservation without booking a request
+    budget.settle(budget.reserve(TITLE, DESCRIPTION), {})
+    assert store.llm_usage(datetime.date.today().isoformat())["requests"] == 1
+    # Only the reported 15 tokens count, so another estimate still fits the day
+    assert budget.reserve(TITLE, DESCRIPTION) is not None
+    store.close()
+
+def test_daily_budget_holds_across_concurrent_processes(tmp_path):
+    open_store(str(tmp_path)).close()
+    allowed = 5
+    booked = []
+
+    def reserve_all():
+        store = open_store(str(tmp_path))
+        budget = SpendingBudget(store, daily_tokens=request_tokens() * allowed)
+        for _ in range(allowed):
+            if budget.reserve(TITLE, DESCRIPTION) is not None:
+                booked.append(1)
+        store.close()
+
+    # Separate connections, as the processes of parallel runs would have
+    threads = [threading.Thread(target=reserve_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(booked) == allowed
+
+def test_budget_without_store_keeps_the_run_budget():
+    budget = SpendingBudget(run_tokens=request_tokens())
+    entry = budget.reserve(TITLE, DESCRIPTION)
+    assert budget.reserve(TITLE, DESCRIPTION) is None
+    budget.settle(entry, {"llm_prompt_tokens": 1, "llm_completion_tokens": 1})
+    assert budget.spent() == (2, budget.cost, 1)
+
+def test_cache_hit_is_not_deferred_by_a_used_budget(tmp_path, monkeypatch):
+    def no_requests(title, description):
+        raise AssertionError("the cached listing must not be sent to the API")
+
+    cached = {"llm_processed": True, "llm_cached": True, "analysis_source": "llm"}
+    monkeypatch.setattr(process_listings, "resolve_without_llm", lambda title, description: dict(cached))
+    monkeypatch.setattr(process_listings, "analyze_with_llm", no_requests)
+    store = open_store(str(tmp_path))
+    store.upsert({"id": "1", "title": TITLE, "detailed_description": DESCRIPTION, "llm_processed": False})
+    spending = SpendingBudget(store, run_tokens=1)
+    process_listings.update_listings_with_chatgpt(store, concurrency=1, spending=spending)
+    assert spending.deferred == 0
+    assert store.counts() == (1, 0)
+    store.close()
@@ -0,0 +1,21 @@
+import json
+import pytest
+import main
+from storage import open_store
+
+def test_failed_scrape_still_exports_and_processes(tmp_path, monkeypatch):
+    def failing_scrape(urls, store, **kwargs):
+        store.upsert({"id": "1", "title": "Laptop A", "detailed_description": "Notebook", "llm_processed": False})
+        raise RuntimeError("browser crashed")
+
+    processed = []
+    monkeypatch.setattr(main, "scrape_listings", failing_scrape)
+    monkeypatch.setattr(main, "update_listings_with_chatgpt",
+                        lambda store, spending=None: processed.append(store.counts()))
+    store = open_store(str(tmp_path))
+    with pytest.raises(RuntimeError, match="browser crashed"):
+        main.run_stages(store, "both", urls=["http://127.0.0.1:1/s-notebooks/k0"], data_dir=str(tmp_path))
+    # The listing saved before the error reaches listings.json and the process stage
+    assert [listing["id"] for listing in json.loads((tmp_path / "listings.json").read_text())] == ["1"]
+    assert processed == [(1, 1)]
+    store.close()
@@ -0,0 +1,53 @@
+import os
+import pytest
+from parsers import (
+    PARSER_BACKENDS, parse_search_results, parse_detail_description, parse_price, resolve_backend, _is_installed
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+INSTALLED = [backend for backend in PARSER_BACKENDS if _is_installed(backend)]
+
+@pytest.mark.parametrize("backend", INSTALLED)
+def test_search_results_match_bs4(backend):
+    html = fixture("search_results.html")
+    results = parse_search_results(html, backend)
+    assert results
+    assert results == parse_search_results(html, "bs4")
+    # Ad slots in the results list parse as empty listings
+    listings = [result for result in results if result["id"]]
+    assert listings and all(result["url"] and result["title"] for result in listings)
+
+@pytest.mark.parametrize("backend", INSTALLED)
+def test_detail_description_matches_bs4(backend):
+    html = fixture("detail_page.html")
+    description = parse_detail_description(html, backend)
+    assert description.strip()
+    assert description == parse_detail_description(html, "bs4")
+
+@pytest.mark.parametrize("backend", INSTALLED)
+def test_structured_data_fallback(backend):
+    results = parse_search_results(fixture("search_results_structured.html"), backend)
+    assert results
+    assert all(result["url"].startswith("http") for result in results)
+
+@pytest.mark.parametrize("backend", INSTALLED)
+def test_empty_pages(backend):
+    assert parse_search_results("", backend) == []
+    assert parse_detail_description("<html><body></body></html>", backend) == ""
+
+def test_parse_price():
+    assert parse_price("1.200 € VB") == 1200.0
+    assert parse_price("1.049,99 €") == 1049.99
+    assert parse_price("VB") is None
+    assert parse_price("Zu verschenken") == 0.0
+
+def test_resolve_backend():
+    assert resolve_backend("bs4") == "bs4"
+    assert resolve_backend("auto") in INSTALLED
+    with pytest.raises(ValueError):
+        resolve_backend("html5lib")
@@ -0,0 +1,31 @@
+import pipeline
+from pipeline import AnalysisPipeline
+from process_listings import failed_result
+from storage import open_store
+
+class FakeEngine:
+    def analyze(self, title, description):
+        if title == "Broken":
+            return failed_result()
+        return {"llm_processed": True, "analysis_source": "llm", "full_info_obtained": True}
+
+def test_failed_analysis_is_not_reported_as_analyzed(tmp_path, monkeypatch):
+    emitted = []
+    counted = []
+    monkeypatch.setattr(pipeline.events, "emit", lambda event_type, listing: emitted.append(listing["id"]))
+    monkeypatch.setattr(pipeline.metrics, "inc", lambda name, value=1, **labels: counted.append(labels.get("state")))
+    store = open_store(str(tmp_path))
+    listings = [
+        {"id": "1", "title": "ThinkPad", "detailed_description": "Akku neu", "llm_processed": False},
+        {"id": "2", "title": "Broken", "detailed_description": "Display defekt", "llm_processed": False},
+    ]
+    store.upsert_many(listings)
+    with AnalysisPipeline(store, concurrency=1, engine=FakeEngine()) as analysis:
+        for listing in listings:
+            analysis.submit(listing)
+    assert (analysis.analyzed, analysis.failed) == (1, 1)
+    assert emitted == ["1"]
+    assert sorted(counted) == ["analyzed", "failed"]
+    # The failed listing stays unprocessed for the next run
+    assert store.counts() == (2, 1)
+    store.close()
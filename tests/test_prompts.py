@@ -0,0 +1,39 @@
+from prompts import trim_description, get_compact_analysis_messages
+from llm_cache import prompt_template_version
+
+def test_single_line_keeps_specs_and_drops_boilerplate_sentences():
+    text = "Lenovo Legion 5, 32GB RAM, 16 Zoll 2560x1600. Versand möglich, Privatverkauf keine Garantie."
+    assert trim_description(text) == "Lenovo Legion 5, 32GB RAM, 16 Zoll 2560x1600."
+
+def test_boilerplate_clause_after_specs_is_removed():
+    assert trim_description("Verkaufe Laptop 32GB RAM 14 Zoll, Abholung in Berlin") == "Verkaufe Laptop 32GB RAM 14 Zoll"
+
+def test_clause_with_digits_is_kept_even_if_it_mentions_boilerplate():
+    assert trim_description("Versand für 5 Euro möglich") == "Versand für 5 Euro möglich"
+
+def test_decimal_comma_is_not_a_clause_boundary():
+    assert trim_description("Display 15,6 Zoll FHD, Nichtraucherhaushalt") == "Display 15,6 Zoll FHD"
+
+def test_boilerplate_lines_are_dropped():
+    text = "Gaming Laptop\nNur Abholung\nBei Fragen gerne melden\nRTX 4060"
+    assert trim_description(text) == "Gaming Laptop\nRTX 4060"
+
+def test_only_boilerplate_falls_back_to_untrimmed_text():
+    assert trim_description("Nur Abholung. Privatverkauf.") == "Nur Abholung. Privatverkauf."
+
+def test_budget_cuts_text():
+    assert len(trim_description("a" * 5000, max_tokens=100)) == 400
+
+def test_compact_message_contains_trimmed_description():
+    messages = get_compact_analysis_messages("Legion", "32GB RAM. Versand möglich.")
+    assert messages[-1]["content"].endswith("Description: 32GB RAM.")
+
+def test_prompt_version_depends_on_description_budget():
+    assert prompt_template_version("compact", 400) != prompt_template_version("compact", 200)
+    assert prompt_template_version("compact", 400) == prompt_template_version("compact", 400)
+
+def test_compact_instructions_stay_short():
+    messages = get_compact_analysis_messages("Legion", "32GB RAM")
+    assert messages[0]["content"] == get_compact_analysis_messages("Zenbook", "16GB RAM")[0]["content"]
+    # About 4 characters per token; every call pays for the instructions in full
+    assert len(messages[0]["content"]) // 4 < 1024
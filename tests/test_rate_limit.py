@@ -0,0 +1,40 @@
+import rate_limit
+from rate_limit import AdaptiveRateController, block_reason
+
+def test_block_reason():
+    assert block_reason('<div class="g-recaptcha"></div>') == "captcha page"
+    assert block_reason("<h1>Zugriff verweigert</h1>") == "captcha page"
+    assert block_reason('<div id="gdpr-banner"><button>Alle zustimmen</button></div>') == "consent page"
+    assert block_reason("<p>Wir benötigen Ihre Einwilligung</p>") == "consent page"
+    # A page that merely lacks its content, e.g. a deleted ad
+    assert block_reason("<h1>Diese Anzeige ist nicht mehr verfügbar</h1>") is None
+    assert block_reason(None) is None
+
+def test_healthy_pages_raise_the_rate_up_to_the_maximum():
+    controller = AdaptiveRateController(rate=1.0, max_rate=1.05, increase=0.02)
+    controller.record_success()
+    assert controller.rate == 1.02
+    for _ in range(5):
+        controller.record_success()
+    assert controller.rate == 1.05
+
+def test_failures_back_off_once_per_interval(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    controller = AdaptiveRateController(rate=1.0, min_rate=0.2, backoff=0.5)
+    controller.record_failure("timeout")
+    controller.record_failure("timeout")
+    assert controller.rate == 0.5
+    # One request interval later the next failure counts again, down to the minimum
+    for _ in range(3):
+        clock[0] += 1 / controller.rate
+        controller.record_failure("timeout")
+    assert controller.rate == 0.2
+
+def test_block_pauses_all_loads(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    controller = AdaptiveRateController(rate=1.0, backoff=0.5, cooldown=60)
+    controller.record_failure("consent page", block=True)
+    # The next load waits out the cooldown
+    assert controller._reserve() >= 60
@@ -0,0 +1,29 @@
+from spec_extractor import extract_specs, rule_based_result
+
+def test_fully_settled_listing():
+    specs = extract_specs("Lenovo Legion 5 Pro", "32GB DDR5, 16 Zoll 2560x1600 Display")
+    assert specs == {"RAM_more": True, "screen_small": False, "screen_highres": True}
+    result = rule_based_result(specs)
+    assert result["analysis_source"] == "rules"
+    assert result["full_info_obtained"] is True
+
+def test_small_full_hd_laptop():
+    assert extract_specs("ThinkPad T14", 'RAM: 16 GB, 14" FHD') == {
+        "RAM_more": False, "screen_small": True, "screen_highres": False}
+
+def test_decimal_comma_screen_size():
+    assert extract_specs("Notebook", "Display 15,6 Zoll")["screen_small"] is False
+
+def test_upgrade_hint_is_not_installed_ram():
+    assert extract_specs("Notebook", "16GB RAM, erweiterbar bis 64GB RAM")["RAM_more"] is False
+
+def test_storage_size_is_not_ram():
+    assert extract_specs("Notebook", "512GB SSD")["RAM_more"] is None
+
+def test_conflicting_values_are_left_to_the_llm():
+    specs = extract_specs("Laptop 13 Zoll", "Bildschirm 15,6 Zoll")
+    assert specs["screen_small"] is None
+    assert rule_based_result(specs) is None
+
+def test_fhd_plus_is_left_to_the_llm():
+    assert extract_specs("Notebook", "FHD+ Display 1920x1200")["screen_highres"] is None
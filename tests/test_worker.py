@@ -0,0 +1,55 @@
+import time
+import json
+import worker
+from worker import JobQueue
+
+class FailingBackend:
+    def fetch_search_page(self, url):
+        raise RuntimeError("browser crashed")
+
+    def fetch_details(self, urls):
+        raise RuntimeError("browser crashed")
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        pass
+
+def test_configured_urls_and_explicit_urls_are_the_same_job(tmp_path):
+    (tmp_path / "search_urls.json").write_text(json.dumps([{"url": "http://127.0.0.1:1/s-notebooks/k0"}]))
+    jobs = JobQueue(str(tmp_path))
+    first = jobs.submit("scrape")
+    second = jobs.submit("scrape", ["http://127.0.0.1:1/s-notebooks/k0"])
+    assert not first["deduplicated"]
+    assert second["deduplicated"] and second["id"] == first["id"]
+
+def test_failed_scrape_marks_the_job_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "create_backend", lambda data_dir, backend: FailingBackend())
+    jobs = JobQueue(str(tmp_path))
+    jobs.start()
+    job = jobs.submit("scrape", ["http://127.0.0.1:1/s-notebooks/k0"])
+    deadline = time.time() + 30
+    while jobs.get(job["id"])["state"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+    job = jobs.get(job["id"])
+    assert job["state"] == "failed"
+    assert "browser crashed" in job["error"]
+
+def test_scrape_process_reports_its_error(tmp_path, monkeypatch):
+    import queue
+    import scraper
+    from storage import open_store
+    open_store(str(tmp_path)).close()
+    monkeypatch.setattr(scraper, "create_backend", lambda *args: FailingBackend())
+    url_queue = queue.Queue()
+    result_queue = queue.Queue()
+    for url in ("http://127.0.0.1:1/s-a/k0", "http://127.0.0.1:1/s-b/k0", None):
+        url_queue.put(url)
+    scraper.crawl_worker(1, 2, str(tmp_path), str(tmp_path / "listings.db"), "http", url_queue, result_queue,
+                         "run", None, {"process_immediately": False})
+    worker_index, scraped, error, counters, histograms = result_queue.get_nowait()
+    assert (worker_index, scraped) == (1, 0)
+    assert "browser crashed" in error
+    # The second search is left for the other processes
+    assert url_queue.get_nowait() == "http://127.0.0.1:1/s-b/k0"
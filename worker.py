@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import datetime
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import metrics
+import events
+from main import DATA_DIR, run_stages, load_search_urls
+from scraper import create_backend, FETCH_BACKEND
+from storage import open_store
+from frontier import Frontier
+
+# Try to import config
+try:
+    import config
+except ImportError:
+    config = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Local port the worker accepts jobs on (server.js talks to it)
+WORKER_PORT = getattr(config, "WORKER_PORT", 3031)
+
+# Finished jobs kept for GET /jobs
+JOB_HISTORY = 50
+
+MODES = ("scrape", "process", "both")
+
+class JobQueue:
+    """Scrape/process jobs run one at a time by a single thread.
+
+    The thread opens the listing store once and keeps the fetch backend (and with
+    it the logged-in browser) warm between jobs, so a run only pays for the pages
+    it loads. A job submitted while an identical one is still queued or running
+    is not queued again; the existing job is returned instead.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, backend=FETCH_BACKEND):
+        self.data_dir = data_dir
+        self.backend_name = backend
+        self.fetch_backend = None
+        self.jobs = collections.OrderedDict()
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.started = datetime.datetime.now().isoformat()
+        self.thread = threading.Thread(target=self._run, name="job-runner", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, mode="both", urls=None, max_listings=None, backfill=False):
+        """Queue a job, or return the matching queued/running job"""
+        # A job for the configured searches equals one naming them explicitly (e.g. a resumed run)
+        if mode == "process":
+            urls = None
+        elif urls is None:
+            urls = load_search_urls(os.path.join(self.data_dir, "search_urls.json"))
+        key = json.dumps([mode, urls, max_listings, backfill])
+        with self.lock:
+            for job in self.jobs.values():
+                if job["key"] == key and job["state"] in ("queued", "running"):
+                    metrics.inc("worker_jobs_deduplicated_total")
+                    return dict(job, deduplicated=True)
+
+            job = {
+                "id": str(self.next_id),
+                "key": key,
+                "mode": mode,
+                "urls": urls,
+                "max_listings": max_listings,
+                "backfill": backfill,
+                "state": "queued",
+                "submitted": datetime.datetime.now().isoformat(),
+                "started": None,
+                "finished": None,
+                "error": None
+            }
+            self.next_id += 1
+            self.jobs[job["id"]] = job
+            self._trim()
+        self.pending.put(job["id"])
+        logger.info(f"Queued job {job['id']} ({mode})")
+        return dict(job, deduplicated=False)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in reversed(self.jobs.values())]
+
+    def status(self):
+        with self.lock:
+            states = collections.Counter(job["state"] for job in self.jobs.values())
+        return {
+            "started": self.started,
+            "backend": self.backend_name,
+            "backend_warm": self.fetch_backend is not None,
+            "jobs": dict(states)
+        }
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond JOB_HISTORY"""
+        finished = [job_id for job_id, job in self.jobs.items() if job["state"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self.jobs) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    def _update(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+
+    def _ensure_backend(self):
+        """Start the fetch backend, or restart it if the browser session died"""
+        if self.fetch_backend is not None and not self.fetch_backend.is_alive():
+            logger.warning("Fetch backend no longer responds, restarting it")
+            self._close_backend()
+        if self.fetch_backend is None:
+            with metrics.timer("worker_backend_start_seconds", backend=self.backend_name):
+                self.fetch_backend = create_backend(self.data_dir, self.backend_name)
+        return self.fetch_backend
+
+    def _close_backend(self):
+        if self.fetch_backend is None:
+            return
+        try:
+            self.fetch_backend.close()
+        except Exception as e:
+            logger.error(f"Error closing fetch backend: {str(e)}")
+        self.fetch_backend = None
+
+    def _resume_interrupted(self):
+        """Queue the scrape runs a crash or restart interrupted, to continue where they stopped"""
+        frontier = Frontier(self.data_dir)
+        try:
+            runs = frontier.unfinished_runs()
+        finally:
+            frontier.close()
+        for run in runs:
+            logger.info(f"Resuming an interrupted scrape of {len(run['urls'])} searches")
+            self.submit("both" if run["process_immediately"] else "scrape", run["urls"], run["max_listings"],
+                        run["backfill"])
+
+    def _run(self):
+        """Job thread: the store and fetch backend belong to this thread"""
+        store = open_store(self.data_dir)
+        try:
+            # Warm up the browser (and log in) before the first job arrives
+            self._ensure_backend()
+        except Exception as e:
+            logger.error(f"Error starting fetch backend: {str(e)}")
+        self._resume_interrupted()
+
+        while True:
+            job_id = self.pending.get()
+            job = self.jobs[job_id]
+            self._update(job, state="running", started=datetime.datetime.now().isoformat())
+            logger.info(f"Running job {job_id} ({job['mode']})")
+            started = time.perf_counter()
+            try:
+                fetch_backend = self._ensure_backend() if job["mode"] in ("scrape", "both") else None
+                run_stages(store, job["mode"], urls=job["urls"], max_listings=job["max_listings"],
+                           backfill=job["backfill"], fetch_backend=fetch_backend, data_dir=self.data_dir)
+                self._update(job, state="done")
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                self._update(job, state="failed", error=str(e))
+                # Start from a fresh browser next time
+                self._close_backend()
+            self._update(job, finished=datetime.datetime.now().isoformat())
+            metrics.observe("worker_job_seconds", time.perf_counter() - started, mode=job["mode"])
+            metrics.inc("worker_jobs_total", mode=job["mode"], state=job["state"])
+            metrics.flush(force=True)
+            logger.info(f"Job {job_id} {job['state']} in {time.perf_counter() - started:.1f}s")
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    """POST /jobs, GET /jobs, GET /jobs/<id> and GET /health"""
+
+    jobs = None
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.jobs.status())
+        elif self.path == "/jobs":
+            self._send_json(200, self.jobs.list())
+        elif self.path.startswith("/jobs/"):
+            job = self.jobs.get(self.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "Unknown job"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            mode = body.get("mode", "both")
+            if mode not in MODES:
+                raise ValueError(f"mode must be one of {', '.join(MODES)}")
+            urls = body.get("urls") or None
+            max_listings = body.get("max_listings")
+            job = self.jobs.submit(mode, urls, int(max_listings) if max_listings else None, bool(body.get("backfill")))
+            self._send_json(200 if job["deduplicated"] else 202, job)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def main():
+    """Run the worker until interrupted"""
+    parser = argparse.ArgumentParser(description="Long-running scrape/process worker with a warm browser")
+    parser.add_argument("--port", type=int, default=WORKER_PORT, help="Local port to accept jobs on")
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    metrics.configure(DATA_DIR)
+    events.configure(DATA_DIR)
+
+    jobs = JobQueue()
+    jobs.start()
+    WorkerHandler.jobs = jobs
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), WorkerHandler)
+    logger.info(f"Worker accepting jobs at http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        jobs._close_backend()
+
+if __name__ == "__main__":
+    main()